@@ -1,9 +1,21 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from io import BytesIO
-from fpdf import FPDF
 import json
+import os
+
+from ccr import guidelines, metrics, uploads
+from ccr.codes import RISK_CODE, RISK_LEVEL_CODE
+from ccr.decision_table import unpack_flags
+from ccr.pdf_cache import DEFAULT_MAX_BYTES, PdfCache, report_key
+from ccr.pdf_worker import (BUSY, DEFAULT_QUEUE_LIMIT, DEFAULT_WORKERS, FAILED, IDLE, PREPARING, READY,
+                            ReportRenderer)
+from ccr.report import generate_pdf, get_template
+from ccr.results import AssessmentResult
+from ccr.rules import calculate_age, calculate_bmi
+from ccr.store import AssessmentStore
+from ccr.uploads import UploadScorer
+from ccr.validation import validate_form_inputs
 
 # Set page configuration
 st.set_page_config(
@@ -12,374 +24,112 @@ st.set_page_config(
     layout="wide"
 )
 
+# The CSV upload scores files of many patients; it is for staff and only shown when CCR_STAFF_UPLOAD is set
+STAFF_UPLOAD = os.environ.get("CCR_STAFF_UPLOAD", "").strip().lower() in ("1", "true", "yes", "on")
+
+# Upload states after which the page stops polling
+UPLOAD_FINISHED = (uploads.DONE, uploads.FAILED, uploads.UNKNOWN)
+
 # Initialize session state for storing user data
-if 'data' not in st.session_state:
-    st.session_state.data = {}
+if 'result' not in st.session_state:
+    st.session_state.result = None
     st.session_state.show_results = False
 
 # Helper functions
-def calculate_age(dob):
-    """Calculate age from date of birth"""
-    today = datetime.today()
-    return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
-
-def calculate_bmi(height_cm, weight_kg):
-    """Calculate Body Mass Index"""
-    if height_cm <= 0 or weight_kg <= 0:
-        return None
-    height_m = height_cm / 100
-    return round(weight_kg / (height_m ** 2), 1)
-
-def validate_numeric_input(value, min_val=0, max_val=None):
-    """Validate numeric input within specified range"""
-    try:
-        val = float(value)
-        if val <= min_val:
-            return False, f"Value must be greater than {min_val}"
-        if max_val and val > max_val:
-            return False, f"Value must be less than {max_val}"
-        return True, val
-    except:
-        return False, "Please enter a valid number"
-
-def generate_pdf(edad, imc, resumen, categoria_riesgo, recomendacion, lifestyle_advice=None, symptoms_flag=False):
-    """Generate PDF with assessment results and educational content"""
-    pdf = FPDF()
-    pdf.add_page()
-
-    # Helper function to sanitize text for FPDF
-    def sanitize_text(text):
-        if text is None:
-            return ""
-        # Replace problematic Unicode characters
-        return (text.replace('\u2013', '-')   # en dash
-                   .replace('\u2014', '-')    # em dash
-                   .replace('\u201C', '"')    # left double quote
-                   .replace('\u201D', '"')    # right double quote
-                   .replace('\u2019', "'")    # right single quote
-                   .replace('\u2018', "'")    # left single quote
-                   .replace('\u2022', '*')    # bullet
-                   .replace('\u2026', '...')) # ellipsis
-
-    # Header
-    pdf.set_font("Arial", style="B", size=16)
-    pdf.cell(
-        200, 10, txt="Evaluacion de Riesgo para Cancer Colorrectal", ln=1, align="C")
-    pdf.set_font("Arial", style="I", size=10)
-    pdf.cell(
-        200, 6, txt="Basado en Guias del Instituto Nacional del Cancer Argentina", ln=1, align="C")
-    pdf.ln(10)
-
-    # Basic information
-    pdf.set_font("Arial", style="B", size=12)
-    pdf.cell(200, 8, txt="Informacion Personal", ln=1)
-    pdf.set_font("Arial", size=11)
-
-    pdf.cell(200, 8, txt=f"Edad: {edad} anos", ln=1)
-    pdf.cell(200, 8, txt=f"IMC: {imc} kg/m2", ln=1)
-
-    # Risk category with formatting
-    pdf.ln(5)
-    pdf.set_font("Arial", style="B", size=12)
-    pdf.cell(200, 8, txt="Categoria de Riesgo", ln=1)
-    pdf.set_font("Arial", style="B", size=11)
-
-    if "Alto" in categoria_riesgo:
-        pdf.set_text_color(255, 0, 0)  # Red for high risk
-    elif "Incrementado" in categoria_riesgo or "Intermedio" in categoria_riesgo:
-        pdf.set_text_color(0, 0, 255)  # Blue for intermediate risk
-    else:
-        pdf.set_text_color(0, 128, 0)  # Green for average risk
-
-    pdf.cell(200, 8, txt=f"{sanitize_text(categoria_riesgo)}", ln=1)
-    pdf.set_text_color(0, 0, 0)  # Reset to black
-
-    # Symptom warning if applicable
-    if symptoms_flag:
-        pdf.ln(3)
-        pdf.set_font("Arial", style="B", size=11)
-        pdf.set_text_color(255, 0, 0)  # Red
-        pdf.cell(
-            200, 8, txt="IMPORTANTE: Los sintomas que has reportado requieren atencion medica", ln=1)
-        pdf.cell(
-            200, 8, txt="inmediata, independientemente de tu categoria de riesgo.", ln=1)
-        pdf.set_text_color(0, 0, 0)  # Reset to black
-
-    # Recommendations
-    pdf.ln(5)
-    pdf.set_font("Arial", style="B", size=12)
-    pdf.cell(200, 8, txt="Recomendaciones de Tamizaje", ln=1)
-    pdf.set_font("Arial", size=11)
-
-    # Clean markdown and special characters from recommendation for PDF
-    clean_recommendation = sanitize_text(recomendacion)
-    clean_recommendation = clean_recommendation.replace('**', '').replace('✅', '->').replace(
-        '🟡', '->').replace('🔍', '->').replace('📹', '->').replace('🔬', '->').replace('🧭', '->')
-    pdf.multi_cell(0, 7, clean_recommendation)
-
-    # Summary
-    pdf.ln(3)
-    pdf.set_font("Arial", style="B", size=12)
-    pdf.cell(200, 8, txt="Resumen", ln=1)
-    pdf.set_font("Arial", size=11)
-    clean_summary = sanitize_text(resumen.replace('📝', ''))
-    pdf.multi_cell(0, 7, clean_summary)
-
-    # Add lifestyle advice if provided
-    if lifestyle_advice:
-        pdf.ln(5)
-        pdf.set_font("Arial", style="B", size=12)
-        pdf.cell(200, 8, txt="Recomendaciones para Reducir el Riesgo", ln=1)
-        pdf.set_font("Arial", size=11)
-        pdf.multi_cell(0, 7, sanitize_text(lifestyle_advice))
-
-    # Add information about screening intervals
-    pdf.ln(5)
-    pdf.set_font("Arial", style="B", size=12)
-    pdf.cell(200, 8, txt="Informacion sobre Metodos de Tamizaje", ln=1)
-    pdf.set_font("Arial", size=11)
-    pdf.multi_cell(0, 6, "* Test de sangre oculta inmunoquimico (TSOMFi): Detecta sangre en las heces que podria indicar polipos o cancer. Es simple y no invasivo.\n* Colonoscopia: Examen visual directo del colon completo, permite la deteccion y extirpacion de polipos durante el procedimiento.\n* Rectosigmoidoscopia: Examina el tercio inferior del colon y es menos invasiva que la colonoscopia completa.")
-
-    # Disclaimer and footer
-    pdf.ln(5)
-    pdf.set_font("Arial", style="I", size=9)
-    pdf.multi_cell(0, 5, "Esta evaluacion es informativa y esta basada en la guia \"Recomendaciones para el tamizaje de CCR en poblacion de riesgo promedio en Argentina\" del Instituto Nacional del Cancer. No reemplaza la consulta medica. Comparta estos resultados con su profesional de salud para una evaluacion personalizada.")
-
-    pdf.ln(3)
-    pdf.set_font("Arial", style="B", size=9)
-    pdf.cell(
-        200, 5, txt=f"Fecha de evaluacion: {datetime.today().strftime('%d/%m/%Y')}", ln=1)
-
-    # Output to buffer
-    buffer = BytesIO()
-    pdf.output(buffer)
-    buffer.seek(0)
-    return buffer
-
-def evaluate_serrated_polyps(polyp_history):
-    """
-    Specialized evaluation for serrated polyps based on more detailed criteria
-
-    Args:
-        polyp_history: Dictionary containing polyp details
-
-    Returns:
-        Dictionary with risk assessment for serrated polyps
-    """
-    serrated_risk = {
-        "is_high_risk": False,
-        "reason": "",
-        "recommendation": ""
-    }
-
-    # Check for serrated polyps presence
-    if not polyp_history.get("serrated", False):
-        return serrated_risk
-
-    # If polyps were resected, evaluate risk
-    if polyp_history.get("resected", False):
-        # For simplicity, we classify all resected serrated polyps as high risk
-        # In a complete system, we would collect more data about size, number, and dysplasia
-        serrated_risk["is_high_risk"] = True
-        serrated_risk["reason"] = "Pólipo serrado resecado"
-        serrated_risk["recommendation"] = "Colonoscopia cada 3–5 años + evaluación genética."
-
-    return serrated_risk
-
-def get_lifestyle_recommendations(bmi, age):
+@st.cache_resource
+def get_pdf_cache():
+    """PDF cache shared by every session of this server process"""
+    return PdfCache(max_bytes=int(os.environ.get("CCR_PDF_CACHE_BYTES", DEFAULT_MAX_BYTES)))
+
+@st.cache_resource
+def get_report_renderer():
+    """Background PDF renderer shared by every session of this server process"""
+    get_template()
+    return ReportRenderer(
+        get_pdf_cache(),
+        max_workers=int(os.environ.get("CCR_PDF_WORKERS", DEFAULT_WORKERS)),
+        max_pending=int(os.environ.get("CCR_PDF_QUEUE_LIMIT", DEFAULT_QUEUE_LIMIT))
+    )
+
+@st.cache_resource
+def get_assessment_store():
     """
-    Provide lifestyle recommendations based on BMI and age
+    Assessment store shared by every session; None unless CCR_STORE_PATH is set
 
-    Args:
-        bmi: Body Mass Index
-        age: Age in years
-
-    Returns:
-        String with lifestyle recommendations
-    """
-    recommendations = [
-        "• Mantener un peso saludable (IMC entre 18.5 y 24.9)",
-        "• Realizar actividad física regularmente (al menos 30 minutos diarios)",
-        "• Limitar el consumo de carnes rojas y procesadas",
-        "• Aumentar el consumo de fibra, frutas y verduras",
-        "• Limitar el consumo de alcohol",
-        "• Evitar el tabaco"
-    ]
-
-    # Add specific recommendations based on BMI
-    if bmi and bmi >= 30:
-        recommendations.insert(
-            1, "• Consultar con un especialista en nutrición para un plan de reducción de peso (tu IMC indica obesidad, un factor de riesgo importante para CCR)")
-    elif bmi and bmi >= 25:
-        recommendations.insert(
-            1, "• Considerar un plan de alimentación para alcanzar un peso saludable (tu IMC indica sobrepeso)")
-
-    # Add age-specific recommendations
-    if age >= 60:
-        recommendations.append(
-            "• Mantener un consumo adecuado de calcio y vitamina D (puede tener efecto protector)")
-
-    return "Las siguientes recomendaciones pueden ayudar a reducir tu riesgo de cáncer colorrectal:\n\n" + "\n".join(recommendations)
-
-def get_symptoms_detail():
+    Streamlit also sets CCR_STORE_PATH from a root-level key of
+    .streamlit/secrets.toml. Without it nothing the patients enter is kept.
     """
-    Return detailed information about warning symptoms
-
-    Returns:
-        String with symptoms details
-    """
-    return """
-    Los siguientes síntomas requieren evaluación médica inmediata:
+    path = os.environ.get("CCR_STORE_PATH")
+    return AssessmentStore(path) if path else None
+
+@st.cache_resource
+def get_upload_scorer():
+    """Background scorer of uploaded CSV files shared by every session of this server process"""
+    return UploadScorer(
+        max_workers=int(os.environ.get("CCR_UPLOAD_WORKERS", uploads.DEFAULT_WORKERS)),
+        max_pending=int(os.environ.get("CCR_UPLOAD_QUEUE_LIMIT", uploads.DEFAULT_QUEUE_LIMIT)),
+        reports_limit=int(os.environ.get("CCR_UPLOAD_REPORTS_LIMIT", uploads.DEFAULT_REPORTS_LIMIT))
+    )
+
+@st.cache_resource
+def start_metrics_exporters():
+    """Metrics endpoint/file configured by CCR_METRICS_PORT and CCR_METRICS_FILE, once per process"""
+    return metrics.start_exporters_from_env()
+
+@st.cache_resource
+def start_guidelines_watcher():
+    """Reload the guidelines file every CCR_GUIDELINES_RELOAD seconds when it changes, once per process"""
+    return guidelines.start_watcher_from_env()
+
+def render_pdf(pdf_args, category):
+    """Render the report bytes, timed as the generate_pdf stage"""
+    with metrics.stage("generate_pdf", category):
+        return generate_pdf(*pdf_args).getvalue()
+
+def prepare_pdf(pdf_key, pdf_args, category):
+    """Queue the report; the section polls until it is ready"""
+    pdf_state, _ = get_report_renderer().request(pdf_key, lambda: render_pdf(pdf_args, category))
+    st.session_state.pdf_busy = pdf_state == BUSY
+
+def pdf_download_section(pdf_key, pdf_args, category, polling=False):
+    """Show the PDF download button, or the button to prepare it and its progress"""
+    renderer = get_report_renderer()
+    pdf_state, pdf_data = renderer.status(pdf_key)
+    if pdf_state == PREPARING and not polling:
+        # Just queued: redraw the results so this section is re-created with polling enabled
+        st.rerun(scope="results")
     
-    • Sangrado rectal o sangre en las heces
-    • Cambio persistente en los hábitos intestinales (diarrea, estreñimiento)
-    • Pérdida de peso sin causa aparente
-    • Dolor abdominal persistente
-    • Sensación de evacuación incompleta
+    if pdf_state in (IDLE, FAILED):
+        if pdf_state == FAILED:
+            st.error(f"No se pudo generar el PDF. Error: {str(pdf_data)}")
+        elif st.session_state.pop("pdf_busy", False):
+            st.warning("Hay muchos PDF en preparación en este momento. Intentá nuevamente en unos segundos.")
+        st.button("Preparar PDF", help="Genera un PDF con los resultados de tu evaluación para compartir con tu médico",
+                  on_click=prepare_pdf, args=(pdf_key, pdf_args, category))
     
-    Estos síntomas pueden estar relacionados con varias condiciones, incluyendo el cáncer colorrectal, por lo que es importante una evaluación médica oportuna.
-    """
-
-def evaluate_risk(age, bmi, personal_history, family_history, polyp_history, symptoms):
-    """
-    Evaluate colorectal cancer risk according to Argentine guidelines with enhanced criteria
-
-    Args:
-        age: Age in years
-        bmi: Body Mass Index
-        personal_history: Dictionary of personal medical history
-        family_history: Dictionary of family history
-        polyp_history: Dictionary of polyp history
-        symptoms: Boolean indicating presence of symptoms
-
-    Returns:
-        Tuple containing:
-        - risk_category: string with risk category
-        - recommendation: string with screening recommendation
-        - summary: string with summary of assessment
-        - lifestyle_advice: string with lifestyle recommendations
-        - symptoms_detail: string with detailed symptom information if applicable
-        - bmi_note: string with BMI-related information
-        - symptoms_warning: string with warning about symptoms
-    """
-
-    # Initialize variables
-    risk_category = ""
-    recommendation = ""
-    summary = ""
-
-    # Get lifestyle advice
-    lifestyle_advice = get_lifestyle_recommendations(bmi, age)
-
-    # Get detailed symptom information if applicable
-    symptoms_detail = get_symptoms_detail() if symptoms else ""
-
-    # 1. Evaluate high risk conditions first (follow hierarchy in guidelines)
-    if personal_history.get("lynch", False):
-        risk_category = "Riesgo Alto: Síndrome de Lynch"
-        recommendation = "Colonoscopia cada 1–2 años."
-        summary = "Riesgo alto debido a síndrome de Lynch. Se recomienda colonoscopia cada 1–2 años. Este síndrome hereditario aumenta significativamente el riesgo de cáncer colorrectal y requiere vigilancia intensiva."
-
-    elif personal_history.get("ibd", False):
-        risk_category = "Riesgo Alto: Enfermedad Inflamatoria Intestinal"
-        recommendation = "Colonoscopia cada 1–5 años."
-        summary = "Riesgo alto por enfermedad inflamatoria intestinal. Colonoscopia entre 1–5 años. El intervalo específico dependerá de la duración, extensión y actividad de tu enfermedad inflamatoria intestinal."
-
-    elif personal_history.get("fap", False) or personal_history.get("fasha", False):
-        risk_category = "Riesgo Alto: Poliposis Adenomatosa Familiar"
-        recommendation = "Colonoscopia cada 1–2 años."
-        summary = "Riesgo alto por poliposis adenomatosa familiar. Colonoscopia cada 1–2 años. Esta condición genética requiere vigilancia intensiva y posible evaluación para cirugía preventiva."
-
-    elif personal_history.get("hamart", False):
-        risk_category = "Riesgo Alto: Síndrome hamartomatoso"
-        recommendation = "Colonoscopia cada 1–2 años."
-        summary = "Riesgo alto por síndrome hamartomatoso. Colonoscopia cada 1–2 años. Estos síndromes raros requieren vigilancia especial y evaluación multidisciplinaria."
-
-    elif personal_history.get("serrated_synd", False):
-        risk_category = "Riesgo Alto: Poliposis serrada"
-        recommendation = "Colonoscopia anual."
-        summary = "Riesgo alto por poliposis serrada. Colonoscopia anual. Este síndrome aumenta el riesgo de cáncer colorrectal por vía serrada y requiere vigilancia intensiva."
-
-    # 2. Evaluate intermediate risk conditions (polyps)
-    elif polyp_history.get("polyp10", False):
-        # Specialized evaluation for serrated polyps
-        serrated_risk = evaluate_serrated_polyps(polyp_history)
-
-        if polyp_history.get("advanced_poly", False) and polyp_history.get("resected", False):
-            risk_category = "Riesgo Alto: Adenoma avanzado resecado"
-            recommendation = "Colonoscopia a los 3 años + FIT anual."
-            summary = "Riesgo alto por adenoma avanzado resecado. Colonoscopia a los 3 años + FIT anual. Los adenomas avanzados (>1cm, componente velloso o displasia de alto grado) tienen mayor potencial de malignización."
-
-        elif serrated_risk["is_high_risk"]:
-            risk_category = f"Riesgo Alto: {serrated_risk['reason']}"
-            recommendation = serrated_risk["recommendation"]
-            summary = f"Riesgo alto por {serrated_risk['reason'].lower()}. {serrated_risk['recommendation']} Los pólipos serrados siguen una vía alternativa de carcinogénesis y requieren vigilancia específica."
-
-        elif polyp_history.get("resected", False):
-            risk_category = "Riesgo Intermedio: Pólipos simples resecados"
-            recommendation = "Colonoscopia a los 5 años."
-            summary = "Riesgo intermedio por pólipos simples resecados. Colonoscopia a los 5 años. Los pólipos adenomatosos, incluso pequeños, indican mayor riesgo de desarrollar nuevos pólipos o CCR."
-
-    # 3. Evaluate family history
-    elif family_history.get("family_crc", False):
-        if family_history.get("family_before_60", False):
-            risk_category = "Riesgo Incrementado: Familiar <60 años"
-            recommendation = "Colonoscopia a los 40 años o 10 años antes del caso familiar más joven, lo que ocurra primero. Repetir cada 5 años."
-            summary = "Riesgo incrementado por antecedente familiar diagnosticado antes de los 60 años. Se recomienda colonoscopia temprana (a los 40 años o 10 años antes de la edad de diagnóstico del familiar, lo que ocurra primero) y repetir cada 5 años."
-        else:
-            risk_category = "Riesgo Incrementado: Familiar ≥60 años"
-            recommendation = "Colonoscopia a los 50 años + repetir cada 5 años."
-            summary = "Riesgo incrementado por familiar con CCR diagnosticado a los 60 años o más. Colonoscopia desde los 50 años y repetir cada 5 años."
-
-    # 4. Evaluate by age (average risk)
-    elif 50 <= age <= 75:
-        risk_category = "Riesgo Promedio"
-        recommendation = """
-        **Tu médico puede ayudarte a revisar las siguientes opciones disponibles de tamizaje, considerando la disponibilidad de las pruebas con tu prestador de salud:**
-
-        - ✅ **Test de sangre oculta inmunoquímico (TSOMFi)** cada 2 años *(recomendado como primera opción)*
-        - 🟡 **Test con guayaco (TSOMFg)** cada 2 años *(si no se dispone de TSOMFi)*
-        - 🔍 **Colonoscopia** cada 10 años
-        - 📹 **Videocolonoscopía (VCC)** cada 5 años
-        - 🔬 **Rectosigmoidoscopía (RSC)** cada 5 años *(sola o combinada con TSOMFi anual)*
-        - 🧭 **Colonoscopia virtual** *(solo si no se dispone de las anteriores)*
-        """
-        summary = "📝 Resumen: Aunque no se detectaron factores de riesgo adicionales, cumplís con los criterios de edad (50–75 años) para tamizaje de rutina. Se recomienda realizar el tamizaje de acuerdo con las opciones disponibles, con preferencia por el test de sangre oculta inmunoquímico (TSOMFi) cada 2 años como primera opción."
-
-    elif age < 50:
-        risk_category = "Edad menor a 50 años sin factores de riesgo adicionales"
-        recommendation = "No requiere tamizaje según las guías actuales para población de riesgo promedio."
-        summary = "Actualmente no cumplís criterios para tamizaje por edad según las guías argentinas, que recomiendan iniciar a los 50 años en población de riesgo promedio. Sin embargo, debes estar atento a cualquier síntoma digestivo y consultar inmediatamente si aparecen."
-
-    elif age > 75:
-        risk_category = "Mayor de 75 años"
-        recommendation = "Evaluar caso a caso con tu médico tratante."
-        summary = "Por tu edad, se recomienda evaluar caso a caso con tu médico tratante. El tamizaje de rutina no se recomienda después de los 75 años, pero puede considerarse individualmente basado en tu estado de salud general, comorbilidades y expectativa de vida. El beneficio del tamizaje disminuye después de los 75 años, particularmente si has tenido tamizajes previos normales."
-
-    # 5. Add BMI note if applicable
-    bmi_note = ""
-    if bmi and bmi >= 30:
-        bmi_note = f"**Nota importante:** IMC elevado ({bmi}): la obesidad es un factor de riesgo significativo para CCR. Para mejorar tu salud y reducir riesgos, el IMC recomendado es entre 18.5 y 24.9. Se recomienda consulta con un profesional de nutrición."
-    elif bmi and bmi >= 25:
-        bmi_note = f"**Nota:** IMC elevado ({bmi}): el sobrepeso es un factor de riesgo para CCR. Para mejorar tu salud y reducir riesgos, el IMC recomendado es entre 18.5 y 24.9. Consultá con un profesional para orientación nutricional."
-
-    # 6. Add symptoms warning if applicable
-    symptoms_warning = ""
-    if symptoms:
-        symptoms_warning = "**ATENCIÓN:** Presentás síntomas clínicos como sangrado rectal, cambios en el ritmo intestinal o pérdida de peso sin explicación. Se recomienda consulta médica inmediata independientemente de tu categoría de riesgo, ya que estos síntomas requieren evaluación diagnóstica y no tamizaje."
-
-    return risk_category, recommendation, summary, lifestyle_advice, symptoms_detail, bmi_note, symptoms_warning
-
-# App layout
-st.title("Evaluación de riesgo para tamizaje de cáncer colorrectal")
-st.markdown(
-    "Herramienta para pacientes: responde tus datos para obtener tu estrategia de tamizaje según la Guía Argentina del Instituto Nacional del Cáncer."
-)
+    if pdf_state == READY:
+        st.download_button(
+            label="Descargar PDF",
+            data=pdf_data,
+            file_name=f"evaluacion_riesgo_ccr_{datetime.now().strftime('%Y%m%d')}.pdf",
+            mime="application/pdf",
+            help="Descarga un PDF con los resultados de tu evaluación para compartir con tu médico",
+            on_click="ignore"
+        )
+    elif pdf_state == PREPARING:
+        st.info("Preparando el PDF...")
+    
+    # Once a slow report is done, rerun the page to stop polling
+    if pdf_state == PREPARING and renderer.status(pdf_key)[0] != PREPARING:
+        st.rerun()
 
-# Create two columns - main content and sidebar
-col_main, col_side = st.columns([3, 1])
+def start_over():
+    """Clear the last result so the results section disappears"""
+    st.session_state.result = None
+    st.session_state.show_results = False
 
-with col_side:
+def render_sidebar():
+    """Static information column"""
     st.header("Información sobre el Cáncer Colorrectal")
 
     with st.expander("¿Qué es el cáncer colorrectal?", expanded=False):
@@ -433,8 +183,9 @@ with col_side:
     - [Tamizaje](https://www.argentina.gob.ar/salud/inc/lineas-programaticas/pnccr-tamizaje)
     """)
 
-# Main content area with all form elements in a continuous flow
-with col_main:
+@st.fragment
+def assessment_section():
+    """Form and results; submitting the form only reruns this fragment"""
     with st.form("risk_assessment_form"):
         st.subheader("1. Datos personales básicos")
         
@@ -582,41 +333,17 @@ with col_main:
     # Process form submission
     if submitted:
         # Validate inputs
-        valid_inputs = True
-        error_message = ""
-        
-        if not dob:
-            valid_inputs = False
-            error_message += "- Falta la fecha de nacimiento\n"
-        
-        # Validate height
-        try:
-            height_cm = float(height_str) if height_str else None
-            if not height_cm or height_cm < 50 or height_cm > 250:
-                valid_inputs = False
-                error_message += "- Altura inválida (debe estar entre 50 y 250 cm)\n"
-        except:
-            valid_inputs = False
-            error_message += "- Altura inválida\n"
-            height_cm = None
-        
-        # Validate weight
-        try:
-            weight_kg = float(weight_str) if weight_str else None
-            if not weight_kg or weight_kg < 20 or weight_kg > 300:
-                valid_inputs = False
-                error_message += "- Peso inválido (debe estar entre 20 y 300 kg)\n"
-        except:
-            valid_inputs = False
-            error_message += "- Peso inválido\n"
-            weight_kg = None
+        with metrics.stage("validation"):
+            height_cm, weight_kg, error_message = validate_form_inputs(dob, height_str, weight_str)
+        valid_inputs = not error_message
         
         if not valid_inputs:
             st.error(f"Por favor corrige los siguientes errores:\n{error_message}")
         else:
             # Calculate age and BMI
-            age = calculate_age(dob)
-            bmi = calculate_bmi(height_cm, weight_kg)
+            with metrics.stage("age_bmi"):
+                age = calculate_age(dob)
+                bmi = calculate_bmi(height_cm, weight_kg)
             
             # Collect symptoms
             symptoms = {
@@ -653,158 +380,278 @@ with col_main:
                 "polyp_size": polyp_size
             }
             
-            # Evaluate risk
-            risk_category, recommendation, summary, lifestyle_advice, symptoms_detail, bmi_note, symptoms_warning = evaluate_risk(
-                age, bmi, personal_history, family_history, polyp_history, any_symptoms
-            )
+            # Evaluate risk and store the compact result in session state;
+            # the texts are rendered from shared tables when displayed
+            with metrics.stage("evaluate_risk") as timer:
+                result = AssessmentResult.evaluate(
+                    age, bmi, personal_history, family_history, polyp_history, any_symptoms
+                )
+                timer.category = result.category_code
+            st.session_state.result = result
             
-            # Store results in session state
-            st.session_state.data = {
-                "age": age,
-                "bmi": bmi,
-                "any_symptoms": any_symptoms,
-                "risk_category": risk_category,
-                "recommendation": recommendation,
-                "summary": summary,
-                "lifestyle_advice": lifestyle_advice,
-                "symptoms_detail": symptoms_detail,
-                "bmi_note": bmi_note,
-                "symptoms_warning": symptoms_warning
-            }
+            # Keep the assessment; the row is committed in the background with others
+            store = get_assessment_store()
+            if store is not None:
+                store.add(result)
             st.session_state.show_results = True
     
     # Display results if available
     if st.session_state.show_results:
-        st.markdown("---")
-        st.subheader("Resultados de la evaluación")
-        
-        # Basic info
-        st.write(f"**Edad:** {st.session_state.data['age']} años | **IMC:** {st.session_state.data['bmi']} kg/m²")
-        
-        # Risk category with styling
-        st.subheader("Estrategia de tamizaje recomendada")
-        risk_category = st.session_state.data['risk_category']
-        if "Alto" in risk_category:
-            st.error(f"**{risk_category}**")
-        elif "Incrementado" in risk_category or "Intermedio" in risk_category:
-            st.info(f"**{risk_category}**")
-        else:
-            st.success(f"**{risk_category}**")
-        
-        # Recommendation
-        st.markdown(st.session_state.data['recommendation'])
-        
-        # BMI note if applicable
-        if st.session_state.data['bmi_note']:
-            st.markdown(st.session_state.data['bmi_note'])
-        
-        # Symptoms warning if applicable
-        if st.session_state.data['any_symptoms']:
-            st.error(st.session_state.data['symptoms_warning'])
-            st.markdown(st.session_state.data['symptoms_detail'])
-        
-        # Timeline visualization
-        st.subheader("Cronograma de tamizaje recomendado")
-        
-        # Create a basic timeline based on risk category
-        age = st.session_state.data['age']
-        current_year = datetime.now().year
-        
-        if "Alto" in risk_category:
-            if "Lynch" in risk_category or "Poliposis" in risk_category:
-                interval = 1
-                timeline_years = 10
-            else:
-                interval = 3
-                timeline_years = 12
-        elif "Incrementado" in risk_category or "Intermedio" in risk_category:
-            interval = 5
-            timeline_years = 15
-        else:
-            if 50 <= age <= 75:
-                interval = 2  # For TSOMFi
-                timeline_years = 10
-            else:
-                interval = None
-                timeline_years = 0
-        
-        if interval:
+        results_section()
+
+@st.fragment(key="results")
+def results_section():
+    """Results of the last assessment; its buttons only rerun this fragment"""
+    if not st.session_state.show_results:
+        return
+    
+    st.markdown("---")
+    st.subheader("Resultados de la evaluación")
+    result = st.session_state.result
+    
+    # Basic info
+    st.write(f"**Edad:** {result.age} años | **IMC:** {result.bmi} kg/m²")
+    
+    # Risk category with styling
+    st.subheader("Estrategia de tamizaje recomendada")
+    risk_category = result.risk_category
+    if result.risk_level == RISK_LEVEL_CODE["high"]:
+        st.error(f"**{risk_category}**")
+    elif result.risk_level == RISK_LEVEL_CODE["increased"]:
+        st.info(f"**{risk_category}**")
+    else:
+        st.success(f"**{risk_category}**")
+    
+    # Recommendation
+    st.markdown(result.recommendation)
+    
+    # BMI note if applicable
+    if result.bmi_note:
+        st.markdown(result.bmi_note)
+    
+    # Symptoms warning if applicable
+    if result.any_symptoms:
+        st.error(result.symptoms_warning)
+        st.markdown(result.symptoms_detail)
+    
+    # Timeline visualization
+    st.subheader("Cronograma de tamizaje recomendado")
+    
+    # Create a basic timeline based on risk category
+    age = result.age
+    current_year = datetime.now().year
+    interval, timeline_years = result.screening_schedule()
+    
+    if interval:
+        with metrics.stage("timeline", result.category_code):
             years = [current_year + i*interval for i in range(int(timeline_years/interval) + 1)]
             timeline_data = pd.DataFrame({
                 'Año': years,
                 'Tamizaje': [f"Tamizaje #{i+1}" for i in range(len(years))]
             })
+        
+        st.dataframe(timeline_data, hide_index=True)
+    else:
+        if age < 50:
+            st.info("No se recomienda tamizaje de rutina antes de los 50 años para personas de riesgo promedio. Consulta con tu médico cuando cumplas 50 años o si desarrollas síntomas.")
+        elif age > 75:
+            st.info("El tamizaje de rutina no está recomendado después de los 75 años. Tu médico evaluará individualmente la necesidad de continuar el tamizaje basado en tu estado de salud general y expectativa de vida.")
+    
+    # Lifestyle recommendations
+    st.subheader("Recomendaciones para reducir el riesgo")
+    st.markdown(result.lifestyle_advice)
+    
+    # Summary
+    st.markdown("---")
+    st.markdown(f"### **Resumen final:** {result.summary}")
+    
+    # Download options
+    st.subheader("Guardar resultados")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        # The PDF is rendered in the background only when requested
+        pdf_args = (
+            str(age),
+            str(result.bmi),
+            result.summary,
+            result.risk_category,
+            result.recommendation,
+            result.lifestyle_advice,
+            result.any_symptoms
+        )
+        pdf_key = report_key(*pdf_args, datetime.today().strftime('%d/%m/%Y'))
+        pdf_state, _ = get_report_renderer().status(pdf_key)
+        # Poll only while the report is being prepared
+        polling = pdf_state == PREPARING
+        st.fragment(pdf_download_section, run_every=1 if polling else None)(
+            pdf_key, pdf_args, result.category_code, polling)
+    
+    with col2:
+        try:
+            # Generate JSON; the answers let ccr.reingest score the file again later
+            personal, family, polyp, symptoms = unpack_flags(result.flags)
+            save_data = {
+                "fecha_evaluacion": datetime.now().strftime("%Y-%m-%d"),
+                "edad": age,
+                "imc": result.bmi,
+                "categoria_riesgo": result.risk_category,
+                "recomendacion": result.recommendation,
+                "resumen": result.summary,
+                "version_guias": result.guidelines.version,
+                "codigo_riesgo": result.category_code,
+                "respuestas": {**personal, **family, **polyp},
+                "sintomas": symptoms
+            }
             
-            st.dataframe(timeline_data, hide_index=True)
+            with metrics.stage("json", result.category_code):
+                json_data = json.dumps(save_data, indent=4)
+            
+            st.download_button(
+                label="Guardar datos (JSON)",
+                data=json_data,
+                file_name=f"datos_evaluacion_ccr_{datetime.now().strftime('%Y%m%d')}.json",
+                mime="application/json",
+                help="Descarga los datos en formato JSON para futuras consultas o seguimiento",
+                on_click="ignore"
+            )
+        except Exception as e:
+            st.error(f"No se pudo crear el archivo JSON. Error: {str(e)}")
+    
+    # Start over button
+    st.button("Nueva evaluación", on_click=start_over)
+
+def submit_upload():
+    """Copy the uploaded file to disk, queue it and release the uploaded bytes"""
+    upload = st.session_state.get(f"upload_file_{st.session_state.upload_generation}")
+    if upload is None:
+        return
+    state, job_id = get_upload_scorer().submit(upload, st.session_state.get("upload_reports", False))
+    st.session_state.upload_busy = state == uploads.BUSY
+    st.session_state.upload_job = job_id
+    # A new uploader key drops the file Streamlit keeps for the old one
+    st.session_state.upload_generation += 1
+
+def discard_upload():
+    """Delete the files of the last upload so a new one can be made"""
+    get_upload_scorer().discard(st.session_state.upload_job)
+    st.session_state.upload_job = None
+
+def result_file(job_id, name):
+    """Download callable that reads a result file only when its button is clicked"""
+    def data():
+        path = get_upload_scorer().result_path(job_id, name)
+        if not path:
+            return b""
+        with open(path, "rb") as file:
+            return file.read()
+    return data
+
+def category_counts_table(counts):
+    """Running counts of an upload as a table of Spanish category names"""
+    category_text = guidelines.active().category_text
+    rows = sorted(counts.items(), key=lambda item: -item[1])
+    return pd.DataFrame({
+        "Categoría": [category_text[RISK_CODE[category]] or "Sin categoría" for category, _ in rows],
+        "Personas": [count for _, count in rows],
+    })
+
+def upload_status_section(job_id):
+    """Progress of an upload while it runs, then its downloads"""
+    job = get_upload_scorer().status(job_id)
+    if job["state"] == uploads.UNKNOWN:
+        st.session_state.upload_job = None
+        st.rerun()
+    
+    if job["state"] not in UPLOAD_FINISHED:
+        if job["state"] == uploads.REPORTS:
+            st.progress(1.0, text="Preparando los informes PDF...")
         else:
-            if age < 50:
-                st.info("No se recomienda tamizaje de rutina antes de los 50 años para personas de riesgo promedio. Consulta con tu médico cuando cumplas 50 años o si desarrollas síntomas.")
-            elif age > 75:
-                st.info("El tamizaje de rutina no está recomendado después de los 75 años. Tu médico evaluará individualmente la necesidad de continuar el tamizaje basado en tu estado de salud general y expectativa de vida.")
-        
-        # Lifestyle recommendations
-        st.subheader("Recomendaciones para reducir el riesgo")
-        st.markdown(st.session_state.data['lifestyle_advice'])
-        
-        # Summary
-        st.markdown("---")
-        st.markdown(f"### **Resumen final:** {st.session_state.data['summary']}")
-        
-        # Download options
-        st.subheader("Guardar resultados")
-        
-        col1, col2 = st.columns(2)
-        
+            st.progress(min(job["read"] / job["total"], 1.0) if job["total"] else 0.0,
+                        text=f"Procesando {job['read']:,} de {job['total']:,} registros...")
+    st.write(f"**Evaluados:** {job['scored']:,} | **Rechazados:** {job['rejected']:,}")
+    if job["counts"]:
+        st.dataframe(category_counts_table(job["counts"]), hide_index=True)
+    
+    if job["state"] == uploads.FAILED:
+        st.error(f"No se pudo procesar el archivo. Error: {str(job['error'])}")
+    elif job["state"] == uploads.DONE:
+        fecha = datetime.now().strftime('%Y%m%d')
+        col1, col2, col3 = st.columns(3)
         with col1:
-            try:
-                # Generate PDF
-                pdf_buffer = generate_pdf(
-                    str(age),
-                    str(st.session_state.data['bmi']),
-                    st.session_state.data['summary'],
-                    st.session_state.data['risk_category'],
-                    st.session_state.data['recommendation'],
-                    st.session_state.data['lifestyle_advice'],
-                    st.session_state.data['any_symptoms']
-                )
-                
-                st.download_button(
-                    label="Descargar PDF",
-                    data=pdf_buffer,
-                    file_name=f"evaluacion_riesgo_ccr_{datetime.now().strftime('%Y%m%d')}.pdf",
-                    mime="application/pdf",
-                    help="Descarga un PDF con los resultados de tu evaluación para compartir con tu médico"
-                )
-            except Exception as e:
-                st.error(f"No se pudo generar el PDF. Error: {str(e)}")
-        
+            st.download_button("Descargar resultados (CSV)", data=result_file(job_id, uploads.SCORED_FILE),
+                               file_name=f"evaluaciones_ccr_{fecha}.csv", mime="text/csv", on_click="ignore",
+                               disabled=not job["scored"])
         with col2:
-            try:
-                # Generate JSON
-                save_data = {
-                    "fecha_evaluacion": datetime.now().strftime("%Y-%m-%d"),
-                    "edad": age,
-                    "imc": st.session_state.data['bmi'],
-                    "categoria_riesgo": st.session_state.data['risk_category'],
-                    "recomendacion": st.session_state.data['recommendation'],
-                    "resumen": st.session_state.data['summary']
-                }
-                
-                st.download_button(
-                    label="Guardar datos (JSON)",
-                    data=json.dumps(save_data, indent=4),
-                    file_name=f"datos_evaluacion_ccr_{datetime.now().strftime('%Y%m%d')}.json",
-                    mime="application/json",
-                    help="Descarga los datos en formato JSON para futuras consultas o seguimiento"
-                )
-            except Exception as e:
-                st.error(f"No se pudo crear el archivo JSON. Error: {str(e)}")
-        
-        # Start over button
-        if st.button("Nueva evaluación"):
-            st.session_state.data = {}
-            st.session_state.show_results = False
-            st.experimental_rerun()
+            st.download_button("Descargar rechazados (CSV)", data=result_file(job_id, uploads.REJECTS_FILE),
+                               file_name=f"rechazados_ccr_{fecha}.csv", mime="text/csv", on_click="ignore",
+                               disabled=not job["rejected"])
+        with col3:
+            if job["with_reports"]:
+                st.download_button("Descargar informes (ZIP)", data=result_file(job_id, uploads.REPORTS_FILE),
+                                   file_name=f"informes_ccr_{fecha}.zip", mime="application/zip",
+                                   on_click="ignore", disabled=not job["reports"])
+    
+    if job["state"] in UPLOAD_FINISHED:
+        st.button("Nueva carga", on_click=discard_upload)
+    elif get_upload_scorer().status(job_id)["state"] in UPLOAD_FINISHED:
+        # Once the upload is done, rerun the page to stop polling
+        st.rerun()
+
+@st.fragment
+def upload_section():
+    """CSV upload of many patients, scored in the background"""
+    if "upload_job" not in st.session_state:
+        st.session_state.upload_job = None
+        st.session_state.upload_generation = 0
+    
+    job_id = st.session_state.upload_job
+    if job_id is not None:
+        running = get_upload_scorer().status(job_id)["state"] not in UPLOAD_FINISHED
+        # Poll only while the upload is being processed
+        st.fragment(upload_status_section, run_every=1 if running else None)(job_id)
+        return
+    
+    st.markdown(
+        "Subí un archivo CSV con una fila por paciente y las columnas `dob` (fecha de nacimiento), "
+        "`height_cm`, `weight_kg` y una columna por cada pregunta (si/no). Las demás columnas, "
+        "como un identificador de paciente, se copian al resultado."
+    )
+    if st.session_state.pop("upload_busy", False):
+        st.warning("Hay muchos archivos en proceso en este momento. Intentá nuevamente en unos minutos.")
+    st.file_uploader("Archivo de pacientes (CSV)", type=["csv"],
+                     key=f"upload_file_{st.session_state.upload_generation}")
+    st.checkbox("Incluir informes PDF (ZIP)", key="upload_reports",
+                help=f"Disponible para archivos de hasta {get_upload_scorer().reports_limit:,} pacientes")
+    st.button("Procesar archivo", on_click=submit_upload, type="primary")
+
+# Metrics exporters, if configured
+start_metrics_exporters()
+start_guidelines_watcher()
+
+# App layout
+st.title("Evaluación de riesgo para tamizaje de cáncer colorrectal")
+st.markdown(
+    "Herramienta para pacientes: responde tus datos para obtener tu estrategia de tamizaje según la Guía Argentina del Instituto Nacional del Cáncer."
+)
+
+# Create two columns - main content and sidebar
+col_main, col_side = st.columns([3, 1])
+
+with col_side:
+    render_sidebar()
+
+# Main content area: the form for one person, and for staff a CSV file of many
+with col_main:
+    if STAFF_UPLOAD:
+        tab_form, tab_upload = st.tabs(["Evaluación individual", "Carga de archivo (CSV)"])
+        with tab_form:
+            assessment_section()
+        with tab_upload:
+            upload_section()
+    else:
+        assessment_section()
 
 # Footer with disclaimer
 st.markdown("---")
@@ -0,0 +1,59 @@
+"""Dashboard counts from the cube against GROUP BY over the assessment history.
+
+Grows one assessment store to each size in turn (see
+benchmarks.bench_rescore.fill for the answer rates). At each size it times
+reading the cube, which is all the dashboard page reads, and the same
+counts computed with GROUP BY over every stored assessment, and checks
+that both agree. Filling also times the store's writes with the cube kept
+up to date on every commit.
+
+Usage:
+    python -m benchmarks.bench_cube --sizes 10000,100000,1000000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.bench_rescore import fill
+from ccr.cube import _cell, cube_counts
+from ccr.store import open_database
+
+REPEAT = 20
+
+
+def median_ms(query):
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        result = query()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated history sizes")
+    args = parser.parse_args(argv)
+
+    group_by = (f"SELECT {', '.join(_cell(''))}, COUNT(*) FROM assessments GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "registry.db")
+        stored = 0
+        print(f"{'assessments':>12} {'fill s':>7} {'cube ms':>8} {'group by ms':>12} {'cells':>6}  same")
+        for size in (int(value) for value in args.sizes.split(",")):
+            started = time.perf_counter()
+            fill(path, size - stored, seed=stored)
+            fill_seconds = time.perf_counter() - started
+            stored = size
+            connection = open_database(path)
+            cube_ms, cells = median_ms(lambda: cube_counts(connection))
+            group_ms, rows = median_ms(lambda: connection.execute(group_by).fetchall())
+            same = [cell[-1] for cell in cells] == [row[-1] for row in rows]
+            connection.close()
+            print(f"{size:>12,} {fill_seconds:>7.1f} {cube_ms:>8.2f} {group_ms:>12.1f} {len(cells):>6}  {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Batch scoring of a registry with repeated people, with and without dedup.
+
+Writes a synthetic registry (see benchmarks.synthetic) in which every person
+appears several times, as in merged extracts: some repeats have the patient
+id typed in another case or with dashes, or the date of birth as DD/MM/YYYY.
+Scores it without dedup, with repeats flagged, with repeats dropped, and
+dropped again with an index small enough to move to disk, and checks that
+the flagged output matches the plain one. Reports:
+    - seconds and records per second of each run
+    - distinct inputs, distinct people and the dedup ratios
+    - PDF reports of a slice of the output, rendered against written
+
+Usage:
+    python -m benchmarks.bench_dedup --people 50000 --copies 3
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import registry_frame
+from ccr.bulk_reports import write_reports_zip
+from ccr.dedup import Deduplicator
+from ccr.pipeline import score_file
+
+REPORT_ROWS = 2000
+
+
+def duplicated_registry(path, people, copies, seed=0):
+    """Write people records, each repeated on average copies times in shuffled order, with typing variants"""
+    rng = np.random.default_rng(seed)
+    frame = registry_frame(people, seed=seed)
+    frame = frame.iloc[rng.integers(0, people, people * copies)].reset_index(drop=True)
+    retyped = rng.random(len(frame)) < 0.2
+    frame.loc[retyped, "patient_id"] = "p-" + frame.loc[retyped, "patient_id"].str[1:]
+    local = rng.random(len(frame)) < 0.2
+    frame.loc[local, "dob"] = pd.to_datetime(frame.loc[local, "dob"]).dt.strftime("%d/%m/%Y")
+    frame.to_csv(path, index=False)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--people", type=int, default=50_000, help="distinct people in the registry")
+    parser.add_argument("--copies", type=int, default=3, help="average records per person")
+    parser.add_argument("--spill-keys", type=int, default=10_000, help="in-memory keys of the spilling run")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = duplicated_registry(os.path.join(directory, "registro.csv"), args.people, args.copies)
+        rejects = os.path.join(directory, "rechazados.csv")
+        runs = (("none", None, None), ("flag", "flag", None), ("drop", "drop", None),
+                ("drop, spilled", "drop", args.spill_keys))
+        outputs = {}
+        print(f"{'dedup':>14} {'seconds':>8} {'records/s':>10} {'scored':>8} {'inputs':>7} {'x':>5} "
+              f"{'people':>7} {'x':>5}  spilled")
+        for name, mode, max_keys in runs:
+            output = outputs[name] = os.path.join(directory, f"{name.replace(', ', '_')}.csv")
+            if max_keys is None:
+                summary = score_file(source, output, rejects, dedup=mode)
+            else:
+                with Deduplicator(mode, max_keys=max_keys) as deduplicator:
+                    summary = score_file(source, output, rejects, dedup=deduplicator)
+            dedup = summary.get("dedup")
+            columns = (f"{dedup['distinct_inputs']:>7,} {dedup['input_ratio']:>5.2f} {dedup['people']:>7,} "
+                       f"{dedup['people_ratio']:>5.2f}  {dedup['spilled']}" if dedup else f"{'':>30}")
+            print(f"{name:>14} {summary['seconds']:>8.2f} {summary['read'] / summary['seconds']:>10,.0f} "
+                  f"{summary['scored']:>8,} {columns}")
+
+        plain = pd.read_csv(outputs["none"], dtype=str)
+        flagged = pd.read_csv(outputs["flag"], dtype=str).drop(columns="repeat")
+        print(f"flagged output matches the plain one: {plain.equals(flagged)}")
+        dropped = pd.read_csv(outputs["drop"], dtype=str)
+        spilled = pd.read_csv(outputs["drop, spilled"], dtype=str)
+        print(f"spilled drop output matches the in-memory one: {dropped.equals(spilled)}")
+
+        sample = os.path.join(directory, "muestra.csv")
+        plain.iloc[:REPORT_ROWS].to_csv(sample, index=False)
+        started = time.perf_counter()
+        summary = write_reports_zip(sample, os.path.join(directory, "informes.zip"))
+        print(f"{summary['reports']:,} reports, {summary['rendered']:,} rendered, "
+              f"in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
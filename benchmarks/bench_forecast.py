@@ -0,0 +1,92 @@
+"""Screening-capacity forecast of a large scored cohort.
+
+Scores a synthetic registry, then times the vectorized forecast of the
+procedures needed per year and method. A per-person Python expansion of
+the same schedules runs on a sample, to check that both agree and to show
+what the array version saves.
+
+Usage:
+    python -m benchmarks.bench_forecast --rows 1000000 --years 15 --check-rows 100000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import registry_frame
+from ccr.codes import RISK_CODE
+from ccr.forecast import AVERAGE_RISK_INTERVALS, METHODS, forecast, parse_mix, screening_ages
+from ccr.guidelines import active
+from ccr.pipeline import score_chunk
+
+CHUNK = 200_000
+
+
+def scored_cohort(n_rows):
+    """Risk category names and ages of n_rows scored people"""
+    frames = []
+    for start in range(0, n_rows, CHUNK):
+        scored, _ = score_chunk(registry_frame(min(CHUNK, n_rows - start), seed=start, first_id=start))
+        frames.append(scored[["risk_category", "age"]])
+    return pd.concat(frames, ignore_index=True)
+
+
+def forecast_loop(frame, years, mix):
+    """Reference forecast expanding each person's schedule one year at a time"""
+    procedures = np.zeros((years, len(METHODS)))
+    first_age, last_age = screening_ages()
+    schedules = active().screening_schedule
+    for category, age in zip(frame["risk_category"], frame["age"]):
+        risk = RISK_CODE[category]
+        schedule = schedules[risk]
+        if schedule is not None:
+            interval, timeline_years = schedule
+            for year in range(min(years, timeline_years + 1)):
+                if year % interval == 0:
+                    procedures[year, METHODS.index("colonoscopy")] += 1
+                elif category == "advanced_adenoma":
+                    procedures[year, METHODS.index("fit")] += 1
+        elif category in ("average", "under_50"):
+            start = max(first_age - age, 0)
+            for method, share in mix.items():
+                for year in range(start, years, AVERAGE_RISK_INTERVALS[method]):
+                    if age + year <= last_age:
+                        procedures[year, METHODS.index(method)] += share
+    return procedures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000, help="people in the cohort")
+    parser.add_argument("--years", type=int, default=15)
+    parser.add_argument("--check-rows", type=int, default=100_000, help="people expanded by the Python loop")
+    parser.add_argument("--mix", type=parse_mix, default="fit=0.8,colonoscopy=0.1,rsc=0.1")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    cohort = scored_cohort(args.rows)
+    print(f"scored {len(cohort):,} people in {time.perf_counter() - started:.1f}s")
+
+    durations = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        procedures = forecast(cohort, args.years, average_risk_mix=args.mix)
+        durations.append(time.perf_counter() - started)
+    print(f"vectorized forecast, {args.years} years: best {min(durations) * 1000:.1f} ms")
+    print(procedures.round(0).astype(int).to_string())
+
+    sample = cohort.head(args.check_rows)
+    started = time.perf_counter()
+    expected = forecast_loop(sample, args.years, args.mix)
+    loop_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    actual = forecast(sample, args.years, average_risk_mix=args.mix).to_numpy()
+    vector_seconds = time.perf_counter() - started
+    print(f"\n{len(sample):,} people: Python loop {loop_seconds:.2f}s, vectorized {vector_seconds * 1000:.1f} ms, "
+          f"same result: {np.allclose(expected, actual)}")
+
+
+if __name__ == "__main__":
+    main()
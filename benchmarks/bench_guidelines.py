@@ -0,0 +1,123 @@
+"""Compilation and hot reload of the guidelines file.
+
+Times how long the bundled guidelines take to load and compile into the
+decision table. Then several threads keep evaluating assessments while the
+main thread swaps two versions of the guidelines back and forth, and it
+checks that:
+    - evaluation latency does not change while reloads happen
+    - every result renders entirely with one version, never a mix of both
+
+The second version is the bundled file with a different version string and
+category texts, written to a temporary file.
+
+Usage:
+    python -m benchmarks.bench_guidelines --threads 4 --seconds 5 --reloads 50
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from ccr import guidelines
+from ccr.decision_table import FLAG_COMBINATIONS, unpack_flags
+from ccr.results import AssessmentResult
+
+
+def percentile_ms(durations, percentile):
+    ordered = sorted(durations)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))] * 1000
+
+
+def revised_copy(directory):
+    """Write the bundled guidelines with a new version and marked category texts; return the path"""
+    with open(guidelines.DEFAULT_PATH, encoding="utf-8") as f:
+        spec = json.load(f)
+    spec["version"] += "-rev"
+    for category in spec["categories"]:
+        if category["category"]:
+            category["category"] += " (rev)"
+    path = os.path.join(directory, "guidelines-rev.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(spec, f, ensure_ascii=False)
+    return path
+
+
+def evaluate_loop(inputs, stop, durations, inconsistent):
+    position = 0
+    while not stop.is_set():
+        arguments = inputs[position % len(inputs)]
+        position += 1
+        started = time.perf_counter()
+        result = AssessmentResult.evaluate(*arguments)
+        texts = result.texts()
+        durations.append(time.perf_counter() - started)
+        revised = result.guidelines.version.endswith("-rev")
+        if texts[0] and texts[0].endswith(" (rev)") != revised:
+            inconsistent.append(result.to_dict())
+
+
+def run_phase(inputs, threads, seconds, swap=None):
+    """Evaluate on several threads for a while; swap() is called in a loop meanwhile"""
+    stop = threading.Event()
+    durations = [[] for _ in range(threads)]
+    inconsistent = []
+    workers = [threading.Thread(target=evaluate_loop, args=(inputs, stop, durations[i], inconsistent))
+               for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    swaps = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        if swap is None:
+            time.sleep(0.05)
+        else:
+            swap(swaps)
+            swaps += 1
+    stop.set()
+    for worker in workers:
+        worker.join()
+    return [d for thread in durations for d in thread], inconsistent, swaps
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0, help="duration of each phase")
+    parser.add_argument("--reloads", type=int, default=50, help="most reloads per second during the swap phase")
+    parser.add_argument("--repeat", type=int, default=20, help="compilations timed")
+    args = parser.parse_args(argv)
+
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        compiled = guidelines.load_guidelines(guidelines.DEFAULT_PATH)
+        timings.append(time.perf_counter() - started)
+    print(f"load and compile {guidelines.DEFAULT_PATH.name} ({len(compiled.table):,} cells): "
+          f"best {min(timings) * 1000:.1f} ms, median {statistics.median(timings) * 1000:.1f} ms")
+
+    rng = random.Random(0)
+    inputs = [(rng.randint(18, 95), rng.choice((None, 22.0, 27.5, 33.1)),
+               *unpack_flags(rng.randrange(FLAG_COMBINATIONS))) for _ in range(10_000)]
+    guidelines.activate(compiled)
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = (str(guidelines.DEFAULT_PATH), revised_copy(directory))
+
+        def swap(count):
+            guidelines.reload(paths[count % 2])
+            time.sleep(1 / args.reloads)
+
+        for name, phase_swap in (("steady", None), ("reloading", swap)):
+            durations, inconsistent, swaps = run_phase(inputs, args.threads, args.seconds, phase_swap)
+            print(f"{name:>9}: {len(durations):,} evaluations, {swaps} reloads, "
+                  f"p50 {percentile_ms(durations, 50) * 1000:.1f} us, p99 {percentile_ms(durations, 99) * 1000:.1f} us, "
+                  f"mixed results: {len(inconsistent)}")
+    guidelines.activate(compiled)
+
+
+if __name__ == "__main__":
+    main()
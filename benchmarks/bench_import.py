@@ -0,0 +1,74 @@
+"""Cold-start cost of the core package in a fresh interpreter.
+
+Each measurement runs in a new process with ``python -X importtime`` and
+reports the time spent importing modules beyond what an empty interpreter
+imports, which heavy third-party packages were pulled in, and the wall
+time of the whole process. The "first" rows also include the work deferred
+to the first call (the decision table and the report template).
+
+Usage:
+    python -m benchmarks.bench_import --repeat 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ("streamlit", "pandas", "numpy", "fpdf")
+
+# (label, statement run in the fresh process)
+CASES = (
+    ("import ccr.rules", "import ccr.rules"),
+    ("import ccr", "import ccr"),
+    ("import ccr.report", "import ccr.report"),
+    ("import ccr.service", "import ccr.service"),
+    ("import ccr.pipeline", "import ccr.pipeline"),
+    ("app.py top-level imports", "import streamlit, pandas, fpdf"),
+    ("first AssessmentResult", "import ccr; ccr.AssessmentResult.evaluate(60, 27.0, {}, {}, {}, False)"),
+    ("first generate_pdf", "import ccr; ccr.generate_pdf('60', '27.0', '', '', '', None, False)"),
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_case(statement):
+    """
+    Run statement in a fresh interpreter
+
+    Returns:
+        Tuple (total import ms, process wall ms, heavy modules loaded)
+    """
+    probe = f"{statement}; import sys; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", probe], cwd=ROOT,
+                               capture_output=True, text=True, check=True)
+    wall = (time.perf_counter() - started) * 1000
+    total = 0.0
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package, indented by nesting level
+        fields = line.split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit() and not fields[2][1:].startswith(" "):
+            total += int(fields[1]) / 1000
+    return total, wall, completed.stdout.strip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="fresh processes per case")
+    args = parser.parse_args(argv)
+
+    empty = [run_case("pass") for _ in range(args.repeat)]
+    baseline_imports = statistics.median(run[0] for run in empty)
+    print(f"empty interpreter: {statistics.median(run[1] for run in empty):.0f} ms")
+    print(f"{'case':<26} {'import ms':>10} {'process ms':>11}  heavy modules loaded")
+    for label, statement in CASES:
+        runs = [run_case(statement) for _ in range(args.repeat)]
+        import_ms = max(statistics.median(run[0] for run in runs) - baseline_imports, 0.0)
+        wall_ms = statistics.median(run[1] for run in runs)
+        print(f"{label:<26} {import_ms:>10.1f} {wall_ms:>11.0f}  {runs[-1][2] or '-'}")
+
+
+if __name__ == "__main__":
+    main()
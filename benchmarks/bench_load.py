@@ -0,0 +1,250 @@
+"""Load benchmark of app.py with many concurrent simulated sessions.
+
+Phases:
+    sessions: every thread drives its own AppDriver session through form
+        submissions sampled across the whole input space (answers, ages and
+        BMI bands). Some submissions go on to prepare the PDF or start over.
+        Reported as rerun latency percentiles per interaction and the growth
+        of peak RSS per session.
+    evaluate: evaluate_risk and AssessmentResult.evaluate calls per second
+        over inputs drawn uniformly from every flag combination.
+    pdf: generate_pdf reports and bytes per second.
+
+The results go to a JSON file together with the commit, interpreter and
+parameters of the run. Pass --compare with an earlier file to print the
+change of every figure.
+
+Usage:
+    python -m benchmarks.bench_load --sessions 8 --submissions 10
+    python -m benchmarks.bench_load -o baseline.json
+    python -m benchmarks.bench_load --compare baseline.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+import warnings
+
+import numpy as np
+import streamlit as st
+
+from benchmarks.harness import AppDriver
+from ccr import metrics
+from ccr.decision_table import FLAG_COMBINATIONS, unpack_flags
+from ccr.report import generate_pdf
+from ccr.results import AssessmentResult
+from ccr.rules import evaluate_risk
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Share of submissions followed by each click
+PDF_RATE = 0.3
+START_OVER_RATE = 0.3
+# Share of checkboxes ticked in a sampled submission
+CHECK_RATE = 0.2
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentiles(values):
+    """Return {"p50": ms, ...} for a list of durations in seconds"""
+    ordered = sorted(values)
+    return {f"p{p}": round(ordered[min(len(ordered) * p // 100, len(ordered) - 1)] * 1000, 3)
+            for p in PERCENTILES}
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def sample_inputs(n, seed=0):
+    """evaluate_risk arguments covering every flag combination, age and BMI band"""
+    rng = np.random.default_rng(seed)
+    flags = rng.integers(0, FLAG_COMBINATIONS, n)
+    ages = rng.integers(18, 100, n)
+    bmis = rng.uniform(15, 50, n).round(1)
+    return [(int(age), float(bmi)) + unpack_flags(int(flag)) for age, bmi, flag in zip(ages, bmis, flags)]
+
+
+def run_session(driver, submissions, rng, timings):
+    """Drive one session; appends (interaction, latency, script seconds) to timings"""
+    labels = [checkbox.label for checkbox in driver.at.checkbox]
+    for _ in range(submissions):
+        dob = datetime.date.today() - datetime.timedelta(days=rng.randrange(18 * 365, 100 * 365))
+        height = rng.randrange(145, 200)
+        weight = rng.randrange(40, 150)
+        checked = [label for label in labels if rng.random() < CHECK_RATE]
+        latency, script, _ = driver.submit(dob, str(height), str(weight), checked)
+        timings.append(("Evaluar mi riesgo", latency, script))
+        for label, rate in (("Preparar PDF", PDF_RATE), ("Nueva evaluación", START_OVER_RATE)):
+            # The PDF button is not shown when the report is already cached
+            if rng.random() < rate and any(button.label == label for button in driver.at.button):
+                latency, script, _ = driver.click(label)
+                timings.append((label, latency, script))
+
+
+def sessions_phase(n_sessions, submissions, seed):
+    """Run n_sessions concurrent sessions, each in its own thread"""
+    st.cache_resource.clear()
+    metrics.reset()
+    drivers = [AppDriver() for _ in range(n_sessions)]
+    rss_before = peak_rss_bytes()
+    timings = []
+    errors = []
+    barrier = threading.Barrier(n_sessions)
+
+    def session(index):
+        try:
+            barrier.wait()
+            timings.append(("page load",) + drivers[index].run()[:2])
+            run_session(drivers[index], submissions, random.Random(seed + index), timings)
+        except Exception as error:
+            errors.append(repr(error))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(index,)) for index in range(n_sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    rss_after = peak_rss_bytes()
+
+    interactions = {}
+    for label in dict.fromkeys(timing[0] for timing in timings):
+        latencies = [timing[1] for timing in timings if timing[0] == label]
+        scripts = [timing[2] for timing in timings if timing[0] == label]
+        interactions[label] = {
+            "count": len(latencies),
+            "latency_ms": percentiles(latencies),
+            "script_ms": percentiles(scripts),
+        }
+    stages = {stage_name: {category or "-": count for category, (count, _) in categories.items()}
+              for stage_name, categories in metrics.summary().items()}
+    return {
+        "sessions": n_sessions,
+        "submissions_per_session": submissions,
+        "seconds": round(elapsed, 3),
+        "reruns_per_second": round(len(timings) / elapsed, 2),
+        "rerun_latency_ms": percentiles([timing[1] for timing in timings]),
+        "interactions": interactions,
+        "peak_rss_mb": round(rss_after / 2 ** 20, 1),
+        "peak_rss_per_session_kb": round(max(rss_after - rss_before, 0) / n_sessions / 1024, 1),
+        "risk_categories": stages.get("evaluate_risk", {}),
+        "errors": errors,
+    }
+
+
+def evaluate_phase(n_calls, seed):
+    inputs = sample_inputs(n_calls, seed)
+    AssessmentResult.evaluate(*inputs[0])
+    rates = {}
+    for name, evaluate in (("evaluate_risk", evaluate_risk), ("AssessmentResult.evaluate", AssessmentResult.evaluate)):
+        started = time.perf_counter()
+        for arguments in inputs:
+            evaluate(*arguments)
+        rates[name] = round(n_calls / (time.perf_counter() - started))
+    return {"calls": n_calls, "calls_per_second": rates}
+
+
+def pdf_phase(n_reports, seed):
+    reports = []
+    for arguments in sample_inputs(n_reports, seed):
+        result = AssessmentResult.evaluate(*arguments)
+        reports.append((str(result.age), str(result.bmi), result.summary, result.risk_category,
+                        result.recommendation, result.lifestyle_advice, result.any_symptoms))
+    generate_pdf(*reports[0])
+    started = time.perf_counter()
+    total_bytes = sum(generate_pdf(*report).getbuffer().nbytes for report in reports)
+    elapsed = time.perf_counter() - started
+    return {
+        "reports": n_reports,
+        "reports_per_second": round(n_reports / elapsed, 2),
+        "bytes_per_second": round(total_bytes / elapsed),
+        "mean_report_bytes": round(total_bytes / n_reports),
+    }
+
+
+def run_info(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "streamlit": st.__version__,
+        "cpus": os.cpu_count(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+    }
+
+
+def flatten(results, prefix=""):
+    """Yield (dotted name, number) for every numeric leaf"""
+    for key, value in results.items():
+        if isinstance(value, dict):
+            yield from flatten(value, f"{prefix}{key}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f"{prefix}{key}", value
+
+
+def compare(previous, current):
+    """Print every figure of the previous run next to the current one"""
+    before = dict(flatten(previous["results"]))
+    print(f"\ncompared with {previous['run']['timestamp']} (commit {previous['run']['commit']})")
+    for name, value in flatten(current["results"]):
+        if name in before:
+            change = f"{value / before[name] - 1:+.1%}" if before[name] else ""
+            print(f"  {name:<60} {before[name]:>12} -> {value:>12} {change:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent simulated sessions")
+    parser.add_argument("--submissions", type=int, default=10, help="form submissions per session")
+    parser.add_argument("--calls", type=int, default=100_000, help="evaluations in the evaluate phase")
+    parser.add_argument("--reports", type=int, default=200, help="reports in the pdf phase")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="results file (default: benchmarks/results/load-<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    args = parser.parse_args(argv)
+    warnings.simplefilter("ignore")
+
+    # Warm up imports, the decision table and the report template
+    sessions_phase(1, 1, args.seed)
+
+    results = {
+        "sessions": sessions_phase(args.sessions, args.submissions, args.seed),
+        "evaluate": evaluate_phase(args.calls, args.seed),
+        "pdf": pdf_phase(args.reports, args.seed),
+    }
+    report = {"run": run_info(args), "results": results}
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"load-{time.strftime('%Y%m%dT%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    print(f"written to {output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
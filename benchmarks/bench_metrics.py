@@ -0,0 +1,61 @@
+"""Cost of the stage instrumentation, enabled and disabled.
+
+Reports the time per ``metrics.stage`` block on its own, and the throughput
+of the service's score_patient path (validation, evaluation and counter),
+with metrics on and off.
+
+Usage:
+    python -m benchmarks.bench_metrics --iterations 200000
+"""
+import argparse
+import time
+
+from benchmarks.synthetic import registry_frame
+from ccr import metrics
+from ccr.service import score_patient
+
+
+def empty_stages(iterations):
+    """Seconds per timed empty block"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        with metrics.stage("empty", "average"):
+            pass
+    return (time.perf_counter() - started) / iterations
+
+
+def score_patients(patients):
+    """Seconds per scored patient"""
+    started = time.perf_counter()
+    for patient in patients:
+        score_patient(patient, texts=False)
+    return (time.perf_counter() - started) / len(patients)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200_000, help="timed blocks per mode")
+    parser.add_argument("--patients", type=int, default=50_000, help="patients scored per mode")
+    parser.add_argument("--rounds", type=int, default=3, help="alternating rounds per mode, the best is kept")
+    args = parser.parse_args(argv)
+
+    patients = registry_frame(args.patients).drop(columns="patient_id").to_dict("records")
+    score_patients(patients[:1000])
+
+    print(f"{'metrics':<10} {'stage() ns':>11} {'score_patient us':>17}")
+    results = {False: [], True: []}
+    for _ in range(args.rounds):
+        for enabled in (False, True):
+            metrics.set_enabled(enabled)
+            metrics.reset()
+            results[enabled].append((empty_stages(args.iterations), score_patients(patients)))
+    for enabled in (False, True):
+        results[enabled] = [min(times) for times in zip(*results[enabled])]
+        stage_seconds, patient_seconds = results[enabled]
+        print(f"{'on' if enabled else 'off':<10} {stage_seconds * 1e9:>11.0f} {patient_seconds * 1e6:>17.2f}")
+    overhead = results[True][1] / results[False][1] - 1
+    print(f"score_patient overhead with metrics on: {overhead:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Scaling curve of sharded batch scoring.
+
+Usage:
+    python -m benchmarks.bench_parallel --rows 1000000 --workers 1 2 4 8 16
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks.synthetic import write_registry_csv
+from ccr.parallel import score_file_parallel
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, 8, 16, os.cpu_count() or 1}))
+    parser.add_argument("--chunksize", type=int, default=20_000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = write_registry_csv(os.path.join(tmp, "registry.csv"), args.rows)
+        print(f"{args.rows} rows, {os.cpu_count()} CPUs")
+        print(f"{'workers':>8} {'seconds':>9} {'rows/s':>12} {'speedup':>8} {'efficiency':>10}")
+        baseline = None
+        for workers in args.workers:
+            summary = score_file_parallel(
+                input_path, os.path.join(tmp, "scored.csv"), os.path.join(tmp, "rejects.csv"),
+                workers=workers, chunksize=args.chunksize)
+            seconds = summary["seconds"]
+            if baseline is None:
+                # single-worker time, extrapolated if the first run used more workers
+                baseline = seconds * workers
+            speedup = baseline / seconds
+            print(f"{workers:>8} {seconds:>9.2f} {args.rows / seconds:>12,.0f} "
+                  f"{speedup:>8.2f} {speedup / workers:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
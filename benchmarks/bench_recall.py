@@ -0,0 +1,96 @@
+"""Recall scheduler over a large registry within a fixed memory budget.
+
+Fills a store with assessments made over the last ten years. A first pass
+catches up on every reminder already due. Then a year of nightly runs
+follows, each taking in the day's new assessments and popping the day's
+reminders. Reports the time per night, the events held in memory against
+the budget, and how many future screenings the registry represents.
+
+Usage:
+    python -m benchmarks.bench_recall --rows 1000000 --memory-mb 16 --daily 3000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.bench_load import sample_inputs
+from benchmarks.bench_store import fill
+from ccr.recall import RecallScheduler
+from ccr.results import AssessmentResult
+from ccr.store import AssessmentStore, add_years, assessment_row
+
+
+def future_events(path):
+    """Screenings still ahead in the registry, counting every remaining one of each timeline"""
+    total = 0
+    rows = sqlite3.connect(path).execute(
+        "SELECT assessed_at, next_due, interval_years, code, age, bmi, flags FROM assessments"
+        " WHERE next_due IS NOT NULL")
+    for assessed_at, next_due, interval, code, age, bmi, flags in rows:
+        if not interval:
+            total += 1
+            continue
+        _, years = AssessmentResult(age, bmi, flags, code).screening_schedule()
+        end = add_years(date.fromisoformat(assessed_at[:10]), years)
+        total += (end.year - date.fromisoformat(next_due).year) // interval + 1
+    return total
+
+
+def heap_bytes(scheduler):
+    heap = scheduler._heap
+    return sys.getsizeof(heap) + sum(sys.getsizeof(key) for key in heap)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000, help="assessments in the registry")
+    parser.add_argument("--memory-mb", type=float, default=16, help="memory budget of the due queue")
+    parser.add_argument("--daily", type=int, default=3000, help="new assessments per night")
+    parser.add_argument("--nights", type=int, default=365)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    results = [AssessmentResult.evaluate(*arguments) for arguments in sample_inputs(10_000, 1)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "registry.db")
+        with AssessmentStore(path) as store:
+            fill(store, args.rows)
+        today = date.today()
+        budget = int(args.memory_mb * 2 ** 20)
+        print(f"{args.rows:,} assessments, memory budget {args.memory_mb:g} MiB")
+
+        with RecallScheduler(path, memory_budget=budget) as scheduler:
+            started = time.perf_counter()
+            scheduler.refresh()
+            overdue = len(scheduler.pop_due(today))
+            print(f"catch-up: {overdue:,} overdue reminders in {time.perf_counter() - started:.1f}s")
+            print(f"future screenings represented: {future_events(path):,}")
+
+            nights = []
+            reminders = 0
+            largest = 0
+            with AssessmentStore(path) as store:
+                for night in range(1, args.nights + 1):
+                    day = today + timedelta(days=night)
+                    assessed_at = datetime.combine(day, datetime.min.time())
+                    store.add_rows([assessment_row(rng.choice(results), assessed_at) for _ in range(args.daily)])
+                    store.flush()
+                    started = time.perf_counter()
+                    scheduler.refresh()
+                    reminders += len(scheduler.pop_due(day))
+                    nights.append(time.perf_counter() - started)
+                    largest = max(largest, heap_bytes(scheduler))
+
+        print(f"{args.nights} nights, {args.daily:,} new assessments each: {reminders:,} reminders")
+        print(f"per night ms: median {statistics.median(nights) * 1000:.1f}, max {max(nights) * 1000:.1f}")
+        print(f"largest heap: {largest / 2 ** 20:.1f} MiB of {args.memory_mb:g} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Bulk re-ingestion of saved JSON assessments.
+
+Writes exports as the results page saves them, for a registry with realistic
+answer rates (see benchmarks.synthetic): a share in the old format, without
+answers, and a few broken ones. The same exports are written as a directory
+of .json files and as one JSONL file. Both are scored again with an edited
+version of the guidelines (serrated polyps count without resection), once
+per worker count, and the benchmark reports exports per second and how many
+changed category.
+
+Usage:
+    python -m benchmarks.bench_reingest --exports 200000 --workers 1,2,4
+"""
+import argparse
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+
+import numpy as np
+
+from benchmarks.bench_rescore import serrated_without_resection
+from benchmarks.synthetic import FLAG_RATES
+from ccr import guidelines
+from ccr.decision_table import FLAG_BITS, SYMPTOMS_BIT, unpack_flags
+from ccr.reingest import reingest
+from ccr.results import AssessmentResult
+
+SYMPTOM_RATE = 0.1
+OLD_FORMAT_RATE = 0.3
+BROKEN_RATE = 0.001
+FILES_PER_DIRECTORY = 10_000
+
+
+def exports(n_exports, seed=0):
+    """Yield the JSON text of n_exports saved assessments"""
+    rng = np.random.default_rng(seed)
+    flags = (rng.random(n_exports) < SYMPTOM_RATE) * SYMPTOMS_BIT
+    for bit, (_, key) in enumerate(FLAG_BITS[:-1]):
+        flags |= (rng.random(n_exports) < FLAG_RATES[key]).astype(np.int64) << bit
+    ages = rng.integers(20, 90, n_exports)
+    bmis = rng.normal(26, 4, n_exports).round(1)
+    days = rng.integers(1, 3650, n_exports)
+    old_format = rng.random(n_exports) < OLD_FORMAT_RATE
+    broken = rng.random(n_exports) < BROKEN_RATE
+    today = date.today()
+    for index in range(n_exports):
+        if broken[index]:
+            yield '{"fecha_evaluacion": "2024-13-01", "edad": "sesenta"}'
+            continue
+        personal, family, polyp, symptoms = unpack_flags(int(flags[index]))
+        result = AssessmentResult.evaluate(int(ages[index]), float(bmis[index]), personal, family, polyp, symptoms)
+        record = {
+            "fecha_evaluacion": (today - timedelta(days=int(days[index]))).isoformat(),
+            "edad": result.age,
+            "imc": result.bmi,
+            "categoria_riesgo": result.risk_category,
+            "recomendacion": result.recommendation,
+            "resumen": result.summary,
+        }
+        if not old_format[index]:
+            record.update({
+                "version_guias": result.guidelines.version,
+                "codigo_riesgo": result.category_code,
+                "respuestas": {**personal, **family, **polyp},
+                "sintomas": symptoms,
+            })
+        yield json.dumps(record, ensure_ascii=False)
+
+
+def write_sources(directory, n_exports):
+    """Write the exports as a tree of .json files and as a JSONL file; return both paths"""
+    tree = os.path.join(directory, "exports")
+    jsonl = os.path.join(directory, "exports.jsonl")
+    with open(jsonl, "w", encoding="utf-8") as lines:
+        for index, text in enumerate(exports(n_exports)):
+            folder = os.path.join(tree, f"{index // FILES_PER_DIRECTORY:04d}")
+            if index % FILES_PER_DIRECTORY == 0:
+                os.makedirs(folder)
+            with open(os.path.join(folder, f"datos_evaluacion_ccr_{index:08d}.json"), "w", encoding="utf-8") as f:
+                f.write(text)
+            lines.write(text + "\n")
+    return tree, jsonl
+
+
+def edited_guidelines(directory):
+    """Write the bundled guidelines with serrated polyps counted without resection; return the path"""
+    with open(guidelines.DEFAULT_PATH, encoding="utf-8") as f:
+        spec = json.load(f)
+    serrated_without_resection(spec)
+    spec["version"] += "-edit"
+    path = os.path.join(directory, "guidelines-edit.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(spec, f, ensure_ascii=False)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--exports", type=int, default=200_000, help="saved assessments")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        sources = write_sources(directory, args.exports)
+        bundled = guidelines.active()
+        # Workers are forked and inherit the edited guidelines
+        guidelines.activate(guidelines.load_guidelines(edited_guidelines(directory)))
+        try:
+            for source in sources:
+                for workers in (int(count) for count in args.workers.split(",")):
+                    summary = reingest(source, os.path.join(directory, "out.csv"),
+                                       os.path.join(directory, "rejects.csv"), workers=workers)
+                    rate = summary["read"] / summary["seconds"]
+                    print(f"{os.path.basename(source):>13} workers={workers}: {summary['read']:,} read, "
+                          f"{summary['rejected']:,} rejected, {summary['changed']:,} changed, "
+                          f"{summary['inferred']:,} inferred in {summary['seconds']:.1f}s ({rate:,.0f}/s)")
+        finally:
+            guidelines.activate(bundled)
+
+
+if __name__ == "__main__":
+    main()
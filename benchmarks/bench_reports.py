@@ -0,0 +1,181 @@
+"""Per-report and batch render time of the compiled report template.
+
+Compares ccr.report.generate_pdf (pre-laid-out template) with
+generate_pdf_uncompiled below, the original direct implementation (every
+paragraph laid out per report).
+
+Usage:
+    python -m benchmarks.bench_reports --single 200 --batch 10000
+"""
+import argparse
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+from io import BytesIO
+
+from ccr.codes import CANONICAL_PROFILES
+from ccr.report import (
+    DISCLAIMER,
+    METHODS_INFO,
+    clean_recommendation,
+    clean_summary,
+    generate_pdf,
+    get_template,
+    sanitize_text,
+)
+from ccr.rules import evaluate_risk
+
+
+def generate_pdf_uncompiled(edad, imc, resumen, categoria_riesgo, recomendacion, lifestyle_advice=None, symptoms_flag=False):
+    """Generate the same report by laying out every paragraph from scratch, as the app first did"""
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_page()
+
+    # Header
+    pdf.set_font("Arial", style="B", size=16)
+    pdf.cell(
+        200, 10, txt="Evaluacion de Riesgo para Cancer Colorrectal", ln=1, align="C")
+    pdf.set_font("Arial", style="I", size=10)
+    pdf.cell(
+        200, 6, txt="Basado en Guias del Instituto Nacional del Cancer Argentina", ln=1, align="C")
+    pdf.ln(10)
+
+    # Basic information
+    pdf.set_font("Arial", style="B", size=12)
+    pdf.cell(200, 8, txt="Informacion Personal", ln=1)
+    pdf.set_font("Arial", size=11)
+
+    pdf.cell(200, 8, txt=f"Edad: {edad} anos", ln=1)
+    pdf.cell(200, 8, txt=f"IMC: {imc} kg/m2", ln=1)
+
+    # Risk category with formatting
+    pdf.ln(5)
+    pdf.set_font("Arial", style="B", size=12)
+    pdf.cell(200, 8, txt="Categoria de Riesgo", ln=1)
+    pdf.set_font("Arial", style="B", size=11)
+
+    if "Alto" in categoria_riesgo:
+        pdf.set_text_color(255, 0, 0)  # Red for high risk
+    elif "Incrementado" in categoria_riesgo or "Intermedio" in categoria_riesgo:
+        pdf.set_text_color(0, 0, 255)  # Blue for intermediate risk
+    else:
+        pdf.set_text_color(0, 128, 0)  # Green for average risk
+
+    pdf.cell(200, 8, txt=f"{sanitize_text(categoria_riesgo)}", ln=1)
+    pdf.set_text_color(0, 0, 0)  # Reset to black
+
+    # Symptom warning if applicable
+    if symptoms_flag:
+        pdf.ln(3)
+        pdf.set_font("Arial", style="B", size=11)
+        pdf.set_text_color(255, 0, 0)  # Red
+        pdf.cell(
+            200, 8, txt="IMPORTANTE: Los sintomas que has reportado requieren atencion medica", ln=1)
+        pdf.cell(
+            200, 8, txt="inmediata, independientemente de tu categoria de riesgo.", ln=1)
+        pdf.set_text_color(0, 0, 0)  # Reset to black
+
+    # Recommendations
+    pdf.ln(5)
+    pdf.set_font("Arial", style="B", size=12)
+    pdf.cell(200, 8, txt="Recomendaciones de Tamizaje", ln=1)
+    pdf.set_font("Arial", size=11)
+
+    # Clean markdown and special characters from recommendation for PDF
+    pdf.multi_cell(0, 7, clean_recommendation(recomendacion))
+
+    # Summary
+    pdf.ln(3)
+    pdf.set_font("Arial", style="B", size=12)
+    pdf.cell(200, 8, txt="Resumen", ln=1)
+    pdf.set_font("Arial", size=11)
+    pdf.multi_cell(0, 7, clean_summary(resumen))
+
+    # Add lifestyle advice if provided
+    if lifestyle_advice:
+        pdf.ln(5)
+        pdf.set_font("Arial", style="B", size=12)
+        pdf.cell(200, 8, txt="Recomendaciones para Reducir el Riesgo", ln=1)
+        pdf.set_font("Arial", size=11)
+        pdf.multi_cell(0, 7, sanitize_text(lifestyle_advice))
+
+    # Add information about screening intervals
+    pdf.ln(5)
+    pdf.set_font("Arial", style="B", size=12)
+    pdf.cell(200, 8, txt="Informacion sobre Metodos de Tamizaje", ln=1)
+    pdf.set_font("Arial", size=11)
+    pdf.multi_cell(0, 6, METHODS_INFO)
+
+    # Disclaimer and footer
+    pdf.ln(5)
+    pdf.set_font("Arial", style="I", size=9)
+    pdf.multi_cell(0, 5, DISCLAIMER)
+
+    pdf.ln(3)
+    pdf.set_font("Arial", style="B", size=9)
+    pdf.cell(
+        200, 5, txt=f"Fecha de evaluacion: {datetime.today().strftime('%d/%m/%Y')}", ln=1)
+
+    # Output to buffer
+    buffer = BytesIO()
+    pdf.output(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def report_arguments():
+    """generate_pdf arguments for every category, BMI class and symptom flag"""
+    arguments = []
+    for age, personal, family, polyp in CANONICAL_PROFILES.values():
+        for bmi in (22.0, 27.0, 33.0):
+            for symptoms in (False, True):
+                risk_category, recommendation, summary, lifestyle_advice = evaluate_risk(
+                    age, bmi, personal, family, polyp, symptoms)[:4]
+                arguments.append((str(age), str(bmi), summary, risk_category, recommendation,
+                                  lifestyle_advice, symptoms))
+    return arguments
+
+
+def measure(render, arguments, count):
+    started = time.perf_counter()
+    for i in range(count):
+        render(*arguments[i % len(arguments)])
+    return time.perf_counter() - started
+
+
+def peak_memory(render, arguments):
+    """Peak memory traced while rendering one report"""
+    tracemalloc.start()
+    render(*arguments)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--single", type=int, default=200, help="reports timed one by one")
+    parser.add_argument("--batch", type=int, default=10_000, help="reports in the batch run")
+    args = parser.parse_args(argv)
+    warnings.simplefilter("ignore", DeprecationWarning)
+
+    started = time.perf_counter()
+    get_template()
+    print(f"template prepared in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    arguments = report_arguments()
+    print(f"{'renderer':<26} {'ms/report':>10} {'peak KiB':>9} {'batch s':>9} {'reports/s':>10}")
+    for name, render in (("generate_pdf_uncompiled", generate_pdf_uncompiled), ("generate_pdf", generate_pdf)):
+        render(*arguments[0])
+        single = measure(render, arguments, args.single) / args.single
+        peak = peak_memory(render, arguments[len(arguments) // 2])
+        batch = measure(render, arguments, args.batch)
+        print(f"{name:<26} {single * 1000:>10.2f} {peak / 1024:>9.0f} "
+              f"{batch:>9.1f} {args.batch / batch:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
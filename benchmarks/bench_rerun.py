@@ -0,0 +1,62 @@
+"""Rerun latency and CPU per interaction of app.py.
+
+Replays the same session (submit the form, prepare the PDF, start over)
+with full-script reruns, as every interaction behaved before the page was
+split into fragments, and with fragment-scoped reruns as the browser now
+requests them. Latency includes AppTest's own overhead (polling for the
+end of the run and building the element tree); script time and CPU cover
+only the execution of app.py.
+
+Usage:
+    python -m benchmarks.bench_rerun --rounds 20
+"""
+import argparse
+import datetime
+import statistics
+import warnings
+
+import streamlit as st
+
+from benchmarks.harness import AppDriver
+
+INTERACTIONS = ("Evaluar mi riesgo", "Preparar PDF", "Nueva evaluación")
+
+
+def replay(fragments, rounds):
+    """Return {interaction: [(latency, script seconds, script CPU), ...]} for one simulated session"""
+    # Start from an empty PDF cache so every round renders its report
+    st.cache_resource.clear()
+    driver = AppDriver(fragments=fragments)
+    timings = {"page load": [driver.run()]}
+    for round_number in range(rounds):
+        dob = datetime.date(1950 + round_number % 40, 1, 1)
+        weight = str(50 + round_number)
+        timings.setdefault(INTERACTIONS[0], []).append(driver.submit(dob, "170", weight))
+        for label in INTERACTIONS[1:]:
+            timings.setdefault(label, []).append(driver.click(label))
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20, help="form submissions per mode")
+    args = parser.parse_args(argv)
+    warnings.simplefilter("ignore")
+
+    # Warm up imports, the decision table and the report template
+    replay(True, 1)
+
+    results = {mode: replay(mode == "fragment", args.rounds) for mode in ("full", "fragment")}
+    print("median ms per interaction, full-script rerun / fragment rerun")
+    print(f"{'interaction':<20} {'latency':>15} {'script':>15} {'script CPU':>15}")
+    for label in ("page load",) + INTERACTIONS:
+        columns = []
+        for measure in range(3):
+            full = statistics.median(t[measure] for t in results["full"][label]) * 1000
+            fragment = statistics.median(t[measure] for t in results["fragment"][label]) * 1000
+            columns.append(f"{full:>7.1f} /{fragment:>6.1f}")
+        print(f"{label:<20} " + " ".join(f"{column:>15}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
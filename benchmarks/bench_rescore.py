@@ -0,0 +1,123 @@
+"""Incremental re-scoring of a large assessment store after guideline edits.
+
+Fills a store with a registry of realistic answer rates (see
+benchmarks.synthetic) assessed over the last ten years, and pops the
+reminders already due. Then, for each edit of the bundled guidelines, it
+applies the edited file to one copy of the store with the dependency index
+and to another copy by evaluating every row. It reports rows touched and
+skipped and both times, and checks that both copies end up identical.
+
+Usage:
+    python -m benchmarks.bench_rescore --rows 2000000
+"""
+import argparse
+import copy
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from benchmarks.synthetic import FLAG_RATES
+from ccr.decision_table import FLAG_BITS, SYMPTOMS_BIT, unpack_flags
+from ccr.guidelines import DEFAULT_PATH, compile_guidelines, load_guidelines
+from ccr.recall import RecallScheduler
+from ccr.rescore import rescore_store
+from ccr.results import AssessmentResult
+from ccr.store import AssessmentStore, assessment_row
+
+LOAD_CHUNK = 100_000
+SYMPTOM_RATE = 0.1
+
+
+def _rule(spec, code):
+    return next(category for category in spec["categories"] if category["code"] == code)
+
+
+def serrated_without_resection(spec):
+    _rule(spec, "serrated_polyp")["when"]["all"] = ["polyp10", "serrated"]
+
+
+def average_from_45(spec):
+    _rule(spec, "average")["when"]["ages"] = [45, 75]
+    _rule(spec, "under_50")["when"]["ages"] = [None, 44]
+    spec["average_risk_screening"]["ages"] = [45, 75]
+
+
+def summary_text(spec):
+    _rule(spec, "lynch")["summary"] += " Consultá a tu médico."
+
+
+EDITS = {
+    "serrated polyp without resection": serrated_without_resection,
+    "average risk from 45": average_from_45,
+    "summary text only": summary_text,
+}
+
+
+def fill(path, n_rows, seed=0):
+    """Store n_rows assessments of a registry with realistic answer rates"""
+    rng = np.random.default_rng(seed)
+    start = datetime.now() - timedelta(days=3650)
+    with AssessmentStore(path) as store:
+        for first in range(0, n_rows, LOAD_CHUNK):
+            n = min(LOAD_CHUNK, n_rows - first)
+            flags = (rng.random(n) < SYMPTOM_RATE) * SYMPTOMS_BIT
+            for bit, (_, key) in enumerate(FLAG_BITS[:-1]):
+                flags |= (rng.random(n) < FLAG_RATES[key]).astype(np.int64) << bit
+            ages = rng.integers(20, 90, n)
+            bmis = rng.normal(26, 4, n).round(1)
+            minutes = rng.integers(0, 3650 * 1440, n)
+            store.add_rows(
+                assessment_row(AssessmentResult.evaluate(int(age), float(bmi), *unpack_flags(int(flag))),
+                               start + timedelta(minutes=int(minute)), f"P{first + index:08d}")
+                for index, (flag, age, bmi, minute) in enumerate(zip(flags, ages, bmis, minutes)))
+        store.flush()
+
+
+def same_rows(first, second):
+    query = "SELECT id, code, risk, interval_years, next_due FROM assessments ORDER BY id"
+    rows = zip(sqlite3.connect(first).execute(query), sqlite3.connect(second).execute(query))
+    return all(a == b for a, b in rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000, help="assessments in the store")
+    args = parser.parse_args(argv)
+
+    with open(DEFAULT_PATH, encoding="utf-8") as f:
+        spec = json.load(f)
+    current = load_guidelines(DEFAULT_PATH)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = os.path.join(tmp, "registry.db")
+        started = time.perf_counter()
+        fill(base, args.rows)
+        with RecallScheduler(base) as scheduler:
+            scheduler.refresh()
+            reminded = len(scheduler.pop_due(date.today()))
+        print(f"{args.rows:,} assessments stored, {reminded:,} reminders popped "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        for name, edit in EDITS.items():
+            edited = copy.deepcopy(spec)
+            edit(edited)
+            edited["version"] += "-edit"
+            new = compile_guidelines(edited)
+            copies = {}
+            for mode in ("incremental", "full"):
+                copies[mode] = os.path.join(tmp, f"{mode}.db")
+                shutil.copy(base, copies[mode])
+                summary = rescore_store(copies[mode], current, new, full=mode == "full")
+                print(f"{name:>34} {mode:>11}: {summary['touched']:>9,} touched, {summary['skipped']:>9,} skipped, "
+                      f"{summary['updated']:>7,} updated in {summary['seconds']:6.2f}s")
+            print(f"{'':>34} same rows: {same_rows(copies['incremental'], copies['full'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Load generator for the HTTP scoring service.
+
+Opens many concurrent keep-alive connections. Each connection sends
+requests back to back, cycling through synthetic patients, until the
+requested total has been sent. The report gives throughput and the latency
+distribution. Without --url the service is started in a subprocess on a
+free port, so the client and server do not share one event loop.
+
+Usage:
+    python -m benchmarks.bench_service --connections 1000 --requests 50000
+    python -m benchmarks.bench_service --batch-size 100 --requests 2000
+    python -m benchmarks.bench_service --url http://127.0.0.1:8080
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from benchmarks.synthetic import registry_frame
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@contextmanager
+def local_service():
+    """Start ``python -m ccr serve`` on a free port and yield its URL"""
+    process = subprocess.Popen([sys.executable, "-m", "ccr", "serve", "--port", "0"], cwd=ROOT,
+                               stdout=subprocess.PIPE, text=True)
+    try:
+        # The service prints "Escuchando en http://host:port" once it accepts connections
+        line = process.stdout.readline()
+        if "http://" not in line:
+            raise RuntimeError("the service did not start")
+        yield line[line.index("http://"):].strip()
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def build_requests(url, n_patients, batch_size, texts):
+    """Return the raw HTTP requests to cycle through, each with its own patients"""
+    address = urlsplit(url)
+    patients = registry_frame(n_patients, invalid_rate=0).drop(columns="patient_id").to_dict("records")
+    query = "" if texts else "?texts=0"
+    if batch_size:
+        path = "/score/batch" + query
+        bodies = [{"patients": patients[start:start + batch_size]}
+                  for start in range(0, len(patients) - batch_size + 1, batch_size)]
+    else:
+        path = "/score" + query
+        bodies = patients
+    requests = []
+    for body in bodies:
+        payload = json.dumps(body).encode("utf-8")
+        head = (f"POST {path} HTTP/1.1\r\nHost: {address.netloc}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n")
+        requests.append(head.encode("latin-1") + payload)
+    return requests
+
+
+async def read_response(reader):
+    """Read one response; returns (status, body)"""
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def client(address, requests, offset, counter, latencies, errors):
+    """One keep-alive connection sending requests until counter runs out"""
+    reader, writer = await asyncio.open_connection(address.hostname, address.port)
+    try:
+        position = offset
+        while counter[0] > 0:
+            counter[0] -= 1
+            request = requests[position % len(requests)]
+            position += 1
+            started = time.perf_counter()
+            writer.write(request)
+            status, _ = await read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def load(url, requests, connections, total):
+    """
+    Send total requests over the given number of concurrent connections
+
+    Returns:
+        Tuple (elapsed seconds, latencies in seconds, non-200 statuses)
+    """
+    address = urlsplit(url)
+    counter = [total]
+    latencies = []
+    errors = []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        client(address, requests, index * 7, counter, latencies, errors)
+        for index in range(connections)))
+    return time.perf_counter() - started, latencies, errors
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def report(label, elapsed, latencies, errors, batch_size):
+    patients = len(latencies) * (batch_size or 1)
+    print(f"{label}: {len(latencies)} requests in {elapsed:.2f}s, {len(errors)} errors")
+    print(f"  requests/s  {len(latencies) / elapsed:>12,.0f}")
+    print(f"  patients/s  {patients / elapsed:>12,.0f}")
+    print("  latency ms  " + "  ".join(
+        f"{name} {value * 1000:.2f}" for name, value in (
+            ("p50", statistics.median(latencies)),
+            ("p95", percentile(latencies, 0.95)),
+            ("p99", percentile(latencies, 0.99)),
+            ("max", max(latencies)))))
+
+
+def run(args, url):
+    requests = build_requests(url, max(args.batch_size, 1) * 1000, args.batch_size, args.texts)
+    warmup = min(args.requests // 10, 1000)
+    asyncio.run(load(url, requests, min(args.connections, 50), warmup))
+    elapsed, latencies, errors = asyncio.run(load(url, requests, args.connections, args.requests))
+    endpoint = f"/score/batch x{args.batch_size}" if args.batch_size else "/score"
+    report(f"{endpoint}, {args.connections} connections", elapsed, latencies, errors, args.batch_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="running service; by default one is started locally")
+    parser.add_argument("--connections", type=int, default=500, help="concurrent keep-alive connections")
+    parser.add_argument("--requests", type=int, default=20_000, help="requests to send in total")
+    parser.add_argument("--batch-size", type=int, default=0,
+                        help="patients per request on /score/batch; 0 uses /score")
+    parser.add_argument("--no-texts", dest="texts", action="store_false", help="request the codes only")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        run(args, args.url)
+    else:
+        with local_service() as url:
+            run(args, url)
+
+
+if __name__ == "__main__":
+    main()
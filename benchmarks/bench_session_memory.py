@@ -0,0 +1,92 @@
+"""Per-session memory of the stored assessment result.
+
+Simulates many concurrent sessions, each holding one result the way the app
+keeps it in st.session_state, and compares the dictionary of texts returned
+by evaluate_risk with the compact AssessmentResult.
+
+Usage:
+    python -m benchmarks.bench_session_memory --sessions 10000
+"""
+import argparse
+import gc
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.synthetic import FLAG_RATES
+from ccr.decision_table import FLAG_BITS, unpack_flags
+from ccr.results import AssessmentResult
+from ccr.rules import evaluate_risk
+
+
+def session_inputs(n_sessions, seed=0):
+    """Random evaluate_risk arguments with the synthetic registry's answer rates"""
+    rng = np.random.default_rng(seed)
+    flags = np.zeros(n_sessions, dtype=np.int64)
+    for bit, (_, key) in enumerate(FLAG_BITS):
+        rate = FLAG_RATES.get(key, FLAG_RATES["blood"])
+        flags |= (rng.random(n_sessions) < rate).astype(np.int64) << bit
+    ages = rng.integers(30, 90, n_sessions)
+    bmis = rng.normal(27, 5, n_sessions).clip(15, 50).round(1)
+    return [(int(age), float(bmi)) + unpack_flags(int(flag)) for age, bmi, flag in zip(ages, bmis, flags)]
+
+
+def text_session(age, bmi, personal_history, family_history, polyp_history, any_symptoms):
+    """Session state as stored before: every text of the result"""
+    risk_category, recommendation, summary, lifestyle_advice, symptoms_detail, bmi_note, symptoms_warning = evaluate_risk(
+        age, bmi, personal_history, family_history, polyp_history, any_symptoms)
+    return {
+        "data": {
+            "age": age,
+            "bmi": bmi,
+            "any_symptoms": any_symptoms,
+            "risk_category": risk_category,
+            "recommendation": recommendation,
+            "summary": summary,
+            "lifestyle_advice": lifestyle_advice,
+            "symptoms_detail": symptoms_detail,
+            "bmi_note": bmi_note,
+            "symptoms_warning": symptoms_warning,
+        },
+        "show_results": True,
+    }
+
+
+def compact_session(*inputs):
+    """Session state as stored now: one AssessmentResult"""
+    return {"result": AssessmentResult.evaluate(*inputs), "show_results": True}
+
+
+def retained_bytes(build, inputs):
+    """Memory still allocated after building one session per input"""
+    gc.collect()
+    tracemalloc.start()
+    sessions = [build(*item) for item in inputs]
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del sessions
+    return current
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10_000, help="simulated concurrent sessions")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    inputs = session_inputs(args.sessions, args.seed)
+    # Check the compact record renders the same texts before measuring it
+    mismatches = sum(AssessmentResult.evaluate(*item).texts() != evaluate_risk(*item) for item in inputs)
+    print(f"{args.sessions} sessions, {mismatches} rendering mismatches")
+
+    print(f"{'representation':<16} {'total KiB':>10} {'bytes/session':>14}")
+    results = {}
+    for name, build in (("texts", text_session), ("AssessmentResult", compact_session)):
+        results[name] = retained_bytes(build, inputs)
+        print(f"{name:<16} {results[name] / 1024:>10.0f} {results[name] / args.sessions:>14.0f}")
+    print(f"reduction: {results['texts'] / results['AssessmentResult']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Monte Carlo simulation of a large cohort across worker counts.
+
+Scores a synthetic cohort and simulates the program many times with one
+worker and then with every CPU. It checks that:
+    - both runs give the same samples
+    - with full adherence the simulated means match the deterministic
+      forecast
+It then prints the confidence bands of the yearly colonoscopy demand.
+
+Usage:
+    python -m benchmarks.bench_simulation --rows 500000 --replicates 1000
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from benchmarks.bench_forecast import scored_cohort
+from ccr.codes import RISK_CATEGORY_CODES
+from ccr.forecast import frame_counts, forecast_counts, parse_mix
+from ccr.simulation import OUTPUTS, confidence_bands, simulate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500_000, help="people in the cohort")
+    parser.add_argument("--replicates", type=int, default=1000)
+    parser.add_argument("--years", type=int, default=15)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--mix", type=parse_mix, default="fit=0.8,colonoscopy=0.1,rsc=0.1")
+    args = parser.parse_args(argv)
+
+    counts = frame_counts(scored_cohort(args.rows))
+    print(f"{counts.sum():,} people, {args.replicates} replicates over {args.years} years")
+
+    runs = {}
+    for workers in sorted({1, args.workers}):
+        started = time.perf_counter()
+        runs[workers] = simulate(counts, args.replicates, args.years, args.mix, workers=workers)
+        print(f"{workers:>3} workers: {time.perf_counter() - started:.2f}s")
+    samples = runs[1]
+    print(f"same samples for every worker count: {all(np.array_equal(samples, run) for run in runs.values())}")
+
+    adherent = simulate(counts, 200, args.years, args.mix, adherence=dict.fromkeys(RISK_CATEGORY_CODES, 1.0))
+    expected = forecast_counts(counts, args.years, average_risk_mix=args.mix)
+    simulated = adherent.mean(axis=0)[:, [OUTPUTS.index("fit_kits"), OUTPUTS.index("rsc"),
+                                          OUTPUTS.index("screening_colonoscopies")]]
+    wanted = expected[["fit", "rsc", "colonoscopy"]].to_numpy()
+    error = np.abs(simulated - wanted).max() / max(wanted.max(), 1)
+    print(f"full adherence, largest gap to the forecast: {error:.2%}")
+
+    bands = confidence_bands(samples).xs("colonoscopies", level="output")
+    print("\ncolonoscopies per year")
+    print(bands.round(0).astype(int).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Write throughput and due-date query latency of the assessment store.
+
+The write phase starts many threads, each adding assessments and waiting
+for every commit, like sessions submitting the form at once. It runs once
+with one commit per row and once with group commit. The query phase fills
+a store with many assessments spread over ten years and times the
+"who is due this month" queries the coordinators run.
+
+Usage:
+    python -m benchmarks.bench_store --threads 32 --writes 200 --rows 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.bench_load import percentiles, sample_inputs
+from ccr.results import AssessmentResult
+from ccr.store import AssessmentStore, assessment_row
+
+LOAD_CHUNK = 50_000
+
+
+def write_phase(path, threads, writes, batch_size):
+    """Rows/s, commits and commit latency of concurrent single-row writers"""
+    results = [AssessmentResult.evaluate(*arguments) for arguments in sample_inputs(writes)]
+    latencies = []
+    with AssessmentStore(path, batch_size=batch_size) as store:
+        def writer():
+            for result in results:
+                started = time.perf_counter()
+                store.add(result).result()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=writer) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        commits = store.commits
+    return len(latencies) / elapsed, commits, len(latencies) / commits, percentiles(latencies)
+
+
+def fill(store, n_rows, seed=0):
+    """Add n_rows assessments made over the last ten years"""
+    rng = random.Random(seed)
+    results = [AssessmentResult.evaluate(*arguments) for arguments in sample_inputs(10_000, seed)]
+    start = datetime.now() - timedelta(days=3650)
+    for first in range(0, n_rows, LOAD_CHUNK):
+        rows = [assessment_row(rng.choice(results), start + timedelta(minutes=rng.randrange(3650 * 1440)),
+                               f"P{first + index:08d}")
+                for index in range(min(LOAD_CHUNK, n_rows - first))]
+        store.add_rows(rows)
+    store.flush()
+
+
+def time_query(query, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = query()
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations) * 1000, len(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32, help="concurrent writers")
+    parser.add_argument("--writes", type=int, default=100, help="assessments added per writer")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="assessments in the query phase")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{args.threads} writers x {args.writes} assessments, waiting for each commit")
+        print(f"{'mode':<16} {'rows/s':>9} {'commits':>8} {'rows/commit':>12} {'p50 ms':>8} {'p99 ms':>8}")
+        for label, batch_size in (("commit per row", 1), ("group commit", 1000)):
+            rate, commits, per_commit, latency = write_phase(
+                os.path.join(tmp, f"writes-{batch_size}.db"), args.threads, args.writes, batch_size)
+            print(f"{label:<16} {rate:>9,.0f} {commits:>8} {per_commit:>12.1f} "
+                  f"{latency['p50']:>8.2f} {latency['p99']:>8.2f}")
+
+        path = os.path.join(tmp, "registry.db")
+        with AssessmentStore(path) as store:
+            started = time.perf_counter()
+            fill(store, args.rows)
+            print(f"\nloaded {args.rows:,} assessments in {time.perf_counter() - started:.1f}s")
+            today = datetime.now().date()
+            queries = (
+                ("due this month", lambda: store.due_in_month(today.year, today.month)),
+                ("due this month, first 100", lambda: store.due_in_month(today.year, today.month, limit=100)),
+                ("due this month, lynch", lambda: store.due_in_month(today.year, today.month, "lynch")),
+                ("count by category", lambda: store.count_by_category()),
+            )
+            print(f"{'query':<28} {'ms':>8} {'rows':>8}")
+            for label, query in queries:
+                milliseconds, rows = time_query(query, args.repeat)
+                print(f"{label:<28} {milliseconds:>8.2f} {rows:>8}")
+            plan = sqlite3.connect(path).execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM assessments WHERE next_due >= ? AND next_due < ? AND risk = ?",
+                ("2026-01-01", "2026-02-01", 1)).fetchall()
+            print("plan: " + "; ".join(row[-1] for row in plan))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Background scoring of an uploaded CSV file while other sessions keep working.
+
+Writes a synthetic registry CSV (see benchmarks.synthetic) and submits it to
+an UploadScorer the way the upload page does. Meanwhile another thread keeps
+evaluating single assessments, like the script threads of other sessions.
+Reports:
+    - records per second of the upload and how often its progress moved
+    - peak Python memory while the upload runs, next to the file size
+    - single assessment latency with the upload running and idle
+
+Usage:
+    python -m benchmarks.bench_uploads --rows 200000
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from benchmarks.bench_guidelines import percentile_ms
+from benchmarks.bench_session_memory import session_inputs
+from benchmarks.synthetic import write_registry_csv
+from ccr.results import AssessmentResult
+from ccr.uploads import DONE, FAILED, UploadScorer
+
+
+def evaluate_loop(inputs, stop, durations):
+    position = 0
+    while not stop.is_set():
+        started = time.perf_counter()
+        AssessmentResult.evaluate(*inputs[position % len(inputs)]).texts()
+        durations.append(time.perf_counter() - started)
+        position += 1
+        # A session evaluates now and then, not in a tight loop
+        time.sleep(0.001)
+
+
+def run_with_sessions(inputs, seconds=None, job=None):
+    """Evaluate single assessments on a thread for some seconds, or until job() reports it is finished"""
+    stop = threading.Event()
+    durations = []
+    thread = threading.Thread(target=evaluate_loop, args=(inputs, stop, durations))
+    thread.start()
+    snapshots = []
+    deadline = time.perf_counter() + (seconds or 0)
+    while True:
+        if job is None:
+            if time.perf_counter() >= deadline:
+                break
+        else:
+            snapshots.append(job())
+            if snapshots[-1]["state"] in (DONE, FAILED):
+                break
+        time.sleep(0.1)
+    stop.set()
+    thread.join()
+    return durations, snapshots
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000, help="records in the uploaded file")
+    args = parser.parse_args(argv)
+
+    inputs = session_inputs(5000)
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_registry_csv(os.path.join(directory, "registro.csv"), args.rows)
+        scorer = UploadScorer()
+
+        idle, _ = run_with_sessions(inputs, seconds=3)
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        with open(path, "rb") as upload:
+            _, job_id = scorer.submit(upload)
+        busy, snapshots = run_with_sessions(inputs, job=lambda: scorer.status(job_id))
+        seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        final = snapshots[-1]
+        progress = len({snapshot["read"] for snapshot in snapshots})
+        print(f"upload of {args.rows:,} records ({os.path.getsize(path) / 1e6:.1f} MB): {final['state']}, "
+              f"{final['scored']:,} scored, {final['rejected']:,} rejected in {seconds:.1f}s "
+              f"({final['read'] / seconds:,.0f} records/s), progress moved {progress - 1} times")
+        print(f"peak Python memory during the upload: {peak / 1e6:.1f} MB")
+        for name, durations in (("idle", idle), ("uploading", busy)):
+            print(f"{name:>9}: {len(durations):,} single assessments, p50 {percentile_ms(durations, 50):.2f} ms, "
+                  f"p99 {percentile_ms(durations, 99):.2f} ms")
+        scorer.shutdown()
+
+
+if __name__ == "__main__":
+    main()
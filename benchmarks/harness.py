@@ -0,0 +1,187 @@
+"""Headless driver for app.py built on Streamlit's AppTest.
+
+AppTest always reruns the whole script, while the browser sends the id of
+the fragment a widget was drawn in and the server reruns only that
+fragment. AppDriver records which fragment every widget belongs to and can
+replay interactions either way, so both costs can be measured.
+
+AppTest waits for a run by polling, which adds its own latency, so the time
+spent executing the script is also measured on the script thread itself.
+It also compiles app.py again for every run; the driver shares one script
+cache across runs, as the server does.
+"""
+import os
+import threading
+import time
+
+from streamlit.runtime.scriptrunner import ScriptRunnerEvent
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.runtime.scriptrunner_utils.script_requests import RerunData, ScriptRequests
+from streamlit.testing.v1 import AppTest, app_test
+from streamlit.testing.v1.local_script_runner import (
+    LocalScriptRunner,
+    parse_tree_from_messages,
+    require_widgets_deltas,
+)
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+# Driver whose run is in progress on this thread
+_current = threading.local()
+
+_STOP_EVENTS = (
+    ScriptRunnerEvent.SCRIPT_STOPPED_WITH_SUCCESS,
+    ScriptRunnerEvent.SCRIPT_STOPPED_WITH_COMPILE_ERROR,
+    ScriptRunnerEvent.SCRIPT_STOPPED_FOR_RERUN,
+    ScriptRunnerEvent.FRAGMENT_STOPPED_WITH_SUCCESS,
+)
+
+
+class _FragmentScriptRunner(LocalScriptRunner):
+    """LocalScriptRunner that can rerun a single fragment like the browser does"""
+
+    def run(self, widget_state=None, query_params=None, timeout=3, page_hash=""):
+        driver = getattr(_current, "driver", None)
+        fragment_id = driver.pending_fragment if driver is not None else None
+        if driver is not None:
+            self._script_cache = driver.script_cache
+            self.on_event.connect(driver.time_script, weak=False)
+        # Drop the full-script rerun queued by the constructor, it would
+        # absorb a fragment rerun requested on top of it
+        self._requests = ScriptRequests()
+        self.request_rerun(RerunData(
+            widget_states=widget_state,
+            page_script_hash=page_hash,
+            fragment_id_queue=[fragment_id] if fragment_id else [],
+        ))
+        try:
+            if not self._script_thread:
+                self.start()
+            require_widgets_deltas(self, timeout)
+        finally:
+            self.join()
+        messages = self.forward_msgs()
+        if driver is not None:
+            driver.record_fragments(messages)
+            messages = driver.merge_deltas(messages)
+        return parse_tree_from_messages(messages)
+
+
+# AppTest builds a new runner for every run; make it build ours
+app_test.LocalScriptRunner = _FragmentScriptRunner
+
+
+class AppDriver:
+    """
+    One simulated browser session of app.py
+
+    Args:
+        fragments: rerun only the fragment holding the widget, as the browser
+            does; with False every interaction reruns the whole script
+        timeout: seconds allowed per script run
+    """
+
+    def __init__(self, fragments=True, timeout=30):
+        self.fragments = fragments
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.pending_fragment = None
+        self.widget_fragments = {}
+        self.script_cache = ScriptCache()
+        self.script_seconds = 0.0
+        self.script_cpu = 0.0
+        self._script_started = None
+        self._full_run = True
+        self._deltas = {}
+
+    def time_script(self, sender, event, **kwargs):
+        """ScriptRunner event handler, called on the script thread"""
+        if event == ScriptRunnerEvent.SCRIPT_STARTED:
+            if not kwargs.get("fragment_ids_this_run"):
+                self._full_run = True
+            self._script_started = (time.perf_counter(), time.thread_time())
+        elif event in _STOP_EVENTS and self._script_started is not None:
+            wall, cpu = self._script_started
+            self.script_seconds += time.perf_counter() - wall
+            self.script_cpu += time.thread_time() - cpu
+            self._script_started = None
+
+    def record_fragments(self, messages):
+        for message in messages:
+            if not message.HasField("delta") or not message.delta.fragment_id:
+                continue
+            element = message.delta.new_element
+            kind = element.WhichOneof("type")
+            widget_id = getattr(getattr(element, kind), "id", None) if kind else None
+            if widget_id:
+                self.widget_fragments[widget_id] = message.delta.fragment_id
+
+    def merge_deltas(self, messages):
+        """
+        Return the page as the browser shows it after this run
+
+        A fragment run only sends the elements of that fragment. Like the
+        browser, keep the rest of the page from earlier runs and drop what
+        the rerun fragments (and blocks nested in them) drew before.
+        """
+        deltas = [message for message in messages if message.HasField("delta")]
+        if self._full_run:
+            self._deltas = {}
+        else:
+            rerun = {self.pending_fragment} | {message.delta.fragment_id for message in deltas}
+            stale = [path for path, message in self._deltas.items() if message.delta.fragment_id in rerun]
+            for path in list(self._deltas):
+                if any(path[:len(prefix)] == prefix for prefix in stale):
+                    del self._deltas[path]
+        self._deltas.update((tuple(message.metadata.delta_path), message) for message in deltas)
+        return [self._deltas[path] for path in sorted(self._deltas)]
+
+    def run(self, widget=None):
+        """
+        Rerun after an interaction with widget, or the whole page without one
+
+        Returns:
+            Tuple (latency, script seconds, script CPU seconds): latency is
+            the wall time of the whole AppTest run, the others cover only
+            the execution of app.py (including reruns it requests)
+        """
+        self.pending_fragment = None
+        if widget is not None and self.fragments:
+            self.pending_fragment = self.widget_fragments.get(widget.id)
+        _current.driver = self
+        self.script_seconds = self.script_cpu = 0.0
+        self._full_run = self.pending_fragment is None
+        started = time.perf_counter()
+        try:
+            self.at.run()
+        finally:
+            _current.driver = None
+        if self.at.exception:
+            raise RuntimeError(f"app.py raised: {self.at.exception[0].value}")
+        return time.perf_counter() - started, self.script_seconds, self.script_cpu
+
+    def button(self, label):
+        return next(button for button in self.at.button if button.label == label)
+
+    def click(self, label):
+        """Click the button with this label and rerun"""
+        button = self.button(label)
+        button.click()
+        return self.run(button)
+
+    def submit(self, dob, height, weight, checked=()):
+        """
+        Fill in and submit the assessment form
+
+        Args:
+            dob: date of birth (datetime.date)
+            height, weight: texts typed in the height and weight fields
+            checked: labels of the checkboxes to tick, all others are cleared;
+                disabled checkboxes are left alone, as in the browser
+        """
+        self.at.date_input[0].set_value(dob)
+        self.at.text_input[0].set_value(height)
+        self.at.text_input[1].set_value(weight)
+        for checkbox in self.at.checkbox:
+            if not checkbox.proto.disabled:
+                checkbox.set_value(checkbox.label in checked)
+        return self.click("Evaluar mi riesgo")
@@ -0,0 +1,41 @@
+"""Synthetic registry extracts for benchmarks."""
+import numpy as np
+import pandas as pd
+
+from ccr.validation import FLAG_COLUMNS
+
+# Share of people answering "yes" to each question
+FLAG_RATES = {
+    "ibd": 0.01, "lynch": 0.005, "hamart": 0.001, "fap": 0.002, "fasha": 0.001,
+    "serrated_synd": 0.002, "family_crc": 0.1, "family_before_60": 0.04,
+    "family_multiple": 0.02, "polyp10": 0.12, "advanced_poly": 0.03,
+    "serrated": 0.03, "resected": 0.1, "multiple_polyps": 0.02,
+    "blood": 0.03, "bowel_changes": 0.04, "weight_loss": 0.01, "pain": 0.05,
+    "incomplete": 0.03,
+}
+
+
+def registry_frame(n_rows, seed=0, first_id=0, invalid_rate=0.001):
+    """Return n_rows raw input records as the batch CLI expects them"""
+    rng = np.random.default_rng(seed)
+    birth = np.datetime64("1935-01-01") + rng.integers(0, 365 * 70, n_rows).astype("timedelta64[D]")
+    frame = pd.DataFrame({
+        "patient_id": [f"P{i:08d}" for i in range(first_id, first_id + n_rows)],
+        "dob": np.datetime_as_string(birth, unit="D"),
+        "height_cm": rng.normal(165, 10, n_rows).round().astype(int).astype(str),
+        "weight_kg": rng.normal(75, 15, n_rows).clip(35, 200).round().astype(int).astype(str),
+    })
+    for column in FLAG_COLUMNS:
+        if column in FLAG_RATES:
+            frame[column] = np.where(rng.random(n_rows) < FLAG_RATES[column], "si", "no")
+    invalid = rng.random(n_rows) < invalid_rate
+    frame.loc[invalid, "height_cm"] = "abc"
+    return frame
+
+
+def write_registry_csv(path, n_rows, seed=0, chunksize=100_000):
+    """Write a synthetic registry CSV of n_rows records without holding it all in memory"""
+    for start in range(0, n_rows, chunksize):
+        frame = registry_frame(min(chunksize, n_rows - start), seed=seed + start, first_id=start)
+        frame.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+    return path
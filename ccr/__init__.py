@@ -0,0 +1,30 @@
+"""Core colorectal cancer screening logic shared by the app and batch tools.
+
+Importing the package, the rules or the report module loads only the
+standard library: fpdf is imported when the first report is built and the
+decision table is enumerated on the first lookup. numpy and pandas are only
+needed by the batch modules (ccr.batch, ccr.pipeline, ccr.parallel).
+
+The names below are resolved on first access, so ``import ccr`` does not
+import any submodule.
+"""
+import importlib
+
+_EXPORTS = {
+    "AssessmentResult": "ccr.results",
+    "calculate_age": "ccr.rules",
+    "calculate_bmi": "ccr.rules",
+    "evaluate_risk": "ccr.rules",
+    "evaluate_serrated_polyps": "ccr.rules",
+    "generate_pdf": "ccr.report",
+    "get_lifestyle_recommendations": "ccr.rules",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'ccr' has no attribute {name!r}")
+    return getattr(importlib.import_module(module), name)
@@ -0,0 +1,207 @@
+"""Vectorized evaluation of the guideline hierarchy over whole DataFrames.
+
+``evaluate_risk_frame`` applies the rules of the active guidelines in the
+same order as ``ccr.rules.evaluate_risk`` using boolean masks, so a registry
+extract with hundreds of thousands of rows is scored in a handful of array
+operations. Results are returned as categorical code columns; the texts can
+be looked up in the tables of ``ccr.guidelines`` when needed.
+"""
+import numpy as np
+import pandas as pd
+
+from ccr.codes import BMI_NOTE_CODE, BMI_NOTE_CODES, RECOMMENDATION_CODES, RISK_CATEGORY_CODES, RISK_CODE
+from ccr import decision_table
+from ccr.guidelines import active
+from ccr.rules import evaluate_risk
+from ccr.validation import (
+    FAMILY_HISTORY_COLUMNS,
+    PERSONAL_HISTORY_COLUMNS,
+    POLYP_HISTORY_COLUMNS,
+    SYMPTOM_COLUMNS,
+)
+
+RESULT_COLUMNS = ("risk_category", "recommendation", "bmi_note", "symptoms_warning")
+
+
+def _flag(frame, column):
+    """Return a column as a boolean array, treating missing columns and NaN as False"""
+    if column not in frame:
+        return np.zeros(len(frame), dtype=bool)
+    return frame[column].fillna(False).to_numpy(dtype=bool)
+
+
+def _symptoms(frame):
+    """Return the any-symptom flag from a 'symptoms' column or the individual symptom columns"""
+    if "symptoms" in frame:
+        return _flag(frame, "symptoms")
+    symptoms = np.zeros(len(frame), dtype=bool)
+    for column in SYMPTOM_COLUMNS:
+        symptoms |= _flag(frame, column)
+    return symptoms
+
+
+def risk_codes(frame, guidelines=None):
+    """
+    Compute the risk category code for every row
+
+    The masks are built from the rules of the guidelines in their order and
+    np.select picks the first one that matches, as evaluate_risk does. Rows
+    without a usable age match no age condition.
+
+    Args:
+        frame: DataFrame with an 'age' column and the history flag columns
+        guidelines: Guidelines to apply (default: the active ones)
+
+    Returns:
+        numpy int8 array of codes from RISK_CATEGORY_CODES
+    """
+    guidelines = guidelines or active()
+    age = pd.to_numeric(frame["age"], errors="coerce").to_numpy(dtype=float)
+    flags = flag_masks(frame) & ~decision_table.SYMPTOMS_BIT
+
+    conditions = []
+    for risk, all_mask, any_mask, ages in guidelines.rules:
+        mask = flags & all_mask == all_mask
+        if any_mask:
+            mask &= flags & any_mask != 0
+        if ages is not None:
+            mask &= (age >= ages[0]) & (age < ages[1] + 1)
+        conditions.append((mask, risk))
+
+    return np.select(
+        [mask for mask, _ in conditions],
+        [np.int8(risk) for _, risk in conditions],
+        default=np.int8(RISK_CODE["none"]),
+    ).astype(np.int8)
+
+
+def bmi_note_codes(frame, guidelines=None):
+    """Compute the BMI note code (none/overweight/obese) for every row"""
+    overweight, obese = (guidelines or active()).bmi_thresholds
+    bmi = pd.to_numeric(frame["bmi"], errors="coerce").to_numpy(dtype=float)
+    return np.select(
+        [bmi >= obese, bmi >= overweight],
+        [np.int8(BMI_NOTE_CODE["obese"]), np.int8(BMI_NOTE_CODE["overweight"])],
+        default=np.int8(BMI_NOTE_CODE["none"]),
+    ).astype(np.int8)
+
+
+def flag_masks(frame):
+    """Pack the flag columns of every row into the decision table bitmask"""
+    flags = np.zeros(len(frame), dtype=np.int64)
+    for bit, (_, column) in enumerate(decision_table.FLAG_BITS[:-1]):
+        flags |= _flag(frame, column).astype(np.int64) << bit
+    flags |= _symptoms(frame).astype(np.int64) * decision_table.SYMPTOMS_BIT
+    return flags
+
+
+def table_codes(frame, guidelines=None):
+    """
+    Look up the packed result code of every row in the decision table of the guidelines
+
+    Rows without a usable age get the "none" category when their category
+    depends on age, as evaluate_risk gives when no age rule can match.
+    """
+    guidelines = guidelines or active()
+    age = pd.to_numeric(frame["age"], errors="coerce").to_numpy(dtype=float)
+    bmi = pd.to_numeric(frame["bmi"], errors="coerce").to_numpy(dtype=float)
+
+    codes = guidelines.lookup_array(flag_masks(frame), age, bmi)
+    risk = codes & decision_table.RISK_MASK
+    no_age = np.isnan(age) & np.array(guidelines.age_dependent)[risk]
+    codes[no_age] = codes[no_age] & np.uint16(0xFFFF ^ decision_table.RISK_MASK) | RISK_CODE["none"]
+    return codes
+
+
+def evaluate_risk_frame(frame, use_table=False, guidelines=None):
+    """
+    Evaluate colorectal cancer risk for every row of a DataFrame
+
+    Args:
+        frame: DataFrame with 'age' and 'bmi' columns plus any of the flag
+            columns in PERSONAL_HISTORY_COLUMNS, FAMILY_HISTORY_COLUMNS and
+            POLYP_HISTORY_COLUMNS, and either a 'symptoms' column or the
+            columns in SYMPTOM_COLUMNS. Missing flag columns count as False.
+        use_table: look the results up in the precompiled decision table
+            instead of evaluating the masks; both give the same codes
+        guidelines: Guidelines to apply (default: the active ones)
+
+    Returns:
+        DataFrame with the same index and the columns:
+        - risk_category: categorical of RISK_CATEGORY_CODES
+        - recommendation: categorical of RECOMMENDATION_CODES
+        - bmi_note: categorical of BMI_NOTE_CODES
+        - symptoms_warning: boolean, True when the symptom warning applies
+    """
+    guidelines = guidelines or active()
+    if use_table:
+        return results_from_codes(table_codes(frame, guidelines), frame.index, guidelines)
+    return _result_frame(risk_codes(frame, guidelines), bmi_note_codes(frame, guidelines), _symptoms(frame),
+                         frame.index, guidelines)
+
+
+def results_from_codes(codes, index=None, guidelines=None):
+    """Build the result columns of evaluate_risk_frame from packed decision table codes"""
+    codes = np.asarray(codes)
+    risk = (codes & decision_table.RISK_MASK).astype(np.int8)
+    bmi_note = (codes >> decision_table.BMI_NOTE_SHIFT & decision_table.BMI_NOTE_MASK).astype(np.int8)
+    symptoms_warning = (codes >> decision_table.SYMPTOMS_SHIFT & 1).astype(bool)
+    return _result_frame(risk, bmi_note, symptoms_warning, index, guidelines or active())
+
+
+def _result_frame(risk, bmi_note, symptoms_warning, index, guidelines):
+    recommendation = np.array(guidelines.recommendation_for_category, dtype=np.int8)[risk]
+    return pd.DataFrame({
+        "risk_category": pd.Categorical.from_codes(risk, categories=RISK_CATEGORY_CODES),
+        "recommendation": pd.Categorical.from_codes(recommendation, categories=RECOMMENDATION_CODES),
+        "bmi_note": pd.Categorical.from_codes(bmi_note, categories=BMI_NOTE_CODES),
+        "symptoms_warning": symptoms_warning,
+    }, index=index)
+
+
+def _row_dict(record, columns):
+    return {column: bool(record[column]) for column in columns if column in record and not pd.isna(record[column])}
+
+
+def verify_against_scalar(frame, result=None):
+    """
+    Check vectorized results against the scalar evaluate_risk row by row
+
+    This runs the original Python function on every row, so it is meant for
+    tests and for spot checks on a sample of a registry, not for scoring.
+
+    Args:
+        frame: input DataFrame as accepted by evaluate_risk_frame
+        result: output of evaluate_risk_frame(frame); computed if omitted
+
+    Returns:
+        DataFrame with the rows whose codes differ, empty when all agree
+    """
+    guidelines = active()
+    if result is None:
+        result = evaluate_risk_frame(frame, guidelines=guidelines)
+
+    symptoms = _symptoms(frame)
+    risk = result["risk_category"].cat.codes.to_numpy()
+    recommendation = result["recommendation"].cat.codes.to_numpy()
+    bmi_note = result["bmi_note"].cat.codes.to_numpy()
+    symptoms_warning = result["symptoms_warning"].to_numpy(dtype=bool)
+
+    mismatched = []
+    for position, record in enumerate(frame.to_dict("records")):
+        bmi = None if pd.isna(record["bmi"]) else record["bmi"]
+        expected = evaluate_risk(
+            record["age"],
+            bmi,
+            _row_dict(record, PERSONAL_HISTORY_COLUMNS),
+            _row_dict(record, FAMILY_HISTORY_COLUMNS),
+            _row_dict(record, POLYP_HISTORY_COLUMNS),
+            bool(symptoms[position]),
+        )
+        if (expected[0] != guidelines.category_text[risk[position]]
+                or expected[1] != guidelines.recommendation_text[recommendation[position]]
+                or expected[5] != guidelines.bmi_note_template[bmi_note[position]].format(bmi=bmi)
+                or bool(expected[6]) != symptoms_warning[position]):
+            mismatched.append(position)
+
+    return frame.iloc[mismatched]
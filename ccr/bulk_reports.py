@@ -0,0 +1,200 @@
+"""Bulk PDF reports for a scored cohort, streamed into a ZIP archive.
+
+Takes the output of ``python -m ccr score`` (CSV or JSONL), renders one
+report per scored record on a pool of worker processes and writes each PDF
+into the archive as soon as it is ready. Only a bounded number of chunks is
+in flight at a time, so memory does not grow with the cohort size, and
+entries are written in input order. Records of a chunk that yield the same
+report (same age, BMI, category and symptoms) share one rendering.
+"""
+import itertools
+import math
+import re
+import string
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from ccr.codes import RISK_CODE
+from ccr.guidelines import active
+from ccr.pipeline import read_chunks
+from ccr.report import get_template
+from ccr.rules import get_lifestyle_recommendations
+from ccr.validation import parse_flag
+
+DEFAULT_NAME_TEMPLATE = "{patient_id}_{fecha}.pdf"
+DEFAULT_CHUNKSIZE = 200
+# Longest entry name written, extension included
+MAX_NAME_LENGTH = 150
+
+# Fields every entry name can use besides the input columns
+NAME_FIELDS = ("row", "fecha", "patient_id")
+
+# Characters of input values that could change the folder of an entry
+_UNSAFE = re.compile(r"[\\/:\x00-\x1f]|\.\.")
+
+
+def report_arguments(record):
+    """Return the generate_pdf arguments for one scored record"""
+    guidelines = active()
+    risk = RISK_CODE[record["risk_category"]]
+    age = int(float(record["age"]))
+    bmi = float(record["bmi"]) if record.get("bmi") not in (None, "") else None
+    if bmi is not None and math.isnan(bmi):
+        bmi = None
+    return (
+        str(age),
+        str(bmi),
+        guidelines.summary_text[risk],
+        guidelines.category_text[risk],
+        guidelines.recommendation_text[guidelines.recommendation_for_category[risk]],
+        get_lifestyle_recommendations(bmi, age),
+        bool(parse_flag(record.get("symptoms_warning", False))),
+    )
+
+
+def _render_records(records, fecha):
+    """Return the PDFs of records and how many were rendered, once per distinct report"""
+    template = get_template()
+    rendered = {}
+    pdfs = []
+    for record in records:
+        arguments = report_arguments(record)
+        pdf = rendered.get(arguments)
+        if pdf is None:
+            pdf = rendered[arguments] = template.render(*arguments, fecha=fecha)
+        pdfs.append(pdf)
+    return pdfs, len(rendered)
+
+
+def _shorten(name, suffix=""):
+    """Add suffix before the extension of name, cutting the stem to fit MAX_NAME_LENGTH characters"""
+    stem, dot, extension = name.rpartition(".")
+    if not dot or len(extension) >= MAX_NAME_LENGTH // 2:
+        stem, dot, extension = name, "", ""
+    return stem[:MAX_NAME_LENGTH - len(suffix) - len(dot + extension)] + suffix + dot + extension
+
+
+def check_name_template(name_template, columns):
+    """
+    Check that every field of an entry name template is an input column or one of NAME_FIELDS
+
+    Raises:
+        ValueError: naming the unknown fields, or when the template is malformed
+    """
+    known = set(NAME_FIELDS) | {str(column) for column in columns}
+    try:
+        fields = [field for _, field, _, _ in string.Formatter().parse(name_template) if field is not None]
+    except ValueError as error:
+        raise ValueError(f"Plantilla de nombres inválida: {error}") from None
+    # "{patient_id[0]}" or "{row.real}" use the field before the index or attribute
+    unknown = sorted({field for field in fields if re.split(r"[.\[]", field)[0] not in known})
+    if unknown:
+        raise ValueError(f"La plantilla de nombres usa campos que la entrada no tiene: "
+                         f"{', '.join(repr(field) for field in unknown)}")
+
+
+def _entry_names(records, name_template, fecha, first_row, used):
+    names = []
+    for position, record in enumerate(records):
+        # Without a patient_id column the record number stands in for it
+        fields = {"row": first_row + position, "fecha": fecha.strftime("%Y%m%d"), "patient_id": first_row + position}
+        fields.update({column: _UNSAFE.sub("_", value) if isinstance(value, str) else value
+                       for column, value in record.items()})
+        name = _shorten(name_template.format(**fields))
+        unique, suffix = name, 2
+        while unique in used:
+            unique = _shorten(name, f"_{suffix}")
+            suffix += 1
+        used.add(unique)
+        names.append(unique)
+    return names
+
+
+def write_reports_zip(input_path, destination, name_template=DEFAULT_NAME_TEMPLATE, workers=1,
+                      chunksize=DEFAULT_CHUNKSIZE, input_format=None, fecha=None):
+    """
+    Render a report for every scored record and stream them into a ZIP archive
+
+    Args:
+        input_path: scored records as written by ccr.pipeline.score_file
+        destination: path or writable binary file object (it need not be
+            seekable, e.g. an HTTP response)
+        name_template: str.format template for entry names; any input column
+            can be used plus {row} (1-based record number) and {fecha}
+            (YYYYMMDD). Path separators and '..' in the values are replaced
+            with '_', names are cut to MAX_NAME_LENGTH characters and
+            repeated names get a numeric suffix. The template is checked
+            against the columns of the input before the archive is opened.
+        workers: number of rendering processes
+        chunksize: records rendered per task
+        fecha: evaluation date printed in the reports, today when omitted
+
+    Returns:
+        Dictionary with the number of reports, the number rendered (one per
+        distinct report of a chunk), bytes of PDF written, elapsed seconds
+        and reports per second
+
+    Raises:
+        ValueError: when the name template uses a field the input does not have
+
+    The names already written are kept to make repeats unique, so memory
+    grows with the number of reports, as the ZIP central directory kept by
+    zipfile does (each is on the order of 100 bytes per entry).
+    """
+    started = time.perf_counter()
+    fecha = fecha or datetime.today()
+    reports = 0
+    rendered = 0
+    pdf_bytes = 0
+    used_names = set()
+
+    def write_chunk(archive, records, result, first_row):
+        nonlocal reports, rendered, pdf_bytes
+        pdfs, distinct = result
+        rendered += distinct
+        for name, pdf in zip(_entry_names(records, name_template, fecha, first_row, used_names), pdfs):
+            archive.writestr(name, pdf)
+            reports += 1
+            pdf_bytes += len(pdf)
+
+    # Read the first chunk before creating the archive, to check the template against its columns
+    frames = read_chunks(input_path, chunksize, input_format)
+    first_frame = next(frames, None)
+    if first_frame is not None:
+        check_name_template(name_template, first_frame.columns)
+        frames = itertools.chain([first_frame], frames)
+
+    def record_chunks():
+        row = 1
+        for frame in frames:
+            records = frame.to_dict("records")
+            yield row, records
+            row += len(records)
+
+    with zipfile.ZipFile(destination, "w", compression=zipfile.ZIP_STORED) as archive:
+        if workers == 1:
+            for first_row, records in record_chunks():
+                write_chunk(archive, records, _render_records(records, fecha), first_row)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = deque()
+                for first_row, records in record_chunks():
+                    pending.append((first_row, records, pool.submit(_render_records, records, fecha)))
+                    # Keep a couple of chunks per worker in flight, write the oldest first
+                    while len(pending) > 2 * workers:
+                        first, done_records, future = pending.popleft()
+                        write_chunk(archive, done_records, future.result(), first)
+                for first, done_records, future in pending:
+                    write_chunk(archive, done_records, future.result(), first)
+
+    seconds = time.perf_counter() - started
+    return {
+        "reports": reports,
+        "rendered": rendered,
+        "bytes": pdf_bytes,
+        "seconds": seconds,
+        "reports_per_second": reports / seconds if seconds else 0.0,
+    }
@@ -0,0 +1,283 @@
+"""Command-line entry point for headless batch scoring.
+
+Usage:
+    python -m ccr score registry.csv --output scored.csv --rejects rejects.csv
+    python -m ccr score registry.csv -o scored.csv -r rejects.csv --workers 8
+    python -m ccr score registry.csv -o scored.csv -r rejects.csv --dedup drop
+    python -m ccr reports scored.csv -o informes.zip --name "{patient_id}_{fecha}.pdf"
+    python -m ccr serve --host 127.0.0.1 --port 8080
+    python -m ccr due --store assessments.db --month 2026-10 --category lynch
+    python -m ccr recall --store assessments.db --until 2026-10-31 > recordatorios.csv
+    python -m ccr forecast scored.csv --years 15 --mix fit=0.8,colonoscopy=0.1,rsc=0.1 > capacidad.csv
+    python -m ccr simulate scored.csv --replicates 1000 --workers 0 --level 0.9 > bandas.csv
+    python -m ccr guidelines nuevas_guias.json
+    python -m ccr rescore --store assessments.db --previous guias_anteriores.json
+    python -m ccr reingest evaluaciones/ -o revisadas.csv -r rechazadas.csv --workers 0
+"""
+import argparse
+import csv
+import os
+import sys
+from datetime import date
+
+from ccr.bulk_reports import DEFAULT_CHUNKSIZE as REPORTS_CHUNKSIZE
+from ccr.bulk_reports import DEFAULT_NAME_TEMPLATE, write_reports_zip
+from ccr.guidelines import load_guidelines
+from ccr.decision_table import verify_table
+from ccr.dedup import DEDUP_MODES
+from ccr.forecast import DEFAULT_YEARS, file_counts, forecast_file, parse_mix
+from ccr.parallel import score_file_parallel
+from ccr.pipeline import DEFAULT_CHUNKSIZE, score_file
+from ccr.recall import DEFAULT_MEMORY_BUDGET, RecallScheduler
+from ccr.reingest import DEFAULT_BATCH_SIZE as REINGEST_BATCH_SIZE
+from ccr.reingest import reingest
+from ccr.rescore import rescore_store
+from ccr.simulation import DEFAULT_LEVEL, DEFAULT_REPLICATES, confidence_bands, simulate
+from ccr.service import DEFAULT_HOST, DEFAULT_PORT
+from ccr.service import run as run_service
+from ccr.store import DEFAULT_PATH as DEFAULT_STORE_PATH
+from ccr.store import AssessmentStore
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m ccr",
+        description="Evaluación de riesgo CCR por lotes")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    score = subparsers.add_parser("score", help="score a CSV/JSONL file of patients")
+    score.add_argument("input", help="input file (.csv, .jsonl)")
+    score.add_argument("-o", "--output", required=True, help="scored records (.csv, .jsonl)")
+    score.add_argument("-r", "--rejects", required=True, help="records that failed validation")
+    score.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                       help="records held in memory at a time (default: %(default)s)")
+    score.add_argument("-w", "--workers", type=int, default=1,
+                       help="worker processes; 0 uses every CPU (default: %(default)s)")
+    score.add_argument("--dedup", choices=DEDUP_MODES,
+                       help="score identical inputs once and flag or drop repeats of a person by patient_id "
+                            "(one worker only)")
+    score.add_argument("--input-format", choices=("csv", "jsonl"),
+                       help="override the format detected from the file suffix")
+    score.add_argument("--output-format", choices=("csv", "jsonl"),
+                       help="override the format detected from the file suffix")
+
+    reports = subparsers.add_parser("reports", help="render PDF reports of scored records into a ZIP file")
+    reports.add_argument("input", help="scored records written by the score command")
+    reports.add_argument("-o", "--output", required=True, help="ZIP archive to create")
+    reports.add_argument("--name", default=DEFAULT_NAME_TEMPLATE,
+                         help="entry name template; input columns, {row} and {fecha} (default: %(default)s)")
+    reports.add_argument("-w", "--workers", type=int, default=1,
+                         help="rendering processes; 0 uses every CPU (default: %(default)s)")
+    reports.add_argument("--chunksize", type=int, default=REPORTS_CHUNKSIZE,
+                         help="reports rendered per task (default: %(default)s)")
+    reports.add_argument("--input-format", choices=("csv", "jsonl"),
+                         help="override the format detected from the file suffix")
+
+    serve = subparsers.add_parser("serve", help="score patients over a local HTTP JSON API")
+    serve.add_argument("--host", default=DEFAULT_HOST, help="address to listen on (default: %(default)s)")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to listen on (default: %(default)s)")
+
+    due = subparsers.add_parser("due", help="list stored assessments due for screening in a month")
+    due.add_argument("--store", default=DEFAULT_STORE_PATH, help="assessment database (default: %(default)s)")
+    due.add_argument("--month", default=date.today().strftime("%Y-%m"),
+                     help="YYYY-MM (default: the current month)")
+    due.add_argument("--category", help="only this risk category, e.g. lynch or average")
+    due.add_argument("--limit", type=int, help="most rows listed")
+
+    recall = subparsers.add_parser("recall", help="pop the screening reminders due up to a date")
+    recall.add_argument("--store", default=DEFAULT_STORE_PATH, help="assessment database (default: %(default)s)")
+    recall.add_argument("--until", default=date.today().isoformat(), help="YYYY-MM-DD (default: today)")
+    recall.add_argument("--limit", type=int, help="most reminders popped; the rest stay queued")
+    recall.add_argument("--memory-mb", type=int, default=DEFAULT_MEMORY_BUDGET // 2 ** 20,
+                        help="memory budget of the due queue (default: %(default)s)")
+
+    forecast = subparsers.add_parser("forecast", help="procedures needed per year and method for scored records")
+    forecast.add_argument("input", help="scored records written by the score command")
+    forecast.add_argument("--years", type=int, default=DEFAULT_YEARS, help="years forecast (default: %(default)s)")
+    forecast.add_argument("--start-year", type=int, help="year of the assessments (default: this year)")
+    forecast.add_argument("--mix", type=parse_mix, default="fit=1",
+                          help="share of average-risk people per method (default: %(default)s)")
+    forecast.add_argument("--input-format", choices=("csv", "jsonl"),
+                          help="override the format detected from the file suffix")
+
+    simulation = subparsers.add_parser("simulate", help="confidence bands of the yearly procedures, by Monte Carlo")
+    simulation.add_argument("input", help="scored records written by the score command")
+    simulation.add_argument("--replicates", type=int, default=DEFAULT_REPLICATES,
+                            help="simulated programs (default: %(default)s)")
+    simulation.add_argument("--years", type=int, default=DEFAULT_YEARS, help="years simulated (default: %(default)s)")
+    simulation.add_argument("--start-year", type=int, help="year of the assessments (default: this year)")
+    simulation.add_argument("--mix", type=parse_mix, default="fit=1",
+                            help="share of average-risk people per method (default: %(default)s)")
+    simulation.add_argument("--level", type=float, default=DEFAULT_LEVEL,
+                            help="coverage of the bands (default: %(default)s)")
+    simulation.add_argument("--seed", type=int, default=0, help="random seed (default: %(default)s)")
+    simulation.add_argument("-w", "--workers", type=int, default=1,
+                            help="worker processes; 0 uses every CPU (default: %(default)s)")
+    simulation.add_argument("--input-format", choices=("csv", "jsonl"),
+                            help="override the format detected from the file suffix")
+
+    guidelines = subparsers.add_parser("guidelines", help="check a guidelines file before deploying it")
+    guidelines.add_argument("path", nargs="?", help="guidelines file (default: the one in force)")
+
+    rescore = subparsers.add_parser("rescore", help="apply new guidelines to the stored assessments they change")
+    rescore.add_argument("--store", default=DEFAULT_STORE_PATH, help="assessment database (default: %(default)s)")
+    rescore.add_argument("--previous", required=True, help="guidelines file the stored results were computed with")
+    rescore.add_argument("--guidelines", help="guidelines file to apply (default: the one in force)")
+    rescore.add_argument("--full", action="store_true", help="evaluate every stored assessment again")
+
+    reingest_parser = subparsers.add_parser("reingest", help="score saved JSON assessments again with the guidelines in force")
+    reingest_parser.add_argument("source", help="directory of saved .json files, or a .jsonl file with one per line")
+    reingest_parser.add_argument("-o", "--output", required=True, help="scored assessments (.csv, .jsonl)")
+    reingest_parser.add_argument("-r", "--rejects", required=True, help="assessments that could not be read")
+    reingest_parser.add_argument("--batch-size", type=int, default=REINGEST_BATCH_SIZE,
+                                 help="assessments per task (default: %(default)s)")
+    reingest_parser.add_argument("-w", "--workers", type=int, default=1,
+                                 help="worker processes; 0 uses every CPU (default: %(default)s)")
+    reingest_parser.add_argument("--output-format", choices=("csv", "jsonl"),
+                                 help="override the format detected from the file suffix")
+    return parser
+
+
+def run_score(args):
+    if args.dedup and args.workers != 1:
+        print("La deduplicación (--dedup) requiere un solo proceso (--workers 1)", file=sys.stderr)
+        return 2
+    if args.workers == 1:
+        try:
+            summary = score_file(args.input, args.output, args.rejects, chunksize=args.chunksize,
+                                 input_format=args.input_format, output_format=args.output_format,
+                                 dedup=args.dedup)
+        except ValueError as error:
+            print(error, file=sys.stderr)
+            return 2
+    else:
+        summary = score_file_parallel(args.input, args.output, args.rejects, workers=args.workers or None,
+                                      chunksize=args.chunksize, input_format=args.input_format,
+                                      output_format=args.output_format)
+    rate = summary["read"] / summary["seconds"] if summary["seconds"] else 0
+    print(f"{summary['read']} records read, {summary['scored']} scored, "
+          f"{summary['rejected']} rejected in {summary['seconds']:.1f}s ({rate:,.0f} records/s)")
+    if "dedup" in summary:
+        dedup = summary["dedup"]
+        people = (f"{dedup['people']} people ({dedup['people_ratio']:.2f} rows each), "
+                  f"{dedup['repeats']} repeats, {summary['dropped']} dropped" if dedup["people"]
+                  else "no patient_id column, people not compared")
+        print(f"{dedup['distinct_inputs']} distinct inputs ({dedup['input_ratio']:.2f} rows each), "
+              f"{dedup['evaluated']} evaluated; {people}"
+              + ("; key index spilled to disk" if dedup["spilled"] else ""))
+    return 0
+
+
+def run_reports(args):
+    try:
+        summary = write_reports_zip(args.input, args.output, name_template=args.name,
+                                    workers=args.workers or os.cpu_count() or 1,
+                                    chunksize=args.chunksize, input_format=args.input_format)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 2
+    print(f"{summary['reports']} reports ({summary['rendered']} rendered, {summary['bytes'] / 1e6:.1f} MB) written in "
+          f"{summary['seconds']:.1f}s ({summary['reports_per_second']:,.1f} reports/s)")
+    return 0
+
+
+DUE_COLUMNS = ("id", "patient_id", "assessed_at", "age", "bmi", "risk_category", "next_due")
+
+
+def run_due(args):
+    year, month = (int(part) for part in args.month.split("-"))
+    with AssessmentStore(args.store) as store:
+        rows = store.due_in_month(year, month, args.category, args.limit)
+    writer = csv.writer(sys.stdout)
+    writer.writerow(DUE_COLUMNS)
+    writer.writerows([row[column] for column in DUE_COLUMNS] for row in rows)
+    return 0
+
+
+RECALL_COLUMNS = ("id", "patient_id", "assessed_at", "risk_category", "due", "next_due")
+
+
+def run_recall(args):
+    with RecallScheduler(args.store, memory_budget=args.memory_mb * 2 ** 20) as scheduler:
+        scheduler.refresh()
+        reminders = scheduler.pop_due(date.fromisoformat(args.until), args.limit)
+    writer = csv.writer(sys.stdout)
+    writer.writerow(RECALL_COLUMNS)
+    writer.writerows([reminder[column] for column in RECALL_COLUMNS] for reminder in reminders)
+    return 0
+
+
+def run_forecast(args):
+    procedures = forecast_file(args.input, args.years, args.start_year, args.mix,
+                               file_format=args.input_format)
+    procedures.round(1).to_csv(sys.stdout)
+    return 0
+
+
+def run_simulate(args):
+    samples = simulate(file_counts(args.input, file_format=args.input_format), args.replicates, args.years,
+                       args.mix, seed=args.seed, workers=args.workers or None)
+    confidence_bands(samples, args.start_year, args.level).round(1).to_csv(sys.stdout)
+    return 0
+
+
+def run_guidelines(args):
+    try:
+        guidelines = load_guidelines(args.path)
+    except ValueError as error:
+        print(f"Guías inválidas: {error}", file=sys.stderr)
+        return 1
+    mismatches = verify_table(guidelines)
+    print(f"{guidelines.path}: versión {guidelines.version}, {len(guidelines.rules)} reglas, "
+          f"{guidelines.age_bands} franjas de edad, {len(mismatches)} discrepancias en la tabla")
+    return 1 if mismatches else 0
+
+
+def run_rescore(args):
+    try:
+        previous = load_guidelines(args.previous)
+        current = load_guidelines(args.guidelines)
+    except ValueError as error:
+        print(f"Guías inválidas: {error}", file=sys.stderr)
+        return 1
+    summary = rescore_store(args.store, previous, current, full=args.full)
+    print(f"guidelines {previous.version} -> {current.version}: {summary['touched']:,} of {summary['rows']:,} "
+          f"assessments evaluated, {summary['updated']:,} updated, {summary['skipped']:,} skipped "
+          f"in {summary['seconds']:.2f}s")
+    return 0
+
+
+def run_reingest(args):
+    summary = reingest(args.source, args.output, args.rejects, workers=args.workers or None,
+                       batch_size=args.batch_size, output_format=args.output_format)
+    rate = summary["read"] / summary["seconds"] if summary["seconds"] else 0
+    print(f"{summary['read']} assessments read, {summary['scored']} scored, {summary['rejected']} rejected, "
+          f"{summary['changed']} changed category, {summary['inferred']} with inferred answers "
+          f"in {summary['seconds']:.1f}s ({rate:,.0f} assessments/s)")
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "score":
+        return run_score(args)
+    if args.command == "reports":
+        return run_reports(args)
+    if args.command == "serve":
+        run_service(args.host, args.port)
+        return 0
+    if args.command == "due":
+        return run_due(args)
+    if args.command == "recall":
+        return run_recall(args)
+    if args.command == "forecast":
+        return run_forecast(args)
+    if args.command == "simulate":
+        return run_simulate(args)
+    if args.command == "guidelines":
+        return run_guidelines(args)
+    if args.command == "rescore":
+        return run_rescore(args)
+    if args.command == "reingest":
+        return run_reingest(args)
+    return 2
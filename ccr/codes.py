@@ -0,0 +1,71 @@
+"""Compact result codes for the guideline hierarchy.
+
+Each risk category, recommendation and BMI note gets a small integer code
+so that results can be stored and compared as categoricals instead of long
+Spanish strings. The codes are the fixed vocabulary of the guidelines file.
+The rules that pick them and the texts shown for them come from
+``ccr.guidelines``, and can change while the codes stay the same.
+"""
+
+# Risk categories in the order of the original guideline hierarchy; stored
+# results refer to these numbers. "none" is the polyp branch that matches no
+# sub-rule and yields empty texts.
+RISK_CATEGORY_CODES = (
+    "none",
+    "lynch",
+    "ibd",
+    "fap",
+    "hamart",
+    "serrated_synd",
+    "advanced_adenoma",
+    "serrated_polyp",
+    "simple_polyps",
+    "family_before_60",
+    "family_after_60",
+    "average",
+    "under_50",
+    "over_75",
+)
+RISK_CODE = {name: code for code, name in enumerate(RISK_CATEGORY_CODES)}
+
+RECOMMENDATION_CODES = (
+    "none",
+    "colonoscopy_1_2y",
+    "colonoscopy_1_5y",
+    "colonoscopy_annual",
+    "colonoscopy_3y_fit_annual",
+    "colonoscopy_3_5y_genetic",
+    "colonoscopy_5y",
+    "colonoscopy_40_every_5y",
+    "colonoscopy_50_every_5y",
+    "average_risk_options",
+    "not_required",
+    "case_by_case",
+)
+RECOMMENDATION_CODE = {name: code for code, name in enumerate(RECOMMENDATION_CODES)}
+
+BMI_NOTE_CODES = ("none", "overweight", "obese")
+BMI_NOTE_CODE = {name: code for code, name in enumerate(BMI_NOTE_CODES)}
+
+# How a category is presented: colour of the banner
+RISK_LEVEL_CODES = ("average", "increased", "high")
+RISK_LEVEL_CODE = {name: code for code, name in enumerate(RISK_LEVEL_CODES)}
+
+# Smallest input that reaches each branch: (age, personal, family, polyp)
+CANONICAL_PROFILES = {
+    "none": (60, {}, {}, {"polyp10": True}),
+    "lynch": (60, {"lynch": True}, {}, {}),
+    "ibd": (60, {"ibd": True}, {}, {}),
+    "fap": (60, {"fap": True}, {}, {}),
+    "hamart": (60, {"hamart": True}, {}, {}),
+    "serrated_synd": (60, {"serrated_synd": True}, {}, {}),
+    "advanced_adenoma": (60, {}, {}, {"polyp10": True, "advanced_poly": True, "resected": True}),
+    "serrated_polyp": (60, {}, {}, {"polyp10": True, "serrated": True, "resected": True}),
+    "simple_polyps": (60, {}, {}, {"polyp10": True, "resected": True}),
+    "family_before_60": (60, {}, {"family_crc": True, "family_before_60": True}, {}),
+    "family_after_60": (60, {}, {"family_crc": True}, {}),
+    "average": (60, {}, {}, {}),
+    "under_50": (40, {}, {}, {}),
+    "over_75": (80, {}, {}, {}),
+}
+
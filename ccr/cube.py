@@ -0,0 +1,114 @@
+"""Pre-aggregated counts of the stored assessments for the dashboard.
+
+The assessment store keeps one row per assessment, and counting them by
+category, age, BMI and symptoms with GROUP BY reads the whole history. The
+cube keeps those counts instead: one row per (risk category, age band, BMI
+band, symptoms) cell, at most a few hundred rows whatever the history size.
+
+The cube lives in the store's database, so it survives restarts. The
+store's writer adds each committed batch to it in the same transaction as
+the rows, one upsert per cell rather than per row (``add_cells``). Triggers
+handle the rarer changes. An update of the category, BMI note, age or flags,
+such as ``ccr.rescore`` makes, moves the row to its new cell. A delete takes
+it out. A database created before the cube existed is counted once when it
+is first opened.
+
+The age bands are fixed reporting bands, not the guideline bands, so counts
+stay comparable when the guidelines change. The BMI band is the BMI note of
+the result (below the overweight threshold or no BMI, overweight, obese)
+and follows the thresholds of the guidelines.
+"""
+from bisect import bisect_right
+from collections import Counter
+
+from ccr.codes import BMI_NOTE_CODES, RISK_CATEGORY_CODES
+from ccr.decision_table import BMI_NOTE_MASK, BMI_NOTE_SHIFT, SYMPTOMS_BIT
+
+# First age of each reporting band
+AGE_BAND_STARTS = (0, 40, 50, 60, 70, 76)
+AGE_BAND_LABELS = tuple(
+    f"{start}+" if end is None else (f"<{end}" if start == 0 else f"{start}-{end - 1}")
+    for start, end in zip(AGE_BAND_STARTS, AGE_BAND_STARTS[1:] + (None,)))
+CELL_COLUMNS = ("risk", "age_band", "bmi_band", "symptoms")
+
+
+def _cell(row):
+    """SQL expressions of the cube cell of a row of assessments (NEW, OLD or the table itself)"""
+    bands = " ".join(f"WHEN {row}age >= {start} THEN {band}"
+                     for band, start in reversed(list(enumerate(AGE_BAND_STARTS))) if start)
+    return (f"{row}risk", f"CASE {bands} ELSE 0 END",
+            f"({row}code >> {BMI_NOTE_SHIFT}) & {BMI_NOTE_MASK}", f"({row}flags & {SYMPTOMS_BIT}) != 0")
+
+
+def _add(row, amount):
+    risk, band, bmi, symptoms = _cell(row)
+    return (f"INSERT INTO assessment_cube ({', '.join(CELL_COLUMNS)}, count)"
+            f" VALUES ({risk}, {band}, {bmi}, {symptoms}, {amount})"
+            f" ON CONFLICT ({', '.join(CELL_COLUMNS)}) DO UPDATE SET count = count + excluded.count;")
+
+
+CUBE_SCHEMA = (
+    """CREATE TABLE assessment_cube (
+    risk INTEGER NOT NULL,
+    age_band INTEGER NOT NULL,
+    bmi_band INTEGER NOT NULL,
+    symptoms INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (risk, age_band, bmi_band, symptoms)
+) WITHOUT ROWID""",
+    "CREATE TRIGGER assessment_cube_update AFTER UPDATE OF risk, code, age, flags ON assessments"
+    f" BEGIN {_add('OLD.', -1)} {_add('NEW.', 1)} END",
+    f"CREATE TRIGGER assessment_cube_delete AFTER DELETE ON assessments BEGIN {_add('OLD.', -1)} END",
+)
+_ADD = (f"INSERT INTO assessment_cube ({', '.join(CELL_COLUMNS)}, count) VALUES (?, ?, ?, ?, ?)"
+        f" ON CONFLICT ({', '.join(CELL_COLUMNS)}) DO UPDATE SET count = count + excluded.count")
+_BACKFILL = (f"INSERT INTO assessment_cube ({', '.join(CELL_COLUMNS)}, count)"
+             f" SELECT {', '.join(_cell(''))}, COUNT(*) FROM assessments GROUP BY 1, 2, 3, 4")
+
+
+def cell(age, flags, code, risk):
+    """Return the cube cell of an assessment, as _cell computes it in SQL"""
+    return (risk, bisect_right(AGE_BAND_STARTS, age) - 1, code >> BMI_NOTE_SHIFT & BMI_NOTE_MASK,
+            int(flags & SYMPTOMS_BIT != 0))
+
+
+def add_cells(connection, cells):
+    """Count assessments being inserted in the current transaction; cells as returned by cell()"""
+    connection.executemany(_ADD, [(*key, count) for key, count in Counter(cells).items()])
+
+
+def create_cube(connection):
+    """
+    Create the cube and its triggers if the database lacks them, counting the rows already stored
+
+    The check, creation and count run in one write transaction, so no row
+    is missed or counted twice by a writer in another process.
+    """
+    exists = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'assessment_cube'"
+    if connection.execute(exists).fetchone():
+        return
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        if not connection.execute(exists).fetchone():
+            for statement in CUBE_SCHEMA:
+                connection.execute(statement)
+            connection.execute(_BACKFILL)
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+
+def cube_counts(connection):
+    """
+    Read the non-empty cells of the cube
+
+    Returns:
+        List of (risk category, age band label, BMI note, symptoms, count)
+        with names from RISK_CATEGORY_CODES, AGE_BAND_LABELS and
+        BMI_NOTE_CODES
+    """
+    rows = connection.execute(
+        f"SELECT {', '.join(CELL_COLUMNS)}, count FROM assessment_cube WHERE count > 0 ORDER BY 1, 2, 3, 4")
+    return [(RISK_CATEGORY_CODES[risk], AGE_BAND_LABELS[band], BMI_NOTE_CODES[bmi], bool(symptoms), count)
+            for risk, band, bmi, symptoms, count in rows]
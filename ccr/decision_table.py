@@ -0,0 +1,201 @@
+"""Precompiled decision table for the guideline hierarchy.
+
+All inputs of the rules that influence the result are booleans, an age
+band and a BMI band. The whole input space is therefore enumerated once,
+when the guidelines are compiled (see ``ccr.guidelines``). A lookup is then
+a single index into a flat array:
+
+    index = ((flags * age_bands) + age_band) * BMI_BANDS + bmi_band
+
+``flags`` packs the history booleans and the symptom flag in the order of
+FLAG_BITS. The age bands are cut at every age threshold of the guidelines.
+Each cell holds a packed result code, see ``unpack_result``.
+
+Run ``python -m ccr.decision_table [guidelines.json]`` to check every cell,
+at the edges of each band, against the rules read one by one.
+"""
+import sys
+from array import array
+
+# (dictionary, key) of every input flag, in bit order
+FLAG_BITS = (
+    ("personal_history", "lynch"),
+    ("personal_history", "ibd"),
+    ("personal_history", "fap"),
+    ("personal_history", "fasha"),
+    ("personal_history", "hamart"),
+    ("personal_history", "serrated_synd"),
+    ("polyp_history", "polyp10"),
+    ("polyp_history", "advanced_poly"),
+    ("polyp_history", "serrated"),
+    ("polyp_history", "resected"),
+    ("family_history", "family_crc"),
+    ("family_history", "family_before_60"),
+    (None, "symptoms"),
+)
+SYMPTOMS_BIT = 1 << (len(FLAG_BITS) - 1)
+FLAG_COMBINATIONS = 1 << len(FLAG_BITS)
+
+# BMI bands, numbered like BMI_NOTE_CODES: none or normal, overweight, obese
+BMI_BANDS = 3
+
+# Layout of a packed result code
+RISK_MASK = 0x0F
+BMI_NOTE_SHIFT = 4
+BMI_NOTE_MASK = 0x03
+SYMPTOMS_SHIFT = 6
+AGE_60_SHIFT = 7
+
+
+def pack_flags(personal_history, family_history, polyp_history, symptoms):
+    """Pack the history dictionaries and the symptom flag into an integer bitmask"""
+    histories = {
+        "personal_history": personal_history,
+        "family_history": family_history,
+        "polyp_history": polyp_history,
+    }
+    flags = SYMPTOMS_BIT if symptoms else 0
+    for bit, (group, key) in enumerate(FLAG_BITS[:-1]):
+        if histories[group].get(key, False):
+            flags |= 1 << bit
+    return flags
+
+
+def unpack_flags(flags):
+    """Rebuild the (personal_history, family_history, polyp_history, symptoms) arguments from a bitmask"""
+    histories = {"personal_history": {}, "family_history": {}, "polyp_history": {}}
+    for bit, (group, key) in enumerate(FLAG_BITS[:-1]):
+        histories[group][key] = bool(flags & (1 << bit))
+    return (histories["personal_history"], histories["family_history"],
+            histories["polyp_history"], bool(flags & SYMPTOMS_BIT))
+
+
+def pack_result(risk, bmi_note, symptoms_warning, age_60_plus):
+    """Pack result codes into a single integer"""
+    return (risk
+            | bmi_note << BMI_NOTE_SHIFT
+            | int(symptoms_warning) << SYMPTOMS_SHIFT
+            | int(age_60_plus) << AGE_60_SHIFT)
+
+
+def unpack_result(code, guidelines=None):
+    """
+    Split a packed result code into its parts
+
+    Args:
+        code: packed result code
+        guidelines: Guidelines that produced it (default: the active ones),
+            for the recommendation of the category
+
+    Returns:
+        Tuple containing:
+        - risk: index into RISK_CATEGORY_CODES
+        - recommendation: index into RECOMMENDATION_CODES
+        - bmi_note: index into BMI_NOTE_CODES
+        - symptoms_warning: whether the symptom warning applies
+        - age_60_plus: whether the age-specific lifestyle advice applies
+    """
+    if guidelines is None:
+        guidelines = _active()
+    risk = code & RISK_MASK
+    return (
+        risk,
+        guidelines.recommendation_for_category[risk],
+        (code >> BMI_NOTE_SHIFT) & BMI_NOTE_MASK,
+        bool(code >> SYMPTOMS_SHIFT & 1),
+        bool(code >> AGE_60_SHIFT & 1),
+    )
+
+
+def _active():
+    from ccr.guidelines import active
+
+    return active()
+
+
+def _table_index(flags, age_band_index, bmi_band_index, age_bands):
+    return (flags * age_bands + age_band_index) * BMI_BANDS + bmi_band_index
+
+
+def build_table(guidelines):
+    """
+    Enumerate the rules of compiled guidelines into a flat array of packed result codes
+
+    The risk category only depends on the history flags and the age band,
+    the BMI note only on the BMI band and the warning only on the symptom
+    flag. Rules are therefore matched once per (history flags, age band)
+    and the other parts are combined in. verify_table checks that this
+    holds.
+    """
+    age_bands = guidelines.age_bands
+    table = array("H", bytes(2 * FLAG_COMBINATIONS * age_bands * BMI_BANDS))
+    for band, (age, _) in enumerate(guidelines.age_band_edges):
+        age_60_plus = age >= guidelines.lifestyle_age
+        for history_flags in range(SYMPTOMS_BIT):
+            base = pack_result(guidelines.match(history_flags, age), 0, False, age_60_plus)
+            for symptoms in (0, SYMPTOMS_BIT):
+                first = _table_index(history_flags | symptoms, band, 0, age_bands)
+                for bmi_index in range(BMI_BANDS):
+                    table[first + bmi_index] = (
+                        base | bmi_index << BMI_NOTE_SHIFT | bool(symptoms) << SYMPTOMS_SHIFT)
+    return table
+
+
+def get_table():
+    """Return the decision table of the active guidelines, compiling them on first use"""
+    return _active().table
+
+
+def lookup(age, bmi, personal_history, family_history, polyp_history, symptoms):
+    """
+    Evaluate one assessment through the decision table of the active guidelines
+
+    Takes the same arguments as evaluate_risk and returns a packed result
+    code; use unpack_result to read it.
+    """
+    flags = pack_flags(personal_history, family_history, polyp_history, symptoms)
+    return _active().lookup(flags, age, bmi)
+
+
+def verify_table(guidelines=None):
+    """
+    Check every table cell against the rules read one by one
+
+    Each cell is evaluated at both edges of its age and BMI band, and half
+    a year past the last whole age of its age band, so a threshold falling
+    inside a band is reported as well.
+
+    Returns:
+        List of (flags, age, bmi, expected, actual) for every mismatch
+    """
+    if guidelines is None:
+        guidelines = _active()
+    overweight, obese = guidelines.bmi_thresholds
+    bmi_edges = ((None, round(overweight - 0.1, 1)), (overweight, round(obese - 0.1, 1)), (obese, 60))
+
+    mismatches = []
+    for flags in range(FLAG_COMBINATIONS):
+        symptoms = bool(flags & SYMPTOMS_BIT)
+        for band, ages in enumerate(guidelines.age_band_edges):
+            for bmi_index, bmis in enumerate(bmi_edges):
+                actual = guidelines.table[_table_index(flags, band, bmi_index, guidelines.age_bands)]
+                for age in (*ages, ages[1] + 0.5):
+                    risk = guidelines.match(flags & ~SYMPTOMS_BIT, age)
+                    for bmi in bmis:
+                        expected = pack_result(risk, guidelines.bmi_band(bmi), symptoms,
+                                               age >= guidelines.lifestyle_age)
+                        if expected != actual:
+                            mismatches.append((flags, age, bmi, expected, actual))
+    return mismatches
+
+
+if __name__ == "__main__":
+    from ccr.guidelines import load_guidelines
+
+    checked = load_guidelines(sys.argv[1] if len(sys.argv) > 1 else None)
+    mismatches = verify_table(checked)
+    cells = FLAG_COMBINATIONS * checked.age_bands * BMI_BANDS
+    print(f"guidelines {checked.version}: {cells} cells checked, {len(mismatches)} mismatches")
+    for flags, age, bmi, expected, actual in mismatches[:20]:
+        print(f"  flags={flags:#06x} age={age} bmi={bmi}: expected {expected:#x}, table has {actual:#x}")
+    raise SystemExit(1 if mismatches else 0)
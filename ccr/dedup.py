@@ -0,0 +1,300 @@
+"""Deduplication of batch inputs ahead of scoring.
+
+Registry extracts and repeated uploads list the same person many times. The
+scoring pipeline keeps two hash indexes over a run:
+
+- the input vector the engine reads: age, BMI and the packed history and
+  symptom flags of ccr.decision_table. It is packed exactly into one integer
+  (``input_keys``), so equal keys mean equal inputs. Rows with the same
+  input are scored once and the result is copied to each of them. Results
+  of earlier chunks are kept in a bounded cache.
+- a normalized identity key: the patient id, with the date of birth when
+  present, with case, spacing and separators removed and dates in one
+  format, hashed with BLAKE2b (``identity_keys``). A row whose identity was
+  already seen is a repeat. It is flagged, or left out with ``mode="drop"``.
+  Without a patient id column there is no identity: many people share a
+  date of birth. Nobody is then a repeat, and ``mode="drop"`` is refused.
+
+The sets of keys seen start in memory. Past ``max_keys`` they move to a
+SQLite file in a temporary directory, so a file with more people than fit
+in memory is still deduplicated exactly. The run's summary reports the
+dedup ratio: rows per distinct input and per distinct person.
+"""
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from ccr.decision_table import FLAG_BITS
+
+# Identity columns used when present, in this order; the first is required
+IDENTITY_COLUMNS = ("patient_id", "dob")
+DEDUP_MODES = ("flag", "drop")
+# Keys held in memory by each index before it moves to disk
+DEFAULT_MAX_KEYS = 2_000_000
+# Input vectors whose results are kept between chunks
+DEFAULT_CACHE_SIZE = 200_000
+# Keys checked against the disk index per statement
+SPILL_BATCH = 50_000
+
+# Layout of an input key: flags in the low bits, then BMI in tenths plus one (0: no BMI), then age
+BMI_SHIFT = len(FLAG_BITS)
+BMI_BITS = 20
+AGE_SHIFT = BMI_SHIFT + BMI_BITS
+
+_SEPARATORS = r"[\s.\-/_]+"
+
+
+def input_keys(age, bmi, flags):
+    """
+    Pack the inputs of the engine into one integer per row
+
+    Args:
+        age: ages in years
+        bmi: BMI values, NaN when missing
+        flags: bitmasks of ccr.decision_table.FLAG_BITS
+
+    Returns:
+        int64 numpy array; equal keys mean equal inputs
+    """
+    bmi = np.asarray(bmi, dtype=float)
+    tenths = np.where(np.isnan(bmi), 0, np.rint(np.nan_to_num(bmi) * 10) + 1).astype(np.int64)
+    return (np.asarray(age, dtype=np.int64) << AGE_SHIFT | tenths << BMI_SHIFT
+            | np.asarray(flags, dtype=np.int64))
+
+
+def _normalized_dates(values):
+    """Dates of birth as YYYYMMDD whatever format they were typed in; other text as is"""
+    text = values.fillna("").astype(str).str.strip()
+    parsed = pd.to_datetime(text.str[:10], format="%Y-%m-%d", errors="coerce")
+    local = parsed.isna() & (text != "")
+    if local.any():
+        parsed[local] = pd.to_datetime(text[local], format="%d/%m/%Y", errors="coerce")
+    numbers = (parsed.dt.year * 10000 + parsed.dt.month * 100 + parsed.dt.day).astype("Int64").astype(str)
+    return numbers.where(parsed.notna(), text.str.casefold())
+
+
+def identity_columns(columns, candidates=IDENTITY_COLUMNS):
+    """Return the identity columns present in an input, in candidate order; none without the first"""
+    if not candidates or candidates[0] not in columns:
+        return ()
+    return tuple(column for column in candidates if column in columns)
+
+
+def identity_keys(chunk, columns):
+    """
+    Hash the normalized identity of every row
+
+    Args:
+        chunk: DataFrame of raw input records
+        columns: identity columns, see identity_columns
+
+    Returns:
+        List of 16-byte digests
+    """
+    parts = []
+    for column in columns:
+        if column == "dob":
+            parts.append(_normalized_dates(chunk[column]))
+        else:
+            parts.append(chunk[column].fillna("").astype(str).str.casefold()
+                         .str.replace(_SEPARATORS, "", regex=True))
+    joined = parts[0].str.cat(parts[1:], sep="\x1f") if len(parts) > 1 else parts[0]
+    return [hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest() for value in joined]
+
+
+class SpillSet:
+    """
+    Set of keys that moves to a SQLite file on disk once it holds max_keys
+
+    Args:
+        max_keys: keys held in memory before moving to disk
+        directory: where the disk file is created (default: a temporary
+            directory, removed by close())
+    """
+
+    def __init__(self, max_keys=DEFAULT_MAX_KEYS, directory=None):
+        self.max_keys = max_keys
+        self.directory = directory
+        self.spilled = False
+        self._keys = set()
+        self._size = 0
+        self._connection = None
+        self._owned_directory = None
+
+    def __len__(self):
+        return self._size
+
+    def add(self, keys):
+        """
+        Add keys and tell which were not seen before
+
+        Returns:
+            Boolean numpy array, True for the first occurrence of each new
+            key, counting repeats within keys
+        """
+        new = np.zeros(len(keys), dtype=bool)
+        first = {}
+        for position, key in enumerate(keys):
+            first.setdefault(key, position)
+        unseen = self._unseen(list(first))
+        for key in unseen:
+            new[first[key]] = True
+        self._size += len(unseen)
+        if not self.spilled and len(self._keys) > self.max_keys:
+            self._spill()
+        return new
+
+    def _unseen(self, keys):
+        if not self.spilled:
+            unseen = [key for key in keys if key not in self._keys]
+            self._keys.update(unseen)
+            return unseen
+        unseen = []
+        with self._connection:
+            for start in range(0, len(keys), SPILL_BATCH):
+                batch = keys[start:start + SPILL_BATCH]
+                self._connection.executemany("INSERT INTO batch VALUES (?)", ((key,) for key in batch))
+                unseen.extend(key for key, in self._connection.execute(
+                    "SELECT key FROM batch WHERE key NOT IN (SELECT key FROM seen)"))
+                self._connection.execute("INSERT OR IGNORE INTO seen SELECT key FROM batch")
+                self._connection.execute("DELETE FROM batch")
+        return unseen
+
+    def _spill(self):
+        directory = self.directory
+        if directory is None:
+            directory = self._owned_directory = tempfile.mkdtemp(prefix="ccr-dedup-")
+        self._connection = sqlite3.connect(os.path.join(directory, f"keys-{id(self)}.db"))
+        self._connection.execute("PRAGMA journal_mode=OFF")
+        self._connection.execute("PRAGMA synchronous=OFF")
+        self._connection.execute("CREATE TABLE seen (key PRIMARY KEY) WITHOUT ROWID")
+        self._connection.execute("CREATE TEMP TABLE batch (key PRIMARY KEY) WITHOUT ROWID")
+        with self._connection:
+            self._connection.executemany("INSERT INTO seen VALUES (?)", ((key,) for key in self._keys))
+        self._keys = set()
+        self.spilled = True
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        if self._owned_directory is not None:
+            shutil.rmtree(self._owned_directory, ignore_errors=True)
+            self._owned_directory = None
+
+
+class Deduplicator:
+    """
+    Hash indexes of the inputs and identities seen during one batch run
+
+    Args:
+        mode: "flag" marks repeats of a person in a 'repeat' column, "drop"
+            leaves them out of the output
+        identity: identity columns to use when present, the first one
+            required (default: IDENTITY_COLUMNS); empty to only share
+            results between identical inputs
+        max_keys: keys each index holds in memory before moving to disk
+        cache_size: input vectors whose results are kept between chunks
+        directory: where indexes are spilled (default: a temporary directory)
+    """
+
+    def __init__(self, mode="flag", identity=IDENTITY_COLUMNS, max_keys=DEFAULT_MAX_KEYS,
+                 cache_size=DEFAULT_CACHE_SIZE, directory=None):
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"mode must be one of {DEDUP_MODES}")
+        self.mode = mode
+        self.identity = identity
+        self.cache_size = cache_size
+        self.rows = 0
+        self.scored = 0
+        self.evaluated = 0
+        self.repeats = 0
+        self._inputs = SpillSet(max_keys, directory)
+        self._identities = SpillSet(max_keys, directory)
+        self._results = {}
+        self._results_guidelines = None
+
+    def repeated(self, chunk):
+        """
+        Return a boolean numpy array, True for rows whose identity was seen before in the run
+
+        Raises:
+            ValueError: in "drop" mode, when the input has no identity
+                column to tell people apart
+        """
+        columns = identity_columns(chunk.columns, self.identity)
+        if not columns:
+            if self.mode == "drop":
+                required = (self.identity or IDENTITY_COLUMNS)[0]
+                raise ValueError(f"Para descartar repetidos la entrada necesita la columna '{required}'")
+            self.rows += len(chunk)
+            return np.zeros(len(chunk), dtype=bool)
+        self.rows += len(chunk)
+        repeated = ~self._identities.add(identity_keys(chunk, columns))
+        self.repeats += int(repeated.sum())
+        return repeated
+
+    def codes(self, keys, evaluate, guidelines):
+        """
+        Result codes of input keys, evaluating each distinct key not cached once
+
+        Args:
+            keys: int64 array of input_keys
+            evaluate: callable taking the positions of the rows to evaluate
+                and returning one packed result code per position
+            guidelines: Guidelines evaluate applies; cached results of other
+                guidelines are dropped
+
+        Returns:
+            Array of packed result codes, one per key
+        """
+        if guidelines is not self._results_guidelines:
+            self._results.clear()
+            self._results_guidelines = guidelines
+        self.scored += len(keys)
+        self._inputs.add(keys.tolist())
+        distinct, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        codes = np.array([self._results.get(key, -1) for key in distinct.tolist()], dtype=np.int64)
+        missing = codes < 0
+        if missing.any():
+            codes[missing] = evaluate(first[missing])
+            self.evaluated += int(missing.sum())
+            if len(self._results) + int(missing.sum()) > self.cache_size:
+                self._results.clear()
+            self._results.update(zip(distinct[missing].tolist(), codes[missing].tolist()))
+        return codes[inverse]
+
+    def summary(self):
+        """
+        Dictionary with the valid rows seen, rows scored, distinct inputs,
+        inputs evaluated, distinct people, repeats of a person, the rows
+        scored per distinct input ('input_ratio') and the rows seen per
+        distinct person ('people_ratio'), and whether an index moved to disk
+        """
+        inputs, people = len(self._inputs), len(self._identities)
+        return {
+            "rows": self.rows,
+            "scored": self.scored,
+            "distinct_inputs": inputs,
+            "evaluated": self.evaluated,
+            "people": people,
+            "repeats": self.repeats,
+            "input_ratio": self.scored / inputs if inputs else 0.0,
+            "people_ratio": self.rows / people if people else 0.0,
+            "spilled": self._inputs.spilled or self._identities.spilled,
+        }
+
+    def close(self):
+        self._inputs.close()
+        self._identities.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
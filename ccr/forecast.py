@@ -0,0 +1,173 @@
+"""Screening-capacity forecast: procedures per year and method for a cohort.
+
+Every scored person follows the schedule of their risk category:
+    - colonoscopy at the interval and over the timeline of the category in
+      the active guidelines, starting in the first year; people with an
+      advanced adenoma also get a FIT kit in the years between colonoscopies
+    - people of the categories without a fixed timeline (no risk factor,
+      average risk, under 50) are screened within the average-risk ages of
+      the guidelines (50 to 75) with the methods of the average-risk
+      options, FIT (TSOMFi) every 2 years by default; younger people join
+      when they reach the first age
+
+People are first counted per risk category and age with one bincount, which
+is O(n) and can be summed over chunks of a large file. The schedules are
+then expanded for those counts with array broadcasting, so the cost of the
+expansion does not depend on the number of people.
+"""
+import numpy as np
+import pandas as pd
+
+from ccr.codes import RISK_CATEGORY_CODES, RISK_CODE
+from ccr.guidelines import active
+from ccr.pipeline import DEFAULT_CHUNKSIZE, read_chunks
+
+METHODS = ("colonoscopy", "fit", "rsc")
+
+# Interval in years of each average-risk option (see the average_risk_options text)
+AVERAGE_RISK_INTERVALS = {"fit": 2, "colonoscopy": 10, "rsc": 5}
+DEFAULT_AVERAGE_RISK_MIX = {"fit": 1.0}
+
+# Ages are counted up to this bound; older people are never screened by age
+MAX_AGE = 121
+DEFAULT_YEARS = 15
+
+
+def cohort_counts(risk, age):
+    """
+    Count people per risk category and age
+
+    Args:
+        risk: integer array of risk codes (index into RISK_CATEGORY_CODES);
+            negative codes are skipped
+        age: integer array of ages at the assessment
+
+    Returns:
+        Array of shape (len(RISK_CATEGORY_CODES), MAX_AGE); counts of
+        several chunks can be added together
+    """
+    risk = np.asarray(risk, dtype=np.int64)
+    age = np.clip(np.asarray(age, dtype=np.int64), 0, MAX_AGE - 1)
+    valid = risk >= 0
+    cells = risk[valid] * MAX_AGE + age[valid]
+    return np.bincount(cells, minlength=len(RISK_CATEGORY_CODES) * MAX_AGE).reshape(
+        len(RISK_CATEGORY_CODES), MAX_AGE)
+
+
+def frame_counts(frame):
+    """cohort_counts of a scored DataFrame with 'risk_category' names and 'age'"""
+    risk = pd.Categorical(frame["risk_category"], categories=RISK_CATEGORY_CODES).codes
+    age = pd.to_numeric(frame["age"], errors="coerce")
+    valid = age.notna().to_numpy()
+    return cohort_counts(risk[valid], age[valid].to_numpy(dtype=np.int64))
+
+
+def age_screened():
+    """Risk codes screened by age rather than on a fixed timeline in the active guidelines"""
+    return [risk for risk, schedule in enumerate(active().screening_schedule) if schedule is None]
+
+
+def fixed_schedule(years):
+    """
+    Procedures per person of the categories with a fixed timeline
+
+    Returns:
+        Array of shape (len(RISK_CATEGORY_CODES), years, len(METHODS)),
+        all zeros for the categories screened by age
+    """
+    offsets = np.arange(years)
+    schedule = np.zeros((len(RISK_CATEGORY_CODES), years, len(METHODS)), dtype=np.int64)
+    for risk, category_schedule in enumerate(active().screening_schedule):
+        if category_schedule is None:
+            continue
+        interval, timeline_years = category_schedule
+        in_timeline = offsets <= timeline_years
+        colonoscopy_years = in_timeline & (offsets % interval == 0)
+        schedule[risk, :, METHODS.index("colonoscopy")] = colonoscopy_years
+        if risk == RISK_CODE["advanced_adenoma"]:
+            schedule[risk, :, METHODS.index("fit")] = in_timeline & ~colonoscopy_years
+    return schedule
+
+
+def screening_ages():
+    """(first, last) age of the average-risk screening in the active guidelines"""
+    first_age, last_age = active().average_risk_screening[0]
+    return max(first_age, 0), min(last_age, MAX_AGE)
+
+
+def age_schedule(method, years):
+    """
+    Years in which people at average risk are due for a method, by age at the assessment
+
+    Returns:
+        Boolean array of shape (MAX_AGE, years)
+    """
+    first_age, last_age = screening_ages()
+    offsets = np.arange(years)
+    ages = np.arange(MAX_AGE)[:, None]
+    age_then = ages + offsets
+    eligible = (age_then >= first_age) & (age_then <= last_age)
+    since_first = offsets - np.maximum(first_age - ages, 0)
+    return eligible & (since_first % AVERAGE_RISK_INTERVALS[method] == 0)
+
+
+def forecast_counts(counts, years=DEFAULT_YEARS, start_year=None, average_risk_mix=None):
+    """
+    Expand cohort counts into procedures per year and method
+
+    Args:
+        counts: array returned by cohort_counts
+        years: number of years forecast, starting with the assessment year
+        start_year: calendar year of the assessments (default: this year)
+        average_risk_mix: {method: share} of the average-risk people
+            screened with each method of AVERAGE_RISK_INTERVALS; shares
+            should add up to 1 (default: FIT only)
+
+    Returns:
+        DataFrame indexed by year with one column per method in METHODS
+    """
+    mix = DEFAULT_AVERAGE_RISK_MIX if average_risk_mix is None else average_risk_mix
+    # One pass per category and method, not per person
+    procedures = np.einsum("c,cym->ym", counts.sum(axis=1), fixed_schedule(years)).astype(float)
+    people = counts[age_screened()].sum(axis=0).astype(float)
+    for method, share in mix.items():
+        procedures[:, METHODS.index(method)] += share * (people @ age_schedule(method, years))
+    return pd.DataFrame(procedures, index=year_index(start_year, years), columns=list(METHODS))
+
+
+def year_index(start_year, years):
+    """Index of the forecast years"""
+    if start_year is None:
+        start_year = pd.Timestamp.today().year
+    return pd.RangeIndex(start_year, start_year + years, name="year")
+
+
+def forecast(frame, years=DEFAULT_YEARS, start_year=None, average_risk_mix=None):
+    """Forecast the procedures of a scored DataFrame, see forecast_counts"""
+    return forecast_counts(frame_counts(frame), years, start_year, average_risk_mix)
+
+
+def file_counts(path, chunksize=DEFAULT_CHUNKSIZE, file_format=None):
+    """cohort_counts of a file written by the score command, read chunk by chunk"""
+    counts = cohort_counts([], [])
+    for chunk in read_chunks(path, chunksize, file_format):
+        counts += frame_counts(chunk)
+    return counts
+
+
+def forecast_file(path, years=DEFAULT_YEARS, start_year=None, average_risk_mix=None,
+                  chunksize=DEFAULT_CHUNKSIZE, file_format=None):
+    """Forecast the procedures of a file written by the score command"""
+    return forecast_counts(file_counts(path, chunksize, file_format), years, start_year, average_risk_mix)
+
+
+def parse_mix(text):
+    """Parse "fit=0.8,rsc=0.2" into an average-risk mix"""
+    mix = {}
+    for part in text.split(","):
+        method, _, share = part.partition("=")
+        method = method.strip().lower()
+        if method not in AVERAGE_RISK_INTERVALS:
+            raise ValueError(f"unknown method '{method}', expected one of {', '.join(AVERAGE_RISK_INTERVALS)}")
+        mix[method] = float(share)
+    return mix
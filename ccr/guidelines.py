@@ -0,0 +1,407 @@
+"""Screening guidelines loaded from a versioned data file.
+
+The guideline hierarchy, its thresholds and every text shown to the patient
+live in ``guidelines.json`` next to this module, or in the file named by
+the CCR_GUIDELINES environment variable. A guideline change is then an edit
+of that file instead of the code.
+
+The file holds:
+    - version: shown in /health and stored with each result
+    - categories: the rules in priority order. The first one whose
+      conditions hold gives the risk category. A condition lists flags that
+      must all be set ("all"), flags of which one must be set ("any") and an
+      age range in whole years ("ages", null for no bound); [50, 75] holds
+      from the 50th birthday until the 76th. Each category also
+      gives its risk level, screening schedule, recommendation code and
+      texts.
+    - average_risk_screening: the age range and TSOMFi interval of the
+      timeline for people without a fixed schedule
+    - bmi, lifestyle, symptoms, recommendations: the other texts and their
+      thresholds
+
+Loading validates the file and compiles it once into a Guidelines object.
+That object holds the decision table of ``ccr.decision_table`` plus the text
+tables, so an evaluation stays a single table lookup.
+
+Guidelines objects are never modified. A reload compiles the new file to
+the side and then replaces the module's reference to the active object in
+one assignment. Evaluations already running keep the object they started
+with, and results keep rendering the texts of the guidelines that produced
+them. Nothing on the evaluation path takes a lock. A file that fails to
+load leaves the previous guidelines active. Replace the file atomically
+(write a copy, then rename it) so a reload never sees half of it.
+"""
+import json
+import math
+import os
+import sys
+import threading
+import time
+from bisect import bisect_right
+from pathlib import Path
+
+from ccr.codes import (
+    BMI_NOTE_CODES,
+    RECOMMENDATION_CODE,
+    RECOMMENDATION_CODES,
+    RISK_CATEGORY_CODES,
+    RISK_CODE,
+    RISK_LEVEL_CODE,
+)
+from ccr.decision_table import BMI_BANDS, FLAG_BITS, build_table
+
+DEFAULT_PATH = Path(__file__).with_name("guidelines.json")
+PATH_ENV = "CCR_GUIDELINES"
+RELOAD_ENV = "CCR_GUIDELINES_RELOAD"
+# Oldest age the table distinguishes; later ages fall in the last band
+MAX_AGE = 120
+
+# Flags a rule may test: every history flag of the decision table
+RULE_FLAGS = tuple(key for _, key in FLAG_BITS[:-1])
+_FLAG_MASK = {key: 1 << bit for bit, key in enumerate(RULE_FLAGS)}
+
+
+def _require(condition, message):
+    if not condition:
+        raise ValueError(message)
+
+
+def _text(value, where):
+    _require(isinstance(value, str), f"{where} must be a string")
+    return sys.intern(value)
+
+
+def _age_range(ages, where):
+    _require(isinstance(ages, list) and len(ages) == 2, f"{where} must be [from, to]")
+    low, high = ages
+    _require(low is None or isinstance(low, int), f"{where}: ages must be whole numbers or null")
+    _require(high is None or isinstance(high, int), f"{where}: ages must be whole numbers or null")
+    low = -math.inf if low is None else low
+    high = math.inf if high is None else high
+    _require(low <= high, f"{where}: invalid age range {ages}")
+    return low, high
+
+
+def _rule(category, where):
+    """Parse the conditions of one category into (risk, all_mask, any_mask, ages)"""
+    when = category.get("when", {})
+    _require(isinstance(when, dict), f"{where}.when must be an object")
+    unknown = set(when) - {"all", "any", "ages"}
+    _require(not unknown, f"{where}.when: unknown conditions {sorted(unknown)}")
+    masks = []
+    for kind in ("all", "any"):
+        mask = 0
+        for flag in when.get(kind, []):
+            _require(flag in _FLAG_MASK, f"{where}.when.{kind}: unknown flag {flag!r}")
+            mask |= _FLAG_MASK[flag]
+        masks.append(mask)
+    ages = _age_range(when["ages"], f"{where}.when.ages") if "ages" in when else None
+    return RISK_CODE[category["code"]], masks[0], masks[1], ages
+
+
+def _schedule(value, where):
+    if value is None:
+        return None
+    _require(isinstance(value, list) and len(value) == 2 and all(isinstance(v, int) for v in value),
+             f"{where} must be [interval, years] or null")
+    interval, years = value
+    _require(interval > 0 and years >= 0, f"{where}: invalid schedule {value}")
+    return interval, years
+
+
+def lifestyle_text(lifestyle, bmi_thresholds, bmi, age):
+    """Build the lifestyle advice of a BMI and age from the 'lifestyle' section of a guidelines file"""
+    overweight, obese = bmi_thresholds
+    items = list(lifestyle["items"])
+    if bmi and bmi >= obese:
+        items.insert(1, lifestyle["bmi_items"]["obese"])
+    elif bmi and bmi >= overweight:
+        items.insert(1, lifestyle["bmi_items"]["overweight"])
+    if age >= lifestyle["age_item"]["from_age"]:
+        items.append(lifestyle["age_item"]["text"])
+    return lifestyle["intro"] + "\n".join(items)
+
+
+class Guidelines:
+    """
+    Compiled guidelines: decision table, thresholds and texts
+
+    Build one with load_guidelines or compile_guidelines. Tuples named
+    *_text and the schedule and level tuples are indexed by risk code
+    (RISK_CATEGORY_CODES), recommendation_text by recommendation code.
+    """
+
+    __slots__ = (
+        "version", "path", "rules", "age_breaks", "age_band_edges", "age_bands", "bmi_thresholds",
+        "lifestyle_age", "average_risk_screening", "category_text", "summary_text", "recommendation_text",
+        "recommendation_for_category", "risk_level", "screening_schedule", "age_dependent",
+        "bmi_note_template", "lifestyle_text", "symptoms_warning_text", "symptoms_detail_text",
+        "risk_code_by_text", "table",
+    )
+
+    def age_band(self, age):
+        """Return the age band index of an age in years"""
+        return bisect_right(self.age_breaks, age)
+
+    def bmi_band(self, bmi):
+        """Return the BMI band index (the BMI note code); no BMI counts as normal"""
+        if bmi and bmi >= self.bmi_thresholds[1]:
+            return 2
+        if bmi and bmi >= self.bmi_thresholds[0]:
+            return 1
+        return 0
+
+    def lookup(self, flags, age, bmi):
+        """Return the packed result code of a flag bitmask, age and BMI"""
+        return self.table[(flags * self.age_bands + self.age_band(age)) * BMI_BANDS + self.bmi_band(bmi)]
+
+    def lookup_array(self, flags, age, bmi):
+        """Vectorized lookup over numpy arrays of flag bitmasks, ages and BMIs (NaN for none)"""
+        import numpy as np
+
+        table = np.frombuffer(self.table, dtype=np.uint16)
+        age_bands = np.searchsorted(np.array(self.age_breaks), age, side="right")
+        overweight, obese = self.bmi_thresholds
+        bmi_bands = np.select([bmi >= obese, bmi >= overweight], [2, 1], default=0)
+        return table[(np.asarray(flags, dtype=np.int64) * self.age_bands + age_bands) * BMI_BANDS + bmi_bands]
+
+    def match(self, flags, age):
+        """
+        Walk the rules in order and return the risk code of the first that holds
+
+        This reads the rules directly; the decision table is built from it
+        and checked against it (see ccr.decision_table.verify_table).
+
+        Args:
+            flags: history bitmask as packed by ccr.decision_table.pack_flags
+            age: age in years
+        """
+        for risk, all_mask, any_mask, ages in self.rules:
+            if flags & all_mask != all_mask or (any_mask and not flags & any_mask):
+                continue
+            if ages is not None and not ages[0] <= age < ages[1] + 1:
+                continue
+            return risk
+        return RISK_CODE["none"]
+
+    def schedule(self, risk, age):
+        """
+        Return the screening timeline of a category at an age
+
+        Returns:
+            Tuple (interval, timeline_years) in years; interval is None when
+            no routine screening applies
+        """
+        schedule = self.screening_schedule[risk]
+        if schedule is not None:
+            return schedule
+        (first_age, last_age), interval, years = self.average_risk_screening
+        if first_age <= age < last_age + 1:
+            return interval, years
+        return None, 0
+
+
+def compile_guidelines(spec, path=None):
+    """
+    Validate a parsed guidelines file and compile it
+
+    Args:
+        spec: the file's JSON content
+        path: where it was read from, kept for messages and reloads
+
+    Returns:
+        Guidelines
+
+    Raises:
+        ValueError when the file is incomplete or inconsistent
+    """
+    _require(isinstance(spec, dict), "guidelines must be a JSON object")
+    for key in ("version", "categories", "recommendations", "bmi", "lifestyle", "symptoms",
+                "average_risk_screening"):
+        _require(key in spec, f"missing '{key}'")
+    guidelines = Guidelines()
+    guidelines.version = _text(spec["version"], "version")
+    guidelines.path = str(path) if path else None
+
+    recommendations = spec["recommendations"]
+    _require(set(recommendations) == set(RECOMMENDATION_CODES),
+             f"recommendations must define exactly {', '.join(RECOMMENDATION_CODES)}")
+    guidelines.recommendation_text = tuple(
+        _text(recommendations[code], f"recommendations.{code}") for code in RECOMMENDATION_CODES)
+
+    categories = spec["categories"]
+    _require(isinstance(categories, list) and all(isinstance(c, dict) for c in categories),
+             "categories must be a list of objects")
+    codes = [category.get("code") for category in categories]
+    _require(sorted(codes, key=str) == sorted(RISK_CATEGORY_CODES) and len(set(codes)) == len(codes),
+             f"categories must define each of {', '.join(RISK_CATEGORY_CODES)} once")
+    by_code = {}
+    rules = []
+    for position, category in enumerate(categories):
+        where = f"categories[{position}] ({category['code']})"
+        _require(category.get("level") in RISK_LEVEL_CODE, f"{where}.level must be one of {list(RISK_LEVEL_CODE)}")
+        _require(category.get("recommendation") in RECOMMENDATION_CODE,
+                 f"{where}.recommendation must be one of {list(RECOMMENDATION_CODE)}")
+        by_code[category["code"]] = category
+        rules.append(_rule(category, where))
+    guidelines.rules = tuple(rules)
+    ordered = [by_code[code] for code in RISK_CATEGORY_CODES]
+    guidelines.category_text = tuple(_text(c.get("category"), f"{c['code']}.category") for c in ordered)
+    guidelines.summary_text = tuple(_text(c.get("summary"), f"{c['code']}.summary") for c in ordered)
+    guidelines.recommendation_for_category = tuple(RECOMMENDATION_CODE[c["recommendation"]] for c in ordered)
+    guidelines.risk_level = tuple(RISK_LEVEL_CODE[c["level"]] for c in ordered)
+    guidelines.screening_schedule = tuple(_schedule(c.get("schedule"), f"{c['code']}.schedule") for c in ordered)
+    age_rules = {risk for risk, *_, ages in rules if ages is not None}
+    guidelines.age_dependent = tuple(risk in age_rules for risk in range(len(RISK_CATEGORY_CODES)))
+    guidelines.risk_code_by_text = {text: code for code, text in enumerate(guidelines.category_text) if text}
+
+    average = spec["average_risk_screening"]
+    ages = _age_range(average.get("ages"), "average_risk_screening.ages")
+    interval, years = _schedule([average.get("interval"), average.get("years")], "average_risk_screening")
+    guidelines.average_risk_screening = (ages, interval, years)
+
+    bmi = spec["bmi"]
+    overweight, obese = bmi.get("overweight"), bmi.get("obese")
+    _require(all(isinstance(v, (int, float)) for v in (overweight, obese)) and 0 < overweight < obese,
+             "bmi: overweight and obese must be numbers with overweight < obese")
+    guidelines.bmi_thresholds = (overweight, obese)
+    notes = bmi.get("notes", {})
+    guidelines.bmi_note_template = ("",) + tuple(
+        _text(notes.get(name), f"bmi.notes.{name}") for name in BMI_NOTE_CODES[1:])
+
+    lifestyle = spec["lifestyle"]
+    try:
+        guidelines.lifestyle_age = lifestyle["age_item"]["from_age"]
+        _require(isinstance(guidelines.lifestyle_age, int), "lifestyle.age_item.from_age must be a whole number")
+        band_bmi = (None, overweight, obese)
+        # Indexed by [bmi_note][age_60_plus]
+        guidelines.lifestyle_text = tuple(
+            tuple(sys.intern(lifestyle_text(lifestyle, guidelines.bmi_thresholds, bmi_value, age))
+                  for age in (guidelines.lifestyle_age - 1, guidelines.lifestyle_age))
+            for bmi_value in band_bmi)
+    except (KeyError, TypeError) as error:
+        raise ValueError(f"lifestyle: missing or invalid {error}") from None
+
+    symptoms = spec["symptoms"]
+    guidelines.symptoms_warning_text = _text(symptoms.get("warning"), "symptoms.warning")
+    guidelines.symptoms_detail_text = _text(symptoms.get("detail"), "symptoms.detail")
+
+    # Every age at which some answer can change starts a band
+    breaks = {guidelines.lifestyle_age, ages[0], ages[1] + 1}
+    for *_, rule_ages in rules:
+        if rule_ages is not None:
+            breaks.update((rule_ages[0], rule_ages[1] + 1))
+    guidelines.age_breaks = tuple(sorted(age for age in breaks if 0 < age <= MAX_AGE))
+    starts = (0,) + guidelines.age_breaks
+    ends = tuple(age - 1 for age in guidelines.age_breaks) + (MAX_AGE,)
+    guidelines.age_band_edges = tuple(zip(starts, ends))
+    guidelines.age_bands = len(starts)
+
+    guidelines.table = build_table(guidelines)
+    return guidelines
+
+
+def load_guidelines(path=None):
+    """
+    Read and compile a guidelines file
+
+    Args:
+        path: file to read (default: CCR_GUIDELINES or the bundled file)
+
+    Raises:
+        ValueError naming the file when it cannot be read or compiled
+    """
+    path = path or os.environ.get(PATH_ENV) or DEFAULT_PATH
+    try:
+        with open(path, encoding="utf-8") as f:
+            spec = json.load(f)
+        return compile_guidelines(spec, path)
+    except (OSError, ValueError) as error:
+        raise ValueError(f"{path}: {error}") from None
+
+
+_active = None
+_active_lock = threading.Lock()
+
+
+def active():
+    """Return the guidelines in force, loading them on first use"""
+    guidelines = _active
+    if guidelines is None:
+        with _active_lock:
+            if _active is None:
+                activate(load_guidelines())
+            guidelines = _active
+    return guidelines
+
+
+def activate(guidelines):
+    """Make compiled guidelines the ones in force for new evaluations"""
+    global _active
+    _active = guidelines
+    return guidelines
+
+
+def reload(path=None):
+    """
+    Compile a guidelines file and swap it in
+
+    Args:
+        path: file to read (default: the file of the active guidelines)
+
+    Returns:
+        The new Guidelines; on error the active ones stay in force and
+        ValueError is raised
+    """
+    if path is None and _active is not None:
+        path = _active.path
+    return activate(load_guidelines(path))
+
+
+def _file_state(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def watch(path=None, interval=5.0):
+    """
+    Reload the guidelines whenever their file changes
+
+    Args:
+        path: file to watch (default: the file of the active guidelines)
+        interval: seconds between checks
+
+    Returns:
+        The daemon thread polling the file
+    """
+    path = path or active().path
+
+    def poll():
+        seen = _file_state(path)
+        while True:
+            time.sleep(interval)
+            state = _file_state(path)
+            if state is None or state == seen:
+                continue
+            seen = state
+            try:
+                guidelines = reload(path)
+            except ValueError as error:
+                print(f"Guías no recargadas, se mantiene la versión {active().version}: {error}", file=sys.stderr)
+            else:
+                print(f"Guías recargadas: versión {guidelines.version}", file=sys.stderr)
+
+    thread = threading.Thread(target=poll, name="guidelines-watcher", daemon=True)
+    thread.start()
+    return thread
+
+
+def start_watcher_from_env():
+    """Watch the guidelines file when CCR_GUIDELINES_RELOAD gives a check interval in seconds"""
+    interval = float(os.environ.get(RELOAD_ENV) or 0)
+    if interval <= 0:
+        return None
+    return watch(interval=interval)
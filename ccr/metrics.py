@@ -0,0 +1,259 @@
+"""Per-stage latency histograms and counters in the Prometheus text format.
+
+Instrumented code wraps a stage in ``with metrics.stage("name"):``. The
+elapsed time goes into a fixed-bucket histogram for that stage and risk
+category. Recording one observation costs a clock read, a bisect over the
+bucket bounds and a short locked update, a couple of microseconds, so it can
+stay on in production. When metrics are disabled, ``stage`` returns a
+shared no-op object and nothing is recorded.
+
+Switches (environment variables, read at import):
+    CCR_METRICS=0           disable recording completely
+    CCR_METRICS_PORT=9464   serve /metrics on this local port
+    CCR_METRICS_FILE=path   rewrite this file periodically, for a textfile collector
+    CCR_METRICS_INTERVAL=15 seconds between file writes
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds, from a table lookup up to a slow PDF
+STAGE_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+HISTOGRAM_NAME = "ccr_stage_seconds"
+HISTOGRAM_HELP = "Time spent in each instrumented stage"
+
+# Counter: (metric name, label name, help)
+COUNTERS = {
+    "stage_errors": ("ccr_stage_errors_total", "stage", "Stages that raised an exception"),
+}
+
+# Assessments per risk category, read off the evaluate_risk histogram so
+# that scoring a patient updates one metric instead of two
+ASSESSMENTS_NAME = "ccr_assessments_total"
+ASSESSMENTS_STAGE = "evaluate_risk"
+
+DEFAULT_FILE_INTERVAL = 15
+
+_enabled = os.environ.get("CCR_METRICS", "1").strip().lower() not in ("0", "false", "no", "off")
+_lock = threading.Lock()
+# (stage, risk_category) -> per-bucket counts, the +Inf bucket, then the sum
+_histograms = {}
+# (counter, label value) -> count
+_counters = {}
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(value):
+    """Turn recording on or off at runtime; recorded values are kept"""
+    global _enabled
+    _enabled = bool(value)
+
+
+def reset():
+    """Forget every recorded value"""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def observe(stage_name, seconds, category=""):
+    """Record one duration of a stage"""
+    if _enabled:
+        _record((stage_name, category), seconds)
+
+
+def _record(key, seconds):
+    index = bisect_left(STAGE_BUCKETS, seconds)
+    _lock.acquire()
+    try:
+        row = _histograms.get(key)
+        if row is None:
+            row = _histograms[key] = [0] * (len(STAGE_BUCKETS) + 1) + [0.0]
+        row[index] += 1
+        row[-1] += seconds
+    finally:
+        _lock.release()
+
+
+def increment(counter, label="", amount=1):
+    """Add amount to one of the COUNTERS"""
+    if not _enabled:
+        return
+    key = (counter, label)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+class _Stage:
+    """Context manager timing one stage; category may be set inside the block"""
+
+    __slots__ = ("name", "category", "_started")
+
+    def __init__(self, name, category):
+        self.name = name
+        self.category = category
+
+    def __enter__(self):
+        self._started = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        _record((self.name, self.category), perf_counter() - self._started)
+        if exc_type is not None:
+            increment("stage_errors", self.name)
+        return False
+
+
+class _NullStage:
+    """Stand-in returned while metrics are disabled"""
+
+    __slots__ = ("category",)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name, category=""):
+    """
+    Time a block of code as one observation of a stage
+
+    Args:
+        name: stage name, e.g. "evaluate_risk"
+        category: risk category code name, when already known; it can also
+            be assigned to the returned object before the block ends
+    """
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name, category)
+
+
+def summary():
+    """
+    Return the recorded stage observations without their buckets
+
+    Returns:
+        Dictionary {stage: {risk_category: (count, total seconds)}}
+    """
+    with _lock:
+        rows = [(key, sum(row[:-1]), row[-1]) for key, row in _histograms.items()]
+    stages = {}
+    for (stage_name, category), count, seconds in sorted(rows):
+        stages.setdefault(stage_name, {})[category] = (count, seconds)
+    return stages
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def render():
+    """Return every recorded metric in the Prometheus text exposition format"""
+    with _lock:
+        histograms = {key: list(row) for key, row in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = [f"# HELP {HISTOGRAM_NAME} {HISTOGRAM_HELP}", f"# TYPE {HISTOGRAM_NAME} histogram"]
+    bounds = [repr(bound) for bound in STAGE_BUCKETS] + ["+Inf"]
+    for (stage_name, category), row in sorted(histograms.items()):
+        labels = f'stage="{_label(stage_name)}",risk_category="{_label(category)}"'
+        cumulative = 0
+        for bound, count in zip(bounds, row):
+            cumulative += count
+            lines.append(f'{HISTOGRAM_NAME}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"{HISTOGRAM_NAME}_sum{{{labels}}} {row[-1]!r}")
+        lines.append(f"{HISTOGRAM_NAME}_count{{{labels}}} {cumulative}")
+
+    lines.append(f"# HELP {ASSESSMENTS_NAME} Assessments scored by risk category")
+    lines.append(f"# TYPE {ASSESSMENTS_NAME} counter")
+    for (stage_name, category), row in sorted(histograms.items()):
+        if stage_name == ASSESSMENTS_STAGE:
+            lines.append(f'{ASSESSMENTS_NAME}{{risk_category="{_label(category)}"}} {sum(row[:-1])}')
+
+    for counter, (name, label_name, help_text) in COUNTERS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for (key, label), count in sorted(counters.items()):
+            if key == counter:
+                lines.append(f'{name}{{{label_name}="{_label(label)}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path):
+    """Write render() to path atomically, so a collector never reads half a file"""
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(temporary, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serve /metrics from a daemon thread; returns the server"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def start_file_writer(path, interval=DEFAULT_FILE_INTERVAL):
+    """Rewrite path every interval seconds from a daemon thread; returns the thread"""
+    def write_forever():
+        while True:
+            time.sleep(interval)
+            write_textfile(path)
+
+    thread = threading.Thread(target=write_forever, name="metrics-file", daemon=True)
+    thread.start()
+    return thread
+
+
+def start_exporters_from_env():
+    """
+    Start the exporters configured by CCR_METRICS_PORT and CCR_METRICS_FILE
+
+    Returns:
+        List of the servers and threads started, empty when none is
+        configured or metrics are disabled
+    """
+    if not _enabled:
+        return []
+    exporters = []
+    port = os.environ.get("CCR_METRICS_PORT")
+    if port:
+        exporters.append(start_http_server(int(port)))
+    path = os.environ.get("CCR_METRICS_FILE")
+    if path:
+        interval = float(os.environ.get("CCR_METRICS_INTERVAL", DEFAULT_FILE_INTERVAL))
+        exporters.append(start_file_writer(path, interval))
+    return exporters
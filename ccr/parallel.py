@@ -0,0 +1,183 @@
+"""Multi-core sharded batch scoring.
+
+The input file is cut into byte ranges on line boundaries and every shard
+is validated and scored by a worker process. Workers write their scored rows
+into per-shard part files that are concatenated in shard order, so the
+output order is the input order no matter how many workers run or which
+one finishes first. Only counts travel back through the pool.
+
+Every shard reads its records in the columns of the first chunk of the
+file, as ccr.pipeline.read_chunks does, so the part files share one header.
+
+Records must be one per line (CSV without embedded newlines, or JSONL).
+"""
+import io
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from ccr.pipeline import DEFAULT_CHUNKSIZE, ChunkWriter, detect_format, json_chunk, read_chunks, score_chunk
+
+SHARDS_PER_WORKER = 4
+
+
+def split_file(path, n_shards, skip_header):
+    """
+    Cut a file into at most n_shards byte ranges that start and end on line boundaries
+
+    Returns:
+        Tuple (header, ranges): the header line (b"" when skip_header is
+        False) and a list of (start, end) byte offsets
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.readline() if skip_header else b""
+        data_start = f.tell()
+        boundaries = [data_start]
+        for shard in range(1, n_shards):
+            f.seek(max(data_start, size * shard // n_shards))
+            f.readline()
+            position = min(f.tell(), size)
+            if position > boundaries[-1]:
+                boundaries.append(position)
+        if size > boundaries[-1]:
+            boundaries.append(size)
+    return header, list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _iter_lines(path, start, end, keep_blank=False):
+    """Yield the non-blank lines of a byte range, or every line with keep_blank"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        position = start
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            if keep_blank or line.strip():
+                yield line
+
+
+def _count_rows(path, start, end):
+    return sum(1 for _ in _iter_lines(path, start, end))
+
+
+def _parse_lines(lines, file_format, header, columns):
+    if file_format == "csv":
+        return pd.read_csv(io.BytesIO(header + b"".join(lines)), dtype=str, keep_default_na=False)
+    return json_chunk(lines, columns)[0]
+
+
+def _score_shard(task):
+    """Worker: score one byte range and write its rows to part files"""
+    (path, file_format, header, columns, start, end, row_offset,
+     output_part, rejects_part, output_format, chunksize, reference_date) = task
+
+    position = row_offset
+    with ChunkWriter(output_part, output_format) as output, \
+            ChunkWriter(rejects_part, output_format) as rejects:
+        lines = []
+        for line in _iter_lines(path, start, end):
+            lines.append(line)
+            if len(lines) == chunksize:
+                position += _score_lines(lines, file_format, header, columns, position, output, rejects,
+                                         reference_date)
+                lines = []
+        if lines:
+            position += _score_lines(lines, file_format, header, columns, position, output, rejects,
+                                     reference_date)
+    return output.rows, position - row_offset
+
+
+def _score_lines(lines, file_format, header, columns, position, output, rejects, reference_date):
+    chunk = _parse_lines(lines, file_format, header, columns)
+    scored, rejected = score_chunk(chunk, first_row=position + 1, reference_date=reference_date)
+    output.write(scored)
+    rejects.write(rejected)
+    return len(chunk)
+
+
+def _concatenate(parts, destination, file_format):
+    """Append part files to destination in order, keeping only the first CSV header"""
+    with open(destination, "wb") as out:
+        header_written = False
+        for part in parts:
+            with open(part, "rb") as f:
+                if file_format == "csv":
+                    header = f.readline()
+                    if not header:
+                        continue
+                    if not header_written:
+                        out.write(header)
+                        header_written = True
+                shutil.copyfileobj(f, out, 1 << 20)
+
+
+def score_file_parallel(input_path, output_path, rejects_path, workers=None, chunksize=DEFAULT_CHUNKSIZE,
+                        input_format=None, output_format=None, reference_date=None):
+    """
+    Score a CSV/JSONL file on a pool of worker processes
+
+    Args:
+        input_path: file with one record per line
+        output_path: scored records, in input order
+        rejects_path: records failing validation, in input order
+        workers: number of processes, defaults to the number of CPUs
+        chunksize: records held in memory at a time by each worker
+        reference_date: date the ages are computed at (default: the day
+            the run starts, shared by every worker)
+
+    Returns:
+        Dictionary with the number of rows read, scored and rejected, the
+        elapsed time in seconds and the number of workers and shards
+    """
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    reference_date = reference_date or date.today()
+    input_format = detect_format(input_path, input_format)
+    output_format = detect_format(output_path, output_format)
+
+    header, ranges = split_file(input_path, workers * SHARDS_PER_WORKER, input_format == "csv")
+    # JSONL records are read in the columns of the first chunk, as score_file reads them
+    columns = None
+    if input_format == "jsonl":
+        first_chunk = next(read_chunks(input_path, chunksize, input_format), None)
+        columns = list(first_chunk.columns) if first_chunk is not None else None
+    parts_dir = tempfile.mkdtemp(prefix="ccr-shards-", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            counts = list(pool.map(_count_rows, [input_path] * len(ranges),
+                                   [start for start, _ in ranges], [end for _, end in ranges]))
+            offsets = np.concatenate([[0], np.cumsum(counts)]).astype(int)
+            n_rows = int(offsets[-1])
+
+            tasks = []
+            for shard, ((start, end), row_offset) in enumerate(zip(ranges, offsets)):
+                tasks.append((
+                    input_path, input_format, header, columns, start, end, int(row_offset),
+                    os.path.join(parts_dir, f"output-{shard:05d}"),
+                    os.path.join(parts_dir, f"rejects-{shard:05d}"),
+                    output_format, chunksize, reference_date,
+                ))
+            scored = sum(rows for rows, _ in pool.map(_score_shard, tasks))
+
+        _concatenate([task[7] for task in tasks], output_path, output_format)
+        _concatenate([task[8] for task in tasks], rejects_path, output_format)
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    return {
+        "read": n_rows,
+        "scored": scored,
+        "rejected": n_rows - scored,
+        "seconds": time.perf_counter() - started,
+        "workers": workers,
+        "shards": len(ranges),
+    }
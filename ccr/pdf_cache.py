@@ -0,0 +1,95 @@
+"""Content-addressed cache of rendered PDF reports.
+
+A report only depends on the values printed in it, so the rendered bytes
+are stored under a hash of those values. Many people land in the same
+category with the same age and BMI, so most downloads are served from the
+cache without building the document again. Entries are evicted in least
+recently used order once the configured byte budget is exceeded.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def report_key(*values):
+    """Return a stable hash of the values a report is rendered from"""
+    payload = json.dumps(values, ensure_ascii=False, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PdfCache:
+    """Thread-safe LRU cache of PDF bytes with a total size budget"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached bytes for key, or None"""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def peek(self, key):
+        """Return the cached bytes for key, or None, without counting a hit or miss"""
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key, data):
+        """
+        Store bytes under key and evict the least recently used entries over budget
+
+        Returns:
+            False when data alone is larger than the budget and was not stored
+        """
+        if len(data) > self.max_bytes:
+            return False
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+        return True
+
+    def get_or_render(self, key, render):
+        """
+        Return the cached bytes for key, calling render() to build them on a miss
+
+        Rendering happens outside the lock, so a slow document never blocks
+        hits for other keys; two sessions missing the same key at once may
+        both render it.
+        """
+        data = self.get(key)
+        if data is None:
+            data = bytes(render())
+            self.put(key, data)
+        return data
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
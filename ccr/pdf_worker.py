@@ -0,0 +1,105 @@
+"""Background rendering of PDF reports on a bounded thread pool.
+
+Reports are only rendered when a user asks for one, on a small pool shared
+by every session, so reruns of the page never wait for FPDF. The number of
+reports queued or rendering is capped: when the pool is saturated a request
+is refused with BUSY instead of piling up behind everyone else's.
+
+A report that fails, or is too large for the cache, stays FAILED until it
+is requested again, so the page shows the error instead of rendering it
+over and over.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_LIMIT = 32
+
+# Report states returned by ReportRenderer
+IDLE = "idle"            # not requested yet
+PREPARING = "preparing"  # queued or rendering
+READY = "ready"          # bytes available
+BUSY = "busy"            # refused, the queue is full
+FAILED = "failed"        # rendering raised an exception
+
+
+class ReportRenderer:
+    """Render reports into a PdfCache on a bounded background pool"""
+
+    def __init__(self, cache, max_workers=DEFAULT_WORKERS, max_pending=DEFAULT_QUEUE_LIMIT):
+        self.cache = cache
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pdf-render")
+        # Futures of the reports queued or rendering; _render removes them
+        self._jobs = {}
+        # Exceptions of the latest failed reports, at most max_pending
+        self._failures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def pending(self):
+        """Number of reports queued or rendering"""
+        with self._lock:
+            return len(self._jobs)
+
+    def status(self, key):
+        """
+        Return the state of the report stored under key
+
+        Returns:
+            Tuple (state, data): data is the PDF bytes when state is READY,
+            the exception when it is FAILED and None otherwise
+        """
+        with self._lock:
+            if key in self._jobs:
+                return PREPARING, None
+            error = self._failures.get(key)
+        if error is not None:
+            return FAILED, error
+        data = self.cache.peek(key)
+        if data is not None:
+            return READY, data
+        return IDLE, None
+
+    def request(self, key, render):
+        """
+        Ask for the report stored under key, rendering it in the background if needed
+
+        Args:
+            key: cache key, see ccr.pdf_cache.report_key
+            render: callable returning the PDF bytes
+
+        Returns:
+            Tuple (state, data) as in status(); BUSY when the queue is full
+        """
+        data = self.cache.get(key)
+        if data is not None:
+            return READY, data
+
+        with self._lock:
+            if key in self._jobs:
+                return PREPARING, None
+            if len(self._jobs) >= self.max_pending:
+                return BUSY, None
+            self._failures.pop(key, None)
+            self._jobs[key] = self._executor.submit(self._render, key, render)
+        return PREPARING, None
+
+    def _render(self, key, render):
+        try:
+            data = bytes(render())
+            if not self.cache.put(key, data):
+                raise ValueError(f"El PDF ({len(data):,} bytes) supera el tamaño máximo de la caché de informes")
+            return len(data)
+        except Exception as error:
+            with self._lock:
+                self._failures[key] = error
+                while len(self._failures) > self.max_pending:
+                    self._failures.popitem(last=False)
+            raise
+        finally:
+            with self._lock:
+                self._jobs.pop(key, None)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
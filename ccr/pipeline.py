@@ -0,0 +1,239 @@
+"""Streaming batch scoring of CSV/JSONL registry extracts.
+
+Input files are read in fixed-size chunks, each chunk is validated with the
+same rules as the form, scored with the vectorized engine and appended to
+the output before the next chunk is read, so memory use does not depend on
+the size of the input.
+
+Input columns:
+    dob: date of birth, YYYY-MM-DD or DD/MM/YYYY
+    height_cm, weight_kg: as typed in the form
+    one column per flag in FLAG_COLUMNS and SYMPTOM_COLUMNS (yes/no, 1/0,
+    true/false, si/no; missing columns count as "no")
+Any other column (e.g. a patient id) is copied to the output unchanged.
+
+The columns are fixed by the first chunk. JSONL records may list their
+keys in any order, or leave some out, so every later chunk is read in the
+columns of the first one, missing where a key is missing, and written in
+the columns of the first chunk written.
+"""
+import json
+import time
+from datetime import date
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ccr.batch import evaluate_risk_frame, flag_masks, results_from_codes, table_codes
+from ccr.dedup import Deduplicator, input_keys
+from ccr.guidelines import active
+from ccr.validation import FLAG_COLUMNS, error_message, parse_flag_column, validate_columns
+
+DEFAULT_CHUNKSIZE = 50_000
+JSONL_SUFFIXES = {".jsonl", ".ndjson", ".json"}
+
+
+def detect_format(path, file_format=None):
+    """Return 'csv' or 'jsonl' from an explicit format or the file suffix"""
+    if file_format:
+        return file_format
+    return "jsonl" if Path(path).suffix.lower() in JSONL_SUFFIXES else "csv"
+
+
+def read_chunks(path, chunksize=DEFAULT_CHUNKSIZE, file_format=None):
+    """
+    Yield the records of a CSV or JSONL file as DataFrames of at most chunksize rows
+
+    CSV values are read as strings so that every chunk is parsed the same
+    way regardless of what pandas would infer from its contents. JSONL
+    chunks have the columns of the first chunk, in its order.
+    """
+    if detect_format(path, file_format) == "csv":
+        yield from pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunksize)
+        return
+
+    columns = None
+    with open(path, encoding="utf-8") as f:
+        while True:
+            lines = [line for line in islice(f, chunksize) if line.strip()]
+            if not lines:
+                break
+            chunk, columns = json_chunk(lines, columns)
+            yield chunk
+
+
+def json_chunk(lines, columns=None):
+    """
+    Parse JSONL lines into a DataFrame with the given columns
+
+    Returns:
+        Tuple (chunk, columns): columns are those of this chunk when None
+        were given, to pass along with the next chunk
+    """
+    chunk = pd.DataFrame([json.loads(line) for line in lines])
+    if columns is None:
+        return chunk, list(chunk.columns)
+    if list(chunk.columns) != columns:
+        chunk = chunk.reindex(columns=columns)
+    return chunk, columns
+
+
+def _column(chunk, name):
+    return chunk[name] if name in chunk else [None] * len(chunk)
+
+
+def score_chunk(chunk, first_row=1, reference_date=None, dedup=None):
+    """
+    Validate and score one chunk of raw input records
+
+    Args:
+        chunk: DataFrame of raw records as returned by read_chunks
+        first_row: 1-based position of the first record in the input file
+        reference_date: date the ages are computed at (default: today);
+            pass the same date for every chunk of a run
+        dedup: optional ccr.dedup.Deduplicator of the run; identical inputs
+            are then scored once, and repeats of a person get a 'repeat'
+            column or are left out
+
+    Returns:
+        Tuple (scored, rejected): scored has the input columns, the parsed
+        flags, age, bmi and the result code columns; rejected has the input
+        columns plus 'row' and 'error'
+    """
+    ages, bmis, error_codes = validate_columns(
+        _column(chunk, "dob"), _column(chunk, "height_cm"), _column(chunk, "weight_kg"), reference_date)
+    errors = [""] * len(chunk)
+    for position in error_codes.nonzero()[0]:
+        errors[position] = error_message(error_codes[position])
+
+    flags = {}
+    for column in FLAG_COLUMNS:
+        if column not in chunk:
+            continue
+        flags[column], invalid = parse_flag_column(chunk[column])
+        for position in invalid.nonzero()[0]:
+            errors[position] += f"- Valor inválido en '{column}'\n"
+
+    valid = np.array([not error for error in errors], dtype=bool)
+    keep = valid.copy()
+    if dedup is not None:
+        repeat = dedup.repeated(chunk[valid])
+        if dedup.mode == "drop":
+            keep[valid] = ~repeat
+
+    scored = chunk[keep].reset_index(drop=True)
+    for column, values in flags.items():
+        scored[column] = values[keep]
+    scored["age"] = pd.array(ages[keep], dtype="Int64")
+    scored["bmi"] = pd.array(bmis[keep], dtype="Float64")
+    if dedup is None:
+        results = evaluate_risk_frame(scored, use_table=True)
+    else:
+        guidelines = active()
+        codes = dedup.codes(input_keys(ages[keep], bmis[keep], flag_masks(scored)),
+                            lambda positions: table_codes(scored.iloc[positions], guidelines), guidelines)
+        results = results_from_codes(codes, scored.index, guidelines)
+        if dedup.mode == "flag":
+            scored["repeat"] = repeat
+    for column in results.columns:
+        scored[column] = results[column]
+
+    rejected = chunk[~valid].reset_index(drop=True)
+    rejected.insert(0, "row", first_row + np.flatnonzero(~valid))
+    rejected["error"] = [error.strip() for error in errors if error]
+    return scored, rejected
+
+
+class ChunkWriter:
+    """
+    Append DataFrames to a CSV or JSONL file as they are produced
+
+    Args:
+        path: file to create
+        file_format: 'csv' or 'jsonl' (default: from the suffix)
+        columns: columns written, in order (default: those of the first
+            frame written, empty or not); frames are reindexed to them
+    """
+
+    def __init__(self, path, file_format=None, columns=None):
+        self.path = path
+        self.format = detect_format(path, file_format)
+        self.columns = list(columns) if columns is not None else None
+        self.rows = 0
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._header = True
+
+    def write(self, frame):
+        if self.columns is None:
+            self.columns = list(frame.columns)
+        if frame.empty:
+            return
+        if list(frame.columns) != self.columns:
+            frame = frame.reindex(columns=self.columns)
+        if self.format == "csv":
+            frame.to_csv(self._file, header=self._header, index=False)
+        else:
+            frame.to_json(self._file, orient="records", lines=True, force_ascii=False)
+        self._header = False
+        self.rows += len(frame)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def score_file(input_path, output_path, rejects_path, chunksize=DEFAULT_CHUNKSIZE,
+               input_format=None, output_format=None, reference_date=None, dedup=None):
+    """
+    Score a CSV/JSONL file chunk by chunk
+
+    Args:
+        input_path: file with one record per row/line
+        output_path: scored records are appended here
+        rejects_path: records failing validation are appended here
+        chunksize: number of records held in memory at a time
+        reference_date: date the ages are computed at (default: the day
+            the run starts, for the whole run)
+        dedup: None, or a mode of ccr.dedup.Deduplicator ("flag" or "drop")
+            to score identical inputs once and flag or drop repeats of a
+            person; a Deduplicator can be passed instead, and is left open
+
+    Returns:
+        Dictionary with the number of rows read, scored and rejected and the
+        elapsed time in seconds; with dedup, also 'dropped' repeats and
+        'dedup', the summary of the Deduplicator
+    """
+    started = time.perf_counter()
+    reference_date = reference_date or date.today()
+    rows_read = 0
+    deduplicator = Deduplicator(dedup) if isinstance(dedup, str) else dedup
+    try:
+        with ChunkWriter(output_path, output_format) as output, \
+                ChunkWriter(rejects_path, output_format) as rejects:
+            for chunk in read_chunks(input_path, chunksize, input_format):
+                scored, rejected = score_chunk(chunk, first_row=rows_read + 1, reference_date=reference_date,
+                                               dedup=deduplicator)
+                output.write(scored)
+                rejects.write(rejected)
+                rows_read += len(chunk)
+    finally:
+        if isinstance(dedup, str):
+            deduplicator.close()
+
+    summary = {
+        "read": rows_read,
+        "scored": output.rows,
+        "rejected": rejects.rows,
+        "seconds": time.perf_counter() - started,
+    }
+    if deduplicator is not None:
+        summary["dropped"] = rows_read - output.rows - rejects.rows
+        summary["dedup"] = deduplicator.summary()
+    return summary
@@ -0,0 +1,231 @@
+"""Recall scheduler: screening reminders from the assessment store.
+
+Every stored assessment with a screening interval stands for a series of
+screenings, one every interval years over the timeline shown on the
+results page (the same series the "Cronograma de tamizaje recomendado"
+table lists). Only the next screening of each assessment is materialised,
+in the store's indexed ``next_due`` column. Popping a reminder moves that
+column on to the following screening, or clears it when the timeline ends.
+
+The scheduler keeps the earliest pending events in a binary heap of packed
+integers ``(due day << ID_BITS) | assessment id``, about EVENT_BYTES each.
+The heap holds every pending event before a horizon. Later events stay in
+the store only. When the heap runs dry it is refilled with an index range
+scan starting at the horizon. When new events push it over the memory
+budget, it keeps its earliest half and pulls the horizon in. Either way the
+registry is never rescanned. Tens of millions of future events cost only
+the rows already stored, and a fixed amount of memory.
+
+New assessments are picked up incrementally by row id. A patient's newer
+assessment supersedes the reminders of their older ones.
+"""
+import heapq
+from datetime import date
+
+from ccr.store import SELECT_COLUMNS, add_years, assessment_record, open_database
+
+ID_BITS = 40
+ID_MASK = (1 << ID_BITS) - 1
+# Horizon once every pending event is in memory
+NO_HORIZON = 1 << 62
+# A packed event is a 2-digit int plus its slot in the heap list
+EVENT_BYTES = 40
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+# Rows read or updated per statement
+CHUNK = 10_000
+
+RECALL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recall_state (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+def event_key(due, assessment_id):
+    """Pack a due date and an assessment id into one heap key"""
+    return (due.toordinal() << ID_BITS) | assessment_id
+
+
+def following_due(record, after):
+    """
+    Return the first screening of an assessment's timeline after a date
+
+    Args:
+        record: stored assessment as returned by assessment_record
+        after: date; screenings missed up to it are not reminded again
+
+    Returns:
+        The date, or None when the timeline ends before it
+    """
+    interval = record["interval_years"]
+    if not interval:
+        return None
+    assessed_on = date.fromisoformat(record["assessed_at"][:10])
+    _, timeline_years = record["result"].screening_schedule()
+    # Count from the assessment date so 29 February does not drift
+    screening = max((after.year - assessed_on.year) // interval, 0)
+    following = add_years(assessed_on, screening * interval)
+    while following <= after:
+        screening += 1
+        following = add_years(assessed_on, screening * interval)
+    if following > add_years(assessed_on, timeline_years):
+        return None
+    return following
+
+
+class RecallScheduler:
+    """
+    Due queue of screening reminders over an assessment store
+
+    Args:
+        path: database of ccr.store.AssessmentStore
+        memory_budget: bytes the in-memory heap may use
+    """
+
+    def __init__(self, path, memory_budget=DEFAULT_MEMORY_BUDGET):
+        self.max_events = max(memory_budget // EVENT_BYTES, 2)
+        self._connection = open_database(path)
+        self._connection.executescript(RECALL_SCHEMA)
+        row = self._connection.execute("SELECT value FROM recall_state WHERE name = 'last_id'").fetchone()
+        self.last_id = row[0] if row else 0
+        self._heap = []
+        # The heap holds every pending event with a key below the horizon
+        self._horizon = 0
+        self._exhausted = False
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        """Events held in memory"""
+        return len(self._heap)
+
+    def _refill(self):
+        """Load the events from the horizon on, up to the budget, from the next_due index"""
+        room = self.max_events - len(self._heap)
+        due = date.fromordinal(max(self._horizon >> ID_BITS, 1))
+        rows = self._connection.execute(
+            "SELECT next_due, id FROM assessments WHERE next_due IS NOT NULL AND (next_due, id) >= (?, ?)"
+            " ORDER BY next_due, id LIMIT ?",
+            (due.isoformat(), self._horizon & ID_MASK, room)).fetchall()
+        keys = [event_key(date.fromisoformat(next_due), assessment_id) for next_due, assessment_id in rows]
+        for key in keys:
+            heapq.heappush(self._heap, key)
+        if len(rows) < room:
+            self._exhausted = True
+            self._horizon = NO_HORIZON
+        else:
+            self._horizon = keys[-1] + 1
+
+    def _push(self, key):
+        """Add an event if it falls before the horizon, keeping within the budget"""
+        if key >= self._horizon:
+            return
+        heapq.heappush(self._heap, key)
+        if len(self._heap) > self.max_events:
+            # Keep the earliest half; the rest is still in the store
+            self._heap = heapq.nsmallest(self.max_events // 2, self._heap)
+            self._horizon = self._heap[-1] + 1
+            self._exhausted = False
+
+    def refresh(self):
+        """
+        Take in the assessments stored since the last refresh
+
+        Returns:
+            Number of new assessments seen
+        """
+        seen = 0
+        while True:
+            rows = self._connection.execute(
+                "SELECT id, patient_id, next_due FROM assessments WHERE id > ? ORDER BY id LIMIT ?",
+                (self.last_id, CHUNK)).fetchall()
+            if not rows:
+                break
+            with self._connection:
+                # A newer assessment replaces the reminders of the patient's older ones
+                self._connection.executemany(
+                    "UPDATE assessments SET next_due = NULL"
+                    " WHERE patient_id = ? AND id < ? AND next_due IS NOT NULL",
+                    [(patient_id, assessment_id) for assessment_id, patient_id, _ in rows if patient_id])
+                self.last_id = rows[-1][0]
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO recall_state (name, value) VALUES ('last_id', ?)", (self.last_id,))
+            for assessment_id, _, next_due in rows:
+                if next_due:
+                    self._push(event_key(date.fromisoformat(next_due), assessment_id))
+            seen += len(rows)
+        return seen
+
+    def peek(self):
+        """Return the date of the earliest pending reminder, or None"""
+        if not self._heap and not self._exhausted:
+            self._refill()
+        return date.fromordinal(self._heap[0] >> ID_BITS) if self._heap else None
+
+    def pop_due(self, until, limit=None):
+        """
+        Remove and return the reminders due on or before until
+
+        Each returned assessment has its next screening moved on in the
+        store to the first one after until, so it is reminded once even
+        when several screenings were missed.
+
+        Args:
+            until: date
+            limit: most reminders returned; the rest stay queued
+
+        Returns:
+            List of stored assessments as returned by
+            ccr.store.assessment_record, with 'due' set to the screening
+            reminded and 'next_due' to the following one
+        """
+        last_key = (until.toordinal() << ID_BITS) | ID_MASK
+        reminders = []
+        while limit is None or len(reminders) < limit:
+            wanted = CHUNK if limit is None else min(CHUNK, limit - len(reminders))
+            keys = []
+            while len(keys) < wanted:
+                if not self._heap:
+                    if self._exhausted:
+                        break
+                    self._refill()
+                    if not self._heap:
+                        break
+                if self._heap[0] > last_key:
+                    break
+                keys.append(heapq.heappop(self._heap))
+            if not keys:
+                break
+            reminders.extend(self._advance(keys, until))
+        return reminders
+
+    def _advance(self, keys, until):
+        """Move popped events on to their first screening after until and return their reminders"""
+        due_by_id = {key & ID_MASK: date.fromordinal(key >> ID_BITS) for key in keys}
+        placeholders = ", ".join("?" * len(due_by_id))
+        records = [assessment_record(row) for row in self._connection.execute(
+            f"SELECT {SELECT_COLUMNS} FROM assessments WHERE id IN ({placeholders})", list(due_by_id))]
+
+        reminders = []
+        updates = []
+        for record in records:
+            due = due_by_id[record["id"]]
+            # Skip events superseded or already moved on since they were queued
+            if record["next_due"] != due.isoformat():
+                continue
+            following = following_due(record, until)
+            record["due"] = due
+            record["next_due"] = following.isoformat() if following else None
+            updates.append((record["next_due"], record["id"]))
+            if following is not None:
+                self._push(event_key(following, record["id"]))
+            reminders.append(record)
+        with self._connection:
+            self._connection.executemany("UPDATE assessments SET next_due = ? WHERE id = ?", updates)
+        reminders.sort(key=lambda record: (record["due"], record["id"]))
+        return reminders
@@ -0,0 +1,307 @@
+"""Bulk re-ingestion of the JSON files saved from the results page.
+
+"Guardar datos (JSON)" saves one ``datos_evaluacion_ccr_YYYYMMDD.json`` per
+assessment:
+    fecha_evaluacion, edad, imc, categoria_riesgo, recomendacion, resumen:
+        what the page showed
+    version_guias, codigo_riesgo, respuestas, sintomas: the guidelines
+        version, the category code, the history answers (one true/false
+        per flag of ccr.decision_table.FLAG_BITS) and the symptom flag;
+        files saved before these fields existed lack them
+
+The importer reads a directory of these files or a JSONL file with one
+export per line. It scores every export again with the guidelines in
+force, at the age it had when assessed, and flags the people whose risk
+category changed. Exports without answers get the smallest answers that
+lead to their saved category (CANONICAL_PROFILES) and no symptoms; their
+rows are marked flags_inferred.
+
+Input is cut into tasks of a few thousand exports (files, or byte ranges
+of the JSONL file) that run on a pool of processes. Only a couple of tasks
+per worker are in flight, and results are appended to the output in input
+order, so memory use does not grow with the number of exports. Each task
+decodes its exports with json.loads and checks and scores them a column
+at a time with the vectorized engine.
+"""
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from ccr.batch import evaluate_risk_frame
+from ccr.codes import CANONICAL_PROFILES, RISK_CATEGORY_CODES, RISK_CODE
+from ccr.decision_table import FLAG_BITS, pack_flags
+from ccr.guidelines import active
+from ccr.parallel import _iter_lines, split_file
+from ccr.pipeline import ChunkWriter
+
+# Exports per task
+DEFAULT_BATCH_SIZE = 5000
+# Rough size of one export on a JSONL line, to cut the file into tasks
+EXPORT_BYTES = 600
+EXPORT_SUFFIX = ".json"
+MAX_AGE = 120
+
+HISTORY_KEYS = tuple(key for _, key in FLAG_BITS[:-1])
+CANONICAL_FLAGS = {name: pack_flags(personal, family, polyp, False)
+                   for name, (_, personal, family, polyp) in CANONICAL_PROFILES.items()}
+
+INGEST_ERRORS = (
+    ("invalid_json", "- JSON inválido\n"),
+    ("invalid_date", "- Fecha de evaluación inválida\n"),
+    ("invalid_age", "- Edad inválida\n"),
+    ("invalid_bmi", "- IMC inválido\n"),
+    ("unknown_category", "- Categoría de riesgo desconocida\n"),
+    ("invalid_answers", "- Respuestas inválidas\n"),
+)
+INGEST_ERROR_BIT = {name: 1 << bit for bit, (name, _) in enumerate(INGEST_ERRORS)}
+
+
+def error_message(errors):
+    """Return the "- ..." lines of one bitmask of INGEST_ERROR_BIT"""
+    return "".join(message for bit, (_, message) in enumerate(INGEST_ERRORS) if errors >> bit & 1)
+
+
+def _decode(text):
+    try:
+        record = json.loads(text)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def _answers(record):
+    """Return (history bitmask, symptoms) of an export, None when it has no answers, or -1 when invalid"""
+    answers = record.get("respuestas")
+    if answers is None:
+        return None
+    symptoms = record.get("sintomas", False)
+    if not isinstance(answers, dict) or not isinstance(symptoms, bool) or not set(answers) <= set(HISTORY_KEYS):
+        return -1
+    flags = 0
+    for bit, key in enumerate(HISTORY_KEYS):
+        value = answers.get(key, False)
+        if not isinstance(value, bool):
+            return -1
+        flags |= value << bit
+    return flags, symptoms
+
+
+def _previous_category(record, guidelines):
+    """Return the risk code saved in an export, or -1 when it is not recognised"""
+    code = record.get("codigo_riesgo")
+    if code in RISK_CODE:
+        return RISK_CODE[code]
+    text = record.get("categoria_riesgo")
+    if text == "":
+        return RISK_CODE["none"]
+    return guidelines.risk_code_by_text.get(text, -1) if isinstance(text, str) else -1
+
+
+def ingest_records(items, reference_date=None):
+    """
+    Check and score exports
+
+    Args:
+        items: sequence of (source, row, text): where the export comes
+            from, its line in that source (1 for a single file) and its JSON
+            text
+        reference_date: evaluation dates after this day are invalid
+            (default: today)
+
+    Returns:
+        Tuple (scored, rejected) of DataFrames. scored has source, row,
+        fecha_evaluacion, age, bmi, previous_category, the result code
+        columns of ccr.batch.evaluate_risk_frame, category_changed,
+        flags_inferred and guidelines; rejected has source, row and error
+    """
+    reference_date = reference_date or date.today()
+    guidelines = active()
+    decoded = [_decode(text) for _, _, text in items]
+    errors = np.array([0 if record is not None else INGEST_ERROR_BIT["invalid_json"] for record in decoded],
+                      dtype=np.int64)
+    records = [record or {} for record in decoded]
+
+    dates = pd.to_datetime(pd.Series([record.get("fecha_evaluacion") for record in records], dtype=object)
+                           .astype(str).str[:10], format="%Y-%m-%d", errors="coerce")
+    errors |= np.where(dates.isna().to_numpy() | (dates > pd.Timestamp(reference_date)).to_numpy(),
+                       INGEST_ERROR_BIT["invalid_date"], 0)
+
+    raw_age = [record.get("edad") for record in records]
+    age = np.array([value if type(value) in (int, float) else np.nan for value in raw_age], dtype=float)
+    with np.errstate(invalid="ignore"):
+        bad_age = ~((age >= 0) & (age <= MAX_AGE) & (age == np.round(age)))
+    errors |= np.where(bad_age, INGEST_ERROR_BIT["invalid_age"], 0)
+
+    raw_bmi = [record.get("imc") for record in records]
+    bmi = np.array([value if type(value) in (int, float) else np.nan for value in raw_bmi], dtype=float)
+    with np.errstate(invalid="ignore"):
+        bad_bmi = np.array([value is not None for value in raw_bmi]) & ~(bmi > 0)
+    errors |= np.where(bad_bmi, INGEST_ERROR_BIT["invalid_bmi"], 0)
+
+    previous = np.array([_previous_category(record, guidelines) for record in records], dtype=np.int64)
+    errors |= np.where(previous < 0, INGEST_ERROR_BIT["unknown_category"], 0)
+
+    answers = [_answers(record) for record in records]
+    inferred = np.array([answer is None for answer in answers], dtype=bool)
+    errors |= np.where([answer == -1 for answer in answers], INGEST_ERROR_BIT["invalid_answers"], 0)
+    flags = np.array([answer[0] if isinstance(answer, tuple) else 0 for answer in answers], dtype=np.int64)
+    symptoms = np.array([isinstance(answer, tuple) and answer[1] for answer in answers], dtype=bool)
+    canonical = np.array([CANONICAL_FLAGS[name] for name in RISK_CATEGORY_CODES], dtype=np.int64)
+    flags = np.where(inferred & (previous >= 0), canonical[np.clip(previous, 0, None)], flags)
+
+    valid = errors == 0
+    sources = np.array([source for source, _, _ in items], dtype=object)
+    rows = np.array([row for _, row, _ in items], dtype=np.int64)
+
+    frame = pd.DataFrame({key: (flags[valid] >> bit & 1).astype(bool) for bit, key in enumerate(HISTORY_KEYS)})
+    frame["symptoms"] = symptoms[valid]
+    frame["age"] = age[valid]
+    frame["bmi"] = bmi[valid]
+    results = evaluate_risk_frame(frame, use_table=True, guidelines=guidelines)
+
+    scored = pd.DataFrame({
+        "source": sources[valid],
+        "row": rows[valid],
+        "fecha_evaluacion": dates[valid].dt.strftime("%Y-%m-%d").to_numpy(),
+        "age": pd.array(age[valid], dtype="Int64"),
+        "bmi": pd.array(bmi[valid], dtype="Float64"),
+        "previous_category": pd.Categorical.from_codes(previous[valid], categories=RISK_CATEGORY_CODES),
+    })
+    for column in results.columns:
+        scored[column] = results[column].to_numpy()
+    scored["category_changed"] = results["risk_category"].cat.codes.to_numpy() != previous[valid]
+    scored["flags_inferred"] = inferred[valid]
+    scored["guidelines"] = guidelines.version
+
+    rejected = pd.DataFrame({
+        "source": sources[~valid],
+        "row": rows[~valid],
+        "error": [error_message(error).strip() for error in errors[~valid]],
+    })
+    return scored, rejected
+
+
+def _read_task(task):
+    """
+    Return the (source, row, text) items of a task and the number of lines it spans
+
+    Rows of a JSONL file are line numbers counted from the start of the
+    task, blank lines included, so they point at the line in the file.
+    """
+    kind, *arguments = task
+    if kind == "files":
+        items = []
+        for path in arguments[0]:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    items.append((path, 1, f.read()))
+            except (OSError, UnicodeDecodeError):
+                items.append((path, 1, ""))
+        return items, len(items)
+    path, start, end = arguments
+    lines = 0
+    items = []
+    for lines, line in enumerate(_iter_lines(path, start, end, keep_blank=True), start=1):
+        if line.strip():
+            items.append((path, lines, line))
+    return items, lines
+
+
+def _ingest_task(task, reference_date):
+    items, lines = _read_task(task)
+    scored, rejected = ingest_records(items, reference_date)
+    return len(items), lines, scored, rejected
+
+
+def export_tasks(source, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Cut a directory of export files or a JSONL file into tasks
+
+    Files are listed one directory at a time, in name order, so a tree of
+    any size is never listed whole.
+    """
+    if os.path.isdir(source):
+        batch = []
+        for directory, subdirectories, names in os.walk(source):
+            subdirectories.sort()
+            for name in sorted(names):
+                if name.lower().endswith(EXPORT_SUFFIX):
+                    batch.append(os.path.join(directory, name))
+                    if len(batch) == batch_size:
+                        yield ("files", batch)
+                        batch = []
+        if batch:
+            yield ("files", batch)
+        return
+    n_shards = max(1, os.path.getsize(source) // (EXPORT_BYTES * batch_size))
+    _, ranges = split_file(source, n_shards, False)
+    for start, end in ranges:
+        yield ("lines", source, start, end)
+
+
+def reingest(source, output_path, rejects_path, workers=None, batch_size=DEFAULT_BATCH_SIZE,
+             output_format=None, reference_date=None):
+    """
+    Score a collection of exports again and write them in the batch result format
+
+    Args:
+        source: directory of export files (searched recursively) or a JSONL
+            file with one export per line
+        output_path: scored exports (.csv or .jsonl)
+        rejects_path: exports that could not be read or checked
+        workers: number of processes; None uses every CPU
+        batch_size: exports per task
+        reference_date: evaluation dates after this day are rejected
+            (default: today)
+
+    Returns:
+        Dictionary with the number of exports read, scored, rejected, with a
+        changed category and with inferred answers, and the elapsed seconds
+    """
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    reference_date = reference_date or date.today()
+    # Lines of a JSONL file are numbered from the start of the file, not of the task
+    number_lines = not os.path.isdir(source)
+    totals = {"read": 0, "lines": 0, "changed": 0, "inferred": 0}
+
+    def write(output, rejects, read, lines, scored, rejected):
+        if number_lines:
+            scored["row"] += totals["lines"]
+            rejected["row"] += totals["lines"]
+        output.write(scored)
+        rejects.write(rejected)
+        totals["read"] += read
+        totals["lines"] += lines
+        totals["changed"] += int(scored["category_changed"].sum())
+        totals["inferred"] += int(scored["flags_inferred"].sum())
+
+    with ChunkWriter(output_path, output_format) as output, ChunkWriter(rejects_path, output_format) as rejects:
+        if workers == 1:
+            for task in export_tasks(source, batch_size):
+                write(output, rejects, *_ingest_task(task, reference_date))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = deque()
+                for task in export_tasks(source, batch_size):
+                    pending.append(pool.submit(_ingest_task, task, reference_date))
+                    # Keep a couple of tasks per worker in flight, write the oldest first
+                    while len(pending) > 2 * workers:
+                        write(output, rejects, *pending.popleft().result())
+                for future in pending:
+                    write(output, rejects, *future.result())
+
+    return {
+        "read": totals["read"],
+        "scored": output.rows,
+        "rejected": rejects.rows,
+        "changed": totals["changed"],
+        "inferred": totals["inferred"],
+        "seconds": time.perf_counter() - started,
+    }
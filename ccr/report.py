@@ -0,0 +1,228 @@
+"""PDF report with the assessment results and educational content.
+
+Almost all the time spent building a report goes into FPDF's line breaking
+of the long paragraphs, and those paragraphs come from a small, fixed set:
+the methods information, the disclaimer and one recommendation, summary
+and lifestyle text per category. ReportTemplate sanitizes and breaks these
+into lines once, at startup, and each report only writes the prepared
+lines plus the per-patient fields (age, BMI, category, symptom banner and
+date). Prepared paragraphs are set ragged-right: justified text would make
+FPDF measure every line again on each report.
+
+fpdf is imported on first use, so importing this module costs nothing for
+processes that never build a report.
+"""
+import threading
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+
+from ccr.guidelines import active
+
+FONT = "helvetica"
+
+METHODS_INFO = "* Test de sangre oculta inmunoquimico (TSOMFi): Detecta sangre en las heces que podria indicar polipos o cancer. Es simple y no invasivo.\n* Colonoscopia: Examen visual directo del colon completo, permite la deteccion y extirpacion de polipos durante el procedimiento.\n* Rectosigmoidoscopia: Examina el tercio inferior del colon y es menos invasiva que la colonoscopia completa."
+
+DISCLAIMER = "Esta evaluacion es informativa y esta basada en la guia \"Recomendaciones para el tamizaje de CCR en poblacion de riesgo promedio en Argentina\" del Instituto Nacional del Cancer. No reemplaza la consulta medica. Comparta estos resultados con su profesional de salud para una evaluacion personalizada."
+
+# Paragraphs kept broken into lines; a guidelines version has a few dozen
+MAX_PREPARED_PARAGRAPHS = 1024
+
+SYMPTOMS_BANNER = (
+    "IMPORTANTE: Los sintomas que has reportado requieren atencion medica",
+    "inmediata, independientemente de tu categoria de riesgo.",
+)
+
+# Font (style, size) and line height of each kind of paragraph
+BODY = ("", 11, 7)
+METHODS = ("", 11, 6)
+FOOTNOTE = ("I", 9, 5)
+
+
+def sanitize_text(text):
+    """Replace Unicode characters the core PDF fonts cannot encode"""
+    if text is None:
+        return ""
+    return (text.replace('–', '-')   # en dash
+               .replace('—', '-')    # em dash
+               .replace('“', '"')    # left double quote
+               .replace('”', '"')    # right double quote
+               .replace('’', "'")    # right single quote
+               .replace('‘', "'")    # left single quote
+               .replace('•', '*')    # bullet
+               .replace('…', '...')  # ellipsis
+               .replace('≥', '>='))  # greater-than or equal
+
+
+@lru_cache(maxsize=256)
+def clean_recommendation(text):
+    """Remove markdown and emoji markers from a recommendation for the PDF"""
+    return sanitize_text(text).replace('**', '').replace('✅', '->').replace(
+        '🟡', '->').replace('🔍', '->').replace('📹', '->').replace('🔬', '->').replace('🧭', '->')
+
+
+@lru_cache(maxsize=256)
+def clean_summary(text):
+    """Remove the emoji marker from a summary for the PDF"""
+    return sanitize_text(text.replace('📝', ''))
+
+
+def _risk_color(categoria_riesgo):
+    if "Alto" in categoria_riesgo:
+        return 255, 0, 0  # Red for high risk
+    if "Incrementado" in categoria_riesgo or "Intermedio" in categoria_riesgo:
+        return 0, 0, 255  # Blue for intermediate risk
+    return 0, 128, 0  # Green for average risk
+
+
+class ReportTemplate:
+    """Report layout with the long paragraphs broken into lines ahead of time"""
+
+    def __init__(self):
+        from fpdf import FPDF
+
+        self._scratch = FPDF()
+        self._scratch.add_page()
+        self._lock = threading.Lock()
+        # Bounded, so the texts of many reloaded guidelines do not pile up
+        self.lines = lru_cache(maxsize=MAX_PREPARED_PARAGRAPHS)(self._break_lines)
+
+        self.lines(METHODS_INFO, METHODS)
+        self.lines(DISCLAIMER, FOOTNOTE)
+        # Texts of guidelines loaded later are broken on first use
+        guidelines = active()
+        for text in guidelines.recommendation_text:
+            self.lines(clean_recommendation(text), BODY)
+        for text in guidelines.summary_text:
+            self.lines(clean_summary(text), BODY)
+        for texts in guidelines.lifestyle_text:
+            for text in texts:
+                self.lines(sanitize_text(text), BODY)
+
+    def _break_lines(self, text, paragraph):
+        """
+        Return the lines a multi_cell of the full page width would print for text
+
+        Called through self.lines, which keeps the results of the last
+        MAX_PREPARED_PARAGRAPHS (text, paragraph style) pairs, so texts
+        outside the prepared set are broken on first use.
+        """
+        from fpdf.enums import MethodReturnValue
+
+        style, size, height = paragraph
+        with self._lock:
+            self._scratch.set_font(FONT, style=style, size=size)
+            return tuple(self._scratch.multi_cell(
+                0, height, text, dry_run=True, output=MethodReturnValue.LINES))
+
+    def _paragraph(self, pdf, text, paragraph):
+        from fpdf.enums import XPos, YPos
+
+        style, size, height = paragraph
+        pdf.set_font(FONT, style=style, size=size)
+        for line in self.lines(text, paragraph):
+            pdf.cell(0, height, line, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    def render(self, edad, imc, resumen, categoria_riesgo, recomendacion, lifestyle_advice=None,
+               symptoms_flag=False, fecha=None):
+        """
+        Build a report and return the PDF bytes
+
+        Takes the same arguments as generate_pdf, plus the evaluation date
+        (today when omitted).
+        """
+        from fpdf import FPDF
+        from fpdf.enums import XPos, YPos
+
+        fecha = fecha or datetime.today()
+        pdf = FPDF()
+        pdf.add_page()
+
+        # Header
+        pdf.set_font(FONT, style="B", size=16)
+        pdf.cell(200, 10, "Evaluacion de Riesgo para Cancer Colorrectal",
+                 new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
+        pdf.set_font(FONT, style="I", size=10)
+        pdf.cell(200, 6, "Basado en Guias del Instituto Nacional del Cancer Argentina",
+                 new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
+        pdf.ln(10)
+
+        # Basic information
+        pdf.set_font(FONT, style="B", size=12)
+        pdf.cell(200, 8, "Informacion Personal", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.set_font(FONT, size=11)
+        pdf.cell(200, 8, f"Edad: {edad} anos", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.cell(200, 8, f"IMC: {imc} kg/m2", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+        # Risk category with formatting
+        pdf.ln(5)
+        pdf.set_font(FONT, style="B", size=12)
+        pdf.cell(200, 8, "Categoria de Riesgo", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.set_font(FONT, style="B", size=11)
+        pdf.set_text_color(*_risk_color(categoria_riesgo))
+        pdf.cell(200, 8, sanitize_text(categoria_riesgo), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.set_text_color(0, 0, 0)
+
+        # Symptom warning if applicable
+        if symptoms_flag:
+            pdf.ln(3)
+            pdf.set_font(FONT, style="B", size=11)
+            pdf.set_text_color(255, 0, 0)
+            for line in SYMPTOMS_BANNER:
+                pdf.cell(200, 8, line, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            pdf.set_text_color(0, 0, 0)
+
+        # Recommendations
+        pdf.ln(5)
+        pdf.set_font(FONT, style="B", size=12)
+        pdf.cell(200, 8, "Recomendaciones de Tamizaje", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        self._paragraph(pdf, clean_recommendation(recomendacion), BODY)
+
+        # Summary
+        pdf.ln(3)
+        pdf.set_font(FONT, style="B", size=12)
+        pdf.cell(200, 8, "Resumen", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        self._paragraph(pdf, clean_summary(resumen), BODY)
+
+        # Lifestyle advice if provided
+        if lifestyle_advice:
+            pdf.ln(5)
+            pdf.set_font(FONT, style="B", size=12)
+            pdf.cell(200, 8, "Recomendaciones para Reducir el Riesgo", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            self._paragraph(pdf, sanitize_text(lifestyle_advice), BODY)
+
+        # Information about screening methods
+        pdf.ln(5)
+        pdf.set_font(FONT, style="B", size=12)
+        pdf.cell(200, 8, "Informacion sobre Metodos de Tamizaje", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        self._paragraph(pdf, METHODS_INFO, METHODS)
+
+        # Disclaimer and footer
+        pdf.ln(5)
+        self._paragraph(pdf, DISCLAIMER, FOOTNOTE)
+        pdf.ln(3)
+        pdf.set_font(FONT, style="B", size=9)
+        pdf.cell(200, 5, f"Fecha de evaluacion: {fecha.strftime('%d/%m/%Y')}",
+                 new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+        return bytes(pdf.output())
+
+
+_template = None
+_template_lock = threading.Lock()
+
+
+def get_template():
+    """Return the process-wide ReportTemplate, preparing it on first use"""
+    global _template
+    if _template is None:
+        with _template_lock:
+            if _template is None:
+                _template = ReportTemplate()
+    return _template
+
+
+def generate_pdf(edad, imc, resumen, categoria_riesgo, recomendacion, lifestyle_advice=None, symptoms_flag=False):
+    """Generate PDF with assessment results and educational content"""
+    return BytesIO(get_template().render(
+        edad, imc, resumen, categoria_riesgo, recomendacion, lifestyle_advice, symptoms_flag))
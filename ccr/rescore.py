@@ -0,0 +1,255 @@
+"""Incremental re-scoring of the assessment store after a guideline change.
+
+A stored assessment keeps its inputs (history flags, age, BMI) next to its
+result, so a new version of the guidelines can be applied to the registry.
+Most edits touch one rule, which only a few people can reach. The rest keep
+their result whatever the edit says, and are not read at all.
+
+The rules are matched in order, so a person can only reach a rule if no
+earlier rule matches them. ``rule_dependencies`` indexes each rule to the
+flags it reads and whether it reads the age. Everyone who matches an
+earlier rule that ignores age is settled before the first rule that
+changed. Only the combinations of the flags read by those earlier rules
+need checking. The other flags are free. The remaining combinations are
+compared between both versions on every age band, which gives the exact
+(flags, age range) cells whose category changes. Each cell is one range
+scan of the (flags, age) index. A change of a BMI threshold, of the age of
+the lifestyle advice or of a screening schedule selects the rows in
+between or of that category in the same way.
+
+Selected rows are evaluated again with the new guidelines. Rows whose code,
+category, interval or next due date changes are updated. A screening the
+recall scheduler has already reminded is not brought back. Rows whose
+reminders ended, or were superseded by a newer assessment of the same
+patient, stay without a due date. A running RecallScheduler should be
+recreated afterwards, as ``python -m ccr recall`` does on each run.
+"""
+import math
+import time
+from datetime import date, timedelta
+
+from ccr.codes import RISK_CODE
+from ccr.decision_table import SYMPTOMS_BIT
+from ccr.recall import following_due
+from ccr.results import AssessmentResult
+from ccr.store import next_due_date, open_database
+
+# Rows read or updated per statement
+CHUNK = 10_000
+# History flags only; stored flags also carry SYMPTOMS_BIT
+HISTORY_MASK = SYMPTOMS_BIT - 1
+
+_SELECT = "SELECT id, assessed_at, age, bmi, flags, code, risk, interval_years, next_due FROM assessments"
+_UPDATE = "UPDATE assessments SET code = ?, risk = ?, interval_years = ?, next_due = ? WHERE id = ?"
+
+
+def rule_dependencies(guidelines):
+    """
+    Index each rule of the hierarchy to the inputs it reads
+
+    Returns:
+        Tuple with one (risk, flags_read, reads_age) per rule, in matching
+        order; flags_read is a bitmask of history flags
+    """
+    return tuple((risk, all_mask | any_mask, ages is not None)
+                 for risk, all_mask, any_mask, ages in guidelines.rules)
+
+
+def _submasks(mask):
+    """Every bitmask made of some of the bits of mask"""
+    submask = mask
+    while True:
+        yield submask
+        if not submask:
+            return
+        submask = (submask - 1) & mask
+
+
+def reachable_flags(guidelines, position):
+    """
+    Return the history flag combinations that can reach a rule
+
+    A combination is settled before the rule when an earlier rule that
+    reads no age matches it. Only the flags read by the earlier rules are
+    enumerated; the others are free.
+
+    Args:
+        guidelines: Guidelines
+        position: index of the rule in guidelines.rules
+    """
+    earlier = guidelines.rules[:position]
+    read = 0
+    for _, flags_read, _ in rule_dependencies(guidelines)[:position]:
+        read |= flags_read
+    settling = [(all_mask, any_mask) for _, all_mask, any_mask, ages in earlier if ages is None]
+    patterns = [flags for flags in _submasks(read)
+                if not any(flags & all_mask == all_mask and (not any_mask or flags & any_mask)
+                           for all_mask, any_mask in settling)]
+    free = HISTORY_MASK & ~read
+    return sorted(pattern | other for pattern in patterns for other in _submasks(free))
+
+
+def _age_bands(old, new):
+    """(first, last) ages of the bands cut at the breaks of both guidelines; last is None for no bound"""
+    breaks = sorted(set(old.age_breaks) | set(new.age_breaks))
+    starts = [0] + breaks
+    return list(zip(starts, [age - 1 for age in breaks] + [None]))
+
+
+def changed_cells(old, new):
+    """
+    Find the history flags and ages whose risk category differs between two guidelines
+
+    Returns:
+        {(first_age, last_age): [history flags]}; last_age is None for no
+        upper bound
+    """
+    first_changed = next((position for position, (before, after) in enumerate(zip(old.rules, new.rules))
+                          if before != after), len(old.rules))
+    if first_changed == len(old.rules):
+        return {}
+    bands = _age_bands(old, new)
+    cells = {}
+    for flags in reachable_flags(old, first_changed):
+        ranges = []
+        for first, last in bands:
+            if old.match(flags, first) == new.match(flags, first):
+                continue
+            if ranges and ranges[-1][1] == first - 1:
+                ranges[-1] = (ranges[-1][0], last)
+            else:
+                ranges.append((first, last))
+        for age_range in ranges:
+            cells.setdefault(age_range, []).append(flags)
+    return cells
+
+
+def _between(column, first, last):
+    """SQL condition and parameters for first <= column <= last; last None for no bound"""
+    if last is None:
+        return f"{column} >= ?", [first]
+    return f"{column} BETWEEN ? AND ?", [first, last]
+
+
+def selections(old, new):
+    """
+    Build the SQL conditions of the rows a change of guidelines can affect
+
+    Returns:
+        List of (name, where clause, parameters)
+    """
+    found = []
+    for (first, last), history_flags in changed_cells(old, new).items():
+        flags = [value for history in history_flags for value in (history, history | SYMPTOMS_BIT)]
+        for start in range(0, len(flags), 500):
+            part = flags[start:start + 500]
+            age, parameters = _between("age", first, last)
+            found.append(("category", f"flags IN ({', '.join('?' * len(part))}) AND {age}", part + parameters))
+
+    for before, after in zip(old.bmi_thresholds, new.bmi_thresholds):
+        if before != after:
+            found.append(("bmi", "bmi >= ? AND bmi < ?", [min(before, after), max(before, after)]))
+    if old.lifestyle_age != new.lifestyle_age:
+        found.append(("lifestyle", "age >= ? AND age < ?",
+                      [min(old.lifestyle_age, new.lifestyle_age), max(old.lifestyle_age, new.lifestyle_age)]))
+
+    for risk, (before, after) in enumerate(zip(old.screening_schedule, new.screening_schedule)):
+        if before != after:
+            found.append(("schedule", "risk = ?", [risk]))
+    found.extend(_average_risk_selections(old, new))
+    return found
+
+
+def _average_risk_selections(old, new):
+    """Conditions of the rows without a fixed schedule that a change of the average-risk screening reaches"""
+    (old_ages, *old_timeline), (new_ages, *new_timeline) = old.average_risk_screening, new.average_risk_screening
+    if (old_ages, old_timeline) == (new_ages, new_timeline):
+        return []
+    risks = [risk for risk, schedule in enumerate(old.screening_schedule) if schedule is None]
+    in_risks = f"risk IN ({', '.join('?' * len(risks))})"
+    if old_timeline != new_timeline or not all(map(math.isfinite, old_ages + new_ages)):
+        return [("average risk", in_risks, risks)]
+    # Only people whose age is inside one window and outside the other
+    found = []
+    (old_first, old_last), (new_first, new_last) = old_ages, new_ages
+    if old_first != new_first:
+        found.append(("average risk", f"{in_risks} AND age BETWEEN ? AND ?",
+                      risks + [min(old_first, new_first), max(old_first, new_first) - 1]))
+        # People under the first age are due when they reach it
+        found.append(("average risk", "risk = ?", [RISK_CODE["under_50"]]))
+    if old_last != new_last:
+        found.append(("average risk", f"{in_risks} AND age BETWEEN ? AND ?",
+                      risks + [min(old_last, new_last) + 1, max(old_last, new_last)]))
+    return found
+
+
+def _rescored_row(row, old, new):
+    """Return the UPDATE parameters of a stored row, or None when the new guidelines change nothing"""
+    assessment_id, assessed_at, age, bmi, flags, code, risk, interval, next_due = row
+    assessed_on = date.fromisoformat(assessed_at[:10])
+    result = AssessmentResult(age, bmi, flags, new.lookup(flags, age, bmi), new)
+    due, new_interval = next_due_date(result, assessed_on)
+
+    previous_due, _ = next_due_date(AssessmentResult(age, bmi, flags, code, old), assessed_on)
+    if next_due is None and previous_due is not None:
+        # Reminders ended or superseded by a newer assessment
+        due = None
+    elif interval and new_interval and next_due and previous_due and next_due > previous_due.isoformat():
+        # Screenings before the stored date were already reminded
+        record = {"interval_years": new_interval, "assessed_at": assessed_at, "result": result}
+        due = following_due(record, date.fromisoformat(next_due) - timedelta(days=1))
+    due = due.isoformat() if due else None
+
+    if (result.code, result.risk, new_interval, due) == (code, risk, interval, next_due):
+        return None
+    return result.code, result.risk, new_interval, due, assessment_id
+
+
+def rescore_store(path, old, new, full=False):
+    """
+    Apply new guidelines to the assessments stored with the old ones
+
+    Args:
+        path: database of ccr.store.AssessmentStore
+        old: Guidelines the stored results were computed with
+        new: Guidelines to apply
+        full: evaluate every row instead of the affected ones only
+
+    Returns:
+        Dictionary with 'rows' in the store, 'touched' rows evaluated,
+        'skipped' rows not read, 'updated' rows changed, 'selections' SQL
+        conditions used and 'seconds'
+    """
+    started = time.perf_counter()
+    connection = open_database(path)
+    try:
+        rows = connection.execute("SELECT COUNT(*) FROM assessments").fetchone()[0]
+        if full:
+            conditions = [("full", "1", [])]
+        else:
+            conditions = selections(old, new)
+        ids = set()
+        for _, where, parameters in conditions:
+            ids.update(assessment_id for assessment_id, in connection.execute(
+                f"SELECT id FROM assessments WHERE {where}", parameters))
+        ids = sorted(ids)
+
+        updated = 0
+        for start in range(0, len(ids), CHUNK):
+            chunk = ids[start:start + CHUNK]
+            stored = connection.execute(
+                f"{_SELECT} WHERE id IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+            updates = [update for update in (_rescored_row(row, old, new) for row in stored) if update]
+            with connection:
+                connection.executemany(_UPDATE, updates)
+            updated += len(updates)
+    finally:
+        connection.close()
+    return {
+        "rows": rows,
+        "touched": len(ids),
+        "skipped": rows - len(ids),
+        "updated": updated,
+        "selections": len(conditions),
+        "seconds": time.perf_counter() - started,
+    }
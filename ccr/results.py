@@ -0,0 +1,132 @@
+"""Compact per-session assessment result.
+
+A result is kept as a few integers instead of the seven texts returned by
+``evaluate_risk``: the packed decision-table code, the history flags and the
+age and BMI. The texts are looked up in the tables of the guidelines that
+produced the result (see ``ccr.guidelines``) when the page is drawn, so a
+session holds no copy of them and keeps showing the same texts after the
+guidelines are reloaded.
+"""
+from ccr.codes import BMI_NOTE_CODES, RECOMMENDATION_CODES, RISK_CATEGORY_CODES, RISK_LEVEL_CODES
+from ccr.decision_table import pack_flags, unpack_result
+from ccr.guidelines import active
+
+# Names of the texts returned by texts() and evaluate_risk, in order
+TEXT_FIELDS = ("risk_category", "recommendation", "summary", "lifestyle_advice",
+               "symptoms_detail", "bmi_note", "symptoms_warning")
+
+
+class AssessmentResult:
+    """Result of one assessment, rendered to text on demand"""
+
+    __slots__ = ("age", "bmi", "flags", "code", "guidelines")
+
+    def __init__(self, age, bmi, flags, code, guidelines=None):
+        self.age = age
+        self.bmi = bmi
+        self.flags = flags
+        self.code = code
+        # Stored results carry no guidelines and render with the active ones
+        self.guidelines = guidelines or active()
+
+    @classmethod
+    def evaluate(cls, age, bmi, personal_history, family_history, polyp_history, symptoms):
+        """Evaluate an assessment; takes the same arguments as evaluate_risk"""
+        guidelines = active()
+        flags = pack_flags(personal_history, family_history, polyp_history, symptoms)
+        return cls(age, bmi, flags, guidelines.lookup(flags, age, bmi), guidelines)
+
+    def codes(self):
+        """Return (risk, recommendation, bmi_note, symptoms_warning, age_60_plus)"""
+        return unpack_result(self.code, self.guidelines)
+
+    @property
+    def risk(self):
+        return self.codes()[0]
+
+    @property
+    def category_code(self):
+        """Name of the risk category in RISK_CATEGORY_CODES"""
+        return RISK_CATEGORY_CODES[self.risk]
+
+    @property
+    def risk_level(self):
+        """Index into RISK_LEVEL_CODES"""
+        return self.guidelines.risk_level[self.risk]
+
+    @property
+    def any_symptoms(self):
+        return self.codes()[3]
+
+    @property
+    def risk_category(self):
+        return self.guidelines.category_text[self.risk]
+
+    @property
+    def recommendation(self):
+        return self.guidelines.recommendation_text[self.codes()[1]]
+
+    @property
+    def summary(self):
+        return self.guidelines.summary_text[self.risk]
+
+    @property
+    def lifestyle_advice(self):
+        _, _, bmi_note, _, age_60_plus = self.codes()
+        return self.guidelines.lifestyle_text[bmi_note][age_60_plus]
+
+    @property
+    def symptoms_detail(self):
+        return self.guidelines.symptoms_detail_text if self.any_symptoms else ""
+
+    @property
+    def bmi_note(self):
+        return self.guidelines.bmi_note_template[self.codes()[2]].format(bmi=self.bmi)
+
+    @property
+    def symptoms_warning(self):
+        return self.guidelines.symptoms_warning_text if self.any_symptoms else ""
+
+    def texts(self):
+        """Return the same 7-tuple of texts as evaluate_risk"""
+        return (self.risk_category, self.recommendation, self.summary, self.lifestyle_advice,
+                self.symptoms_detail, self.bmi_note, self.symptoms_warning)
+
+    def to_dict(self, texts=True):
+        """
+        Return the result as JSON-serialisable data
+
+        Args:
+            texts: include the texts shown on the results page; without them
+                only the inputs and the code names are returned
+
+        Returns:
+            Dictionary with 'age', 'bmi', 'guidelines' (their version),
+            'codes' and optionally 'texts'
+        """
+        risk, recommendation, bmi_note, symptoms_warning, _ = self.codes()
+        result = {
+            "age": self.age,
+            "bmi": self.bmi,
+            "guidelines": self.guidelines.version,
+            "codes": {
+                "risk_category": self.category_code,
+                "recommendation": RECOMMENDATION_CODES[recommendation],
+                "bmi_note": BMI_NOTE_CODES[bmi_note],
+                "symptoms_warning": bool(symptoms_warning),
+                "risk_level": RISK_LEVEL_CODES[self.guidelines.risk_level[risk]],
+            },
+        }
+        if texts:
+            result["texts"] = dict(zip(TEXT_FIELDS, self.texts()))
+        return result
+
+    def screening_schedule(self):
+        """
+        Return the screening timeline shown on the results page
+
+        Returns:
+            Tuple (interval, timeline_years) in years; interval is None when
+            no routine screening applies at this age
+        """
+        return self.guidelines.schedule(self.risk, self.age)
@@ -0,0 +1,118 @@
+"""Screening guideline rules for colorectal cancer risk assessment.
+
+Scalar evaluation of the Argentine guideline hierarchy used by the
+Streamlit form. The hierarchy and its texts are read from the active
+guidelines file (see ``ccr.guidelines``), one rule at a time; batch engines
+elsewhere in the package are checked against these functions.
+"""
+from datetime import datetime
+
+from ccr.codes import RISK_CODE
+from ccr.decision_table import pack_flags
+from ccr.guidelines import active
+
+
+def calculate_age(dob):
+    """Calculate age from date of birth"""
+    today = datetime.today()
+    return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+
+def calculate_bmi(height_cm, weight_kg):
+    """Calculate Body Mass Index"""
+    if height_cm <= 0 or weight_kg <= 0:
+        return None
+    height_m = height_cm / 100
+    return round(weight_kg / (height_m ** 2), 1)
+
+def evaluate_serrated_polyps(polyp_history):
+    """
+    Specialized evaluation for serrated polyps, by the serrated polyp rule of the active guidelines
+
+    Args:
+        polyp_history: Dictionary containing polyp details
+
+    Returns:
+        Dictionary with risk assessment for serrated polyps
+    """
+    guidelines = active()
+    risk = RISK_CODE["serrated_polyp"]
+    flags = pack_flags({}, {}, polyp_history, False)
+    serrated_risk = {
+        "is_high_risk": False,
+        "reason": "",
+        "recommendation": ""
+    }
+
+    for rule_risk, all_mask, any_mask, _ in guidelines.rules:
+        if rule_risk == risk and flags & all_mask == all_mask and (not any_mask or flags & any_mask):
+            serrated_risk["is_high_risk"] = True
+            serrated_risk["reason"] = guidelines.category_text[risk]
+            serrated_risk["recommendation"] = guidelines.recommendation_text[guidelines.recommendation_for_category[risk]]
+            break
+
+    return serrated_risk
+
+def get_lifestyle_recommendations(bmi, age):
+    """
+    Provide lifestyle recommendations based on BMI and age
+
+    Args:
+        bmi: Body Mass Index
+        age: Age in years
+
+    Returns:
+        String with lifestyle recommendations
+    """
+    guidelines = active()
+    return guidelines.lifestyle_text[guidelines.bmi_band(bmi)][age >= guidelines.lifestyle_age]
+
+def get_symptoms_detail():
+    """
+    Return detailed information about warning symptoms
+
+    Returns:
+        String with symptoms details
+    """
+    return active().symptoms_detail_text
+
+def evaluate_risk(age, bmi, personal_history, family_history, polyp_history, symptoms):
+    """
+    Evaluate colorectal cancer risk according to Argentine guidelines with enhanced criteria
+
+    Args:
+        age: Age in years
+        bmi: Body Mass Index
+        personal_history: Dictionary of personal medical history
+        family_history: Dictionary of family history
+        polyp_history: Dictionary of polyp history
+        symptoms: Boolean indicating presence of symptoms
+
+    Returns:
+        Tuple containing:
+        - risk_category: string with risk category
+        - recommendation: string with screening recommendation
+        - summary: string with summary of assessment
+        - lifestyle_advice: string with lifestyle recommendations
+        - symptoms_detail: string with detailed symptom information if applicable
+        - bmi_note: string with BMI-related information
+        - symptoms_warning: string with warning about symptoms
+    """
+    guidelines = active()
+
+    # 1. The first rule of the hierarchy whose conditions hold gives the category
+    flags = pack_flags(personal_history, family_history, polyp_history, False)
+    risk = guidelines.match(flags, age)
+    risk_category = guidelines.category_text[risk]
+    recommendation = guidelines.recommendation_text[guidelines.recommendation_for_category[risk]]
+    summary = guidelines.summary_text[risk]
+
+    # 2. Lifestyle advice and BMI note
+    bmi_band = guidelines.bmi_band(bmi)
+    lifestyle_advice = guidelines.lifestyle_text[bmi_band][age >= guidelines.lifestyle_age]
+    bmi_note = guidelines.bmi_note_template[bmi_band].format(bmi=bmi)
+
+    # 3. Symptoms
+    symptoms_detail = guidelines.symptoms_detail_text if symptoms else ""
+    symptoms_warning = guidelines.symptoms_warning_text if symptoms else ""
+
+    return risk_category, recommendation, summary, lifestyle_advice, symptoms_detail, bmi_note, symptoms_warning
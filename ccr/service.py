@@ -0,0 +1,299 @@
+"""Local HTTP JSON scoring service.
+
+The server runs on a single asyncio event loop. Each connection is a
+coroutine rather than a thread, so thousands of concurrent keep-alive
+connections fit in one process. Scoring a patient is a decision-table
+lookup (see ``ccr.results``), which is cheap enough to run directly on the
+loop. Large batches yield to the loop between slices so that one big
+request does not stall the other clients.
+
+Endpoints:
+    GET  /health        {"status": "ok", "guidelines": version in force}
+    GET  /metrics       stage latencies and counters, see ccr.metrics
+    POST /score         one patient -> one result
+    POST /score/batch   {"patients": [...]} or a bare list -> {"results": [...]}
+
+A patient has the same inputs as the form:
+    dob: date of birth, YYYY-MM-DD or DD/MM/YYYY
+    height_cm, weight_kg: numbers or texts as typed in the form
+    one yes/no field per name in FLAG_COLUMNS (missing fields count as "no")
+
+Every result has the age, BMI and result codes, plus the texts shown on the
+results page. Add ``?texts=0`` to the URL to receive the codes only. An
+invalid patient gets an "error" field with the same messages as the form.
+In a batch this does not fail the other patients.
+
+Set CCR_GUIDELINES_RELOAD to a number of seconds to reload the guidelines
+file whenever it changes (see ccr.guidelines).
+
+Usage:
+    python -m ccr serve --host 127.0.0.1 --port 8080
+"""
+import asyncio
+import json
+import traceback
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from ccr import metrics
+from ccr import guidelines
+from ccr.results import AssessmentResult
+from ccr.validation import (
+    FAMILY_HISTORY_COLUMNS,
+    FLAG_COLUMNS,
+    PERSONAL_HISTORY_COLUMNS,
+    POLYP_HISTORY_COLUMNS,
+    SYMPTOM_COLUMNS,
+    parse_flag,
+    validate_record,
+)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+
+MAX_BODY_BYTES = 16 * 1024 * 1024
+MAX_BATCH_PATIENTS = 10_000
+# Patients scored between two yields to the event loop
+BATCH_SLICE = 500
+# Pending connections the kernel queues while the loop is busy
+BACKLOG = 4096
+
+
+class RequestError(Exception):
+    """A request that cannot be served, with the HTTP status to answer"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def score_patient(patient, texts=True):
+    """
+    Validate and score one patient record
+
+    Args:
+        patient: dictionary with the inputs described in the module docstring
+        texts: include the result texts
+
+    Returns:
+        Result dictionary as returned by AssessmentResult.to_dict, or
+        {"error": ...} with one "- ..." line per problem
+    """
+    if not isinstance(patient, dict):
+        return {"error": "- Paciente inválido: se esperaba un objeto JSON"}
+
+    with metrics.stage("validation"):
+        age, bmi, error_message = validate_record(
+            patient.get("dob"), patient.get("height_cm"), patient.get("weight_kg"))
+        flags = {}
+        for column in FLAG_COLUMNS:
+            value = parse_flag(patient.get(column, False))
+            if value is None:
+                error_message += f"- Valor inválido en '{column}'\n"
+            flags[column] = value
+    if error_message:
+        return {"error": error_message.strip()}
+
+    # An explicit 'symptoms' answer wins over the individual symptoms, as in the batch engine
+    if "symptoms" in patient:
+        symptoms = flags["symptoms"]
+    else:
+        symptoms = any(flags[column] for column in SYMPTOM_COLUMNS)
+    with metrics.stage("evaluate_risk") as timer:
+        result = AssessmentResult.evaluate(
+            age,
+            bmi,
+            {column: flags[column] for column in PERSONAL_HISTORY_COLUMNS},
+            {column: flags[column] for column in FAMILY_HISTORY_COLUMNS},
+            {column: flags[column] for column in POLYP_HISTORY_COLUMNS},
+            symptoms,
+        )
+        timer.category = result.category_code
+    return result.to_dict(texts)
+
+
+def _decode_json(body):
+    try:
+        return json.loads(body)
+    except (UnicodeDecodeError, ValueError) as error:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"JSON inválido: {error}") from None
+
+
+async def handle_health(body, texts):
+    return HTTPStatus.OK, {"status": "ok", "guidelines": guidelines.active().version}
+
+
+async def handle_metrics(body, texts):
+    return HTTPStatus.OK, metrics.render()
+
+
+async def handle_score(body, texts):
+    result = score_patient(_decode_json(body), texts)
+    status = HTTPStatus.UNPROCESSABLE_ENTITY if "error" in result else HTTPStatus.OK
+    return status, result
+
+
+async def handle_batch(body, texts):
+    payload = _decode_json(body)
+    patients = payload.get("patients") if isinstance(payload, dict) else payload
+    if not isinstance(patients, list):
+        raise RequestError(HTTPStatus.BAD_REQUEST, "Se esperaba una lista 'patients'")
+    if len(patients) > MAX_BATCH_PATIENTS:
+        raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                           f"Máximo {MAX_BATCH_PATIENTS} pacientes por petición")
+
+    results = []
+    for start in range(0, len(patients), BATCH_SLICE):
+        if start:
+            await asyncio.sleep(0)
+        results.extend(score_patient(patient, texts) for patient in patients[start:start + BATCH_SLICE])
+    return HTTPStatus.OK, {"results": results}
+
+
+ROUTES = {
+    "/health": ("GET", handle_health),
+    "/metrics": ("GET", handle_metrics),
+    "/score": ("POST", handle_score),
+    "/score/batch": ("POST", handle_batch),
+}
+
+
+async def dispatch(method, target, body):
+    """
+    Route one request
+
+    Returns:
+        Tuple (HTTPStatus, payload): a JSON-serialisable payload, or a
+        string for plain-text endpoints
+    """
+    url = urlsplit(target)
+    route = ROUTES.get(url.path.rstrip("/") or "/")
+    if route is None:
+        return HTTPStatus.NOT_FOUND, {"error": f"Ruta desconocida: {url.path}"}
+    allowed, handler = route
+    if method != allowed:
+        return HTTPStatus.METHOD_NOT_ALLOWED, {"error": f"Use {allowed} en {url.path}"}
+    texts = parse_qs(url.query).get("texts", ["1"])[-1].lower() not in ("0", "false", "no")
+    try:
+        return await handler(body, texts)
+    except RequestError as error:
+        return error.status, {"error": str(error)}
+
+
+def encode_response(status, payload, keep_alive):
+    if isinstance(payload, str):
+        body = payload.encode("utf-8")
+        content_type = metrics.CONTENT_TYPE
+    else:
+        with metrics.stage("json"):
+            body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+        content_type = "application/json; charset=utf-8"
+    head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + body
+
+
+async def read_request(reader):
+    """
+    Read one HTTP/1.1 request from a connection
+
+    Returns:
+        Tuple (method, target, body, keep_alive), or None when the client
+        closed the connection between requests
+    """
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as error:
+        if error.partial.strip():
+            raise RequestError(HTTPStatus.BAD_REQUEST, "Petición incompleta") from None
+        return None
+    except asyncio.LimitOverrunError:
+        raise RequestError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Cabeceras demasiado grandes") from None
+
+    request_line, *header_lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+    try:
+        method, target, version = request_line.split(" ")
+    except ValueError:
+        raise RequestError(HTTPStatus.BAD_REQUEST, "Línea de petición inválida") from None
+    headers = {}
+    for line in header_lines:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise RequestError(HTTPStatus.LENGTH_REQUIRED, "Envíe Content-Length")
+    # Only plain digits: int() would also take a sign, spaces or underscores
+    length = headers.get("content-length", "0")
+    if not (length.isascii() and length.isdigit()):
+        raise RequestError(HTTPStatus.BAD_REQUEST, "Content-Length inválido")
+    length = int(length)
+    if length > MAX_BODY_BYTES:
+        raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Cuerpo demasiado grande")
+    body = await reader.readexactly(length) if length else b""
+
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+    return method, target, body, keep_alive
+
+
+async def handle_connection(reader, writer):
+    """Serve the requests of one keep-alive connection in order"""
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+            except RequestError as error:
+                # The rest of the stream cannot be trusted, answer and hang up
+                writer.write(encode_response(error.status, {"error": str(error)}, keep_alive=False))
+                await writer.drain()
+                break
+            if request is None:
+                break
+            method, target, body, keep_alive = request
+            try:
+                status, payload = await dispatch(method, target, body)
+                response = encode_response(status, payload, keep_alive)
+            except Exception:
+                # A bug in one request must not drop the connection unanswered
+                traceback.print_exc()
+                response = encode_response(HTTPStatus.INTERNAL_SERVER_ERROR,
+                                           {"error": "Error interno del servidor"}, keep_alive)
+            writer.write(response)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+    """
+    Serve until cancelled
+
+    Args:
+        host, port: address to listen on; port 0 picks a free port
+        ready: optional callback receiving the (host, port) actually bound
+    """
+    # Compile the guidelines before the first request rather than during it
+    guidelines.active()
+    guidelines.start_watcher_from_env()
+    server = await asyncio.start_server(handle_connection, host, port, backlog=BACKLOG)
+    if ready is not None:
+        ready(server.sockets[0].getsockname()[:2])
+    async with server:
+        await server.serve_forever()
+
+
+def run(host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Run the service in the foreground until interrupted"""
+    def announce(address):
+        print(f"Escuchando en http://{address[0]}:{address[1]}", flush=True)
+
+    try:
+        asyncio.run(serve(host, port, ready=announce))
+    except KeyboardInterrupt:
+        pass
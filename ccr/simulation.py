@@ -0,0 +1,182 @@
+"""Monte Carlo simulation of program uptake and colonoscopy demand.
+
+The deterministic forecast in ``ccr.forecast`` counts every scheduled
+procedure. The simulation samples what actually happens to them. Each risk
+category has its own rates:
+    - adherence: share of people due who take part in a round
+    - FIT positivity: share of returned FIT kits that are positive
+    - RSC referral: share of sigmoidoscopies referred to colonoscopy
+    - follow-up: share of positives who do get the colonoscopy
+Average-risk people are also assigned to a method at random with the
+average-risk mix.
+
+People in the same risk category and age are exchangeable, so every step
+is one binomial (or multinomial) draw per cohort cell rather than one per
+person. A replicate costs the same for 500 or 500 million people. Rounds
+are assumed independent, so someone who skips a round is due again at the
+next one. Several replicates are drawn together in one array.
+
+Replicates are cut into fixed blocks of REPLICATES_PER_TASK. Each block has
+its own child of one SeedSequence, and blocks are spread over a process
+pool. The samples only depend on the seed and the number of replicates,
+never on the number of workers.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ccr.codes import RISK_CATEGORY_CODES
+from ccr.forecast import (
+    DEFAULT_AVERAGE_RISK_MIX,
+    DEFAULT_YEARS,
+    METHODS,
+    age_schedule,
+    age_screened,
+    fixed_schedule,
+    year_index,
+)
+
+# Planning assumptions; override them with the program's own figures
+ADHERENCE = dict.fromkeys(RISK_CATEGORY_CODES, 0.8) | {"average": 0.5, "under_50": 0.5}
+FIT_POSITIVITY = dict.fromkeys(RISK_CATEGORY_CODES, 0.05) | {"advanced_adenoma": 0.08}
+RSC_REFERRAL = dict.fromkeys(RISK_CATEGORY_CODES, 0.1)
+FOLLOWUP = dict.fromkeys(RISK_CATEGORY_CODES, 0.8)
+
+OUTPUTS = (
+    "fit_kits",  # kits sent to everyone due
+    "fit_returned",
+    "fit_positive",
+    "rsc",
+    "screening_colonoscopies",
+    "followup_colonoscopies",
+    "colonoscopies",  # screening plus follow-up
+)
+DEFAULT_REPLICATES = 1000
+REPLICATES_PER_TASK = 50
+DEFAULT_LEVEL = 0.9
+
+
+def category_rates(defaults, overrides=None):
+    """Return an array of one rate per risk category from {category name: rate}"""
+    rates = defaults if not overrides else defaults | overrides
+    unknown = set(rates) - set(RISK_CATEGORY_CODES)
+    if unknown:
+        raise ValueError(f"unknown risk categories: {', '.join(sorted(unknown))}")
+    return np.array([rates[category] for category in RISK_CATEGORY_CODES], dtype=float)
+
+
+def simulate_block(counts, replicates, years, mix, rates, seed):
+    """
+    Draw a block of replicates
+
+    Args:
+        counts: array returned by ccr.forecast.cohort_counts
+        replicates: number of replicates drawn
+        years: number of years simulated
+        mix: {method: share} of the average-risk people
+        rates: tuple of arrays (adherence, fit_positivity, rsc_referral,
+            followup) with one rate per risk category
+        seed: SeedSequence of the block
+
+    Returns:
+        Integer array of shape (replicates, years, len(OUTPUTS))
+    """
+    rng = np.random.default_rng(seed)
+    adherence, fit_positivity, rsc_referral, followup = (rate[:, None] for rate in rates)
+    fit, rsc, colonoscopy = (METHODS.index(method) for method in ("fit", "rsc", "colonoscopy"))
+
+    # Procedures due per replicate, category, year and method
+    due = np.broadcast_to(counts.sum(axis=1)[:, None, None] * fixed_schedule(years),
+                          (replicates, len(RISK_CATEGORY_CODES), years, len(METHODS))).copy()
+    screened = age_screened()
+    methods = list(mix)
+    shares = np.array([mix[method] for method in methods], dtype=float)
+    assigned = rng.multinomial(counts[screened], shares / shares.sum(),
+                               size=(replicates, len(screened), counts.shape[1]))
+    for position, method in enumerate(methods):
+        schedule = age_schedule(method, years)
+        for row, risk in enumerate(screened):
+            due[:, risk, :, METHODS.index(method)] += assigned[:, row, :, position] @ schedule
+
+    done = rng.binomial(due, adherence[:, :, None])
+    positive = rng.binomial(done[..., fit], fit_positivity)
+    referred = rng.binomial(done[..., rsc], rsc_referral)
+    followups = rng.binomial(positive + referred, followup)
+
+    outputs = np.stack([
+        due[..., fit],
+        done[..., fit],
+        positive,
+        done[..., rsc],
+        done[..., colonoscopy],
+        followups,
+        done[..., colonoscopy] + followups,
+    ], axis=-1)
+    return outputs.sum(axis=1)
+
+
+def _simulate_task(task):
+    return simulate_block(*task)
+
+
+def simulate(counts, replicates=DEFAULT_REPLICATES, years=DEFAULT_YEARS, average_risk_mix=None,
+             adherence=None, fit_positivity=None, rsc_referral=None, followup=None, seed=0, workers=1):
+    """
+    Simulate the yearly procedures of a cohort
+
+    Args:
+        counts: array returned by ccr.forecast.cohort_counts
+        replicates: number of simulated programs
+        years: number of years simulated
+        average_risk_mix: {method: share} of the average-risk people
+            (default: FIT only)
+        adherence, fit_positivity, rsc_referral, followup: {risk category
+            name: rate} overriding ADHERENCE, FIT_POSITIVITY, RSC_REFERRAL
+            and FOLLOWUP
+        seed: integer seed; the same seed gives the same samples
+        workers: number of processes; None uses every CPU
+
+    Returns:
+        Integer array of shape (replicates, years, len(OUTPUTS))
+    """
+    mix = DEFAULT_AVERAGE_RISK_MIX if average_risk_mix is None else average_risk_mix
+    rates = (category_rates(ADHERENCE, adherence), category_rates(FIT_POSITIVITY, fit_positivity),
+             category_rates(RSC_REFERRAL, rsc_referral), category_rates(FOLLOWUP, followup))
+    blocks = range(0, replicates, REPLICATES_PER_TASK)
+    seeds = np.random.SeedSequence(seed).spawn(len(blocks))
+    tasks = [(counts, min(REPLICATES_PER_TASK, replicates - first), years, mix, rates, block_seed)
+             for first, block_seed in zip(blocks, seeds)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) == 1:
+        samples = [_simulate_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            samples = list(pool.map(_simulate_task, tasks))
+    return np.concatenate(samples)
+
+
+def confidence_bands(samples, start_year=None, level=DEFAULT_LEVEL):
+    """
+    Summarise simulated samples per year and output
+
+    Args:
+        samples: array returned by simulate
+        start_year: calendar year of the first simulated year (default: this year)
+        level: coverage of the band, e.g. 0.9 for the 5th to 95th percentile
+
+    Returns:
+        DataFrame indexed by (year, output) with columns mean, low, median
+        and high
+    """
+    low, median, high = np.quantile(samples, [(1 - level) / 2, 0.5, (1 + level) / 2], axis=0)
+    index = pd.MultiIndex.from_product([year_index(start_year, samples.shape[1]), OUTPUTS],
+                                       names=["year", "output"])
+    return pd.DataFrame({
+        "mean": samples.mean(axis=0).ravel(),
+        "low": low.ravel(),
+        "median": median.ravel(),
+        "high": high.ravel(),
+    }, index=index)
@@ -0,0 +1,296 @@
+"""Persistent SQLite store of completed assessments.
+
+Every assessment is kept as one compact row: the packed decision-table code
+and flag bitmask from ``ccr.results``, age, BMI, and the date the next
+screening is due. The texts can be rebuilt from these values at any time.
+
+Writes are group-committed. Callers only put rows on a queue, and a single
+writer thread inserts everything that has queued up in one transaction.
+A burst of submissions therefore shares one commit, and one fsync, instead
+of each waiting for its own. The database runs in WAL mode, so readers are
+never blocked by the writer.
+
+Indexes on the next due date, and on the risk category and due date, make
+queries like "who is due this month" an index range scan, even with
+millions of rows. The index on the flags and age lets ``ccr.rescore`` find
+the rows a guideline change reaches without a full scan. Counts by category,
+age, BMI and symptoms come from the cube of ``ccr.cube``, which each commit
+updates with the rows it inserts.
+"""
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from datetime import date, datetime
+
+from ccr.codes import RISK_CATEGORY_CODES, RISK_CODE
+from ccr.cube import add_cells, cell, create_cube, cube_counts
+from ccr.results import AssessmentResult
+
+DEFAULT_PATH = "assessments.db"
+DEFAULT_BATCH_SIZE = 1000
+# FULL fsyncs the WAL on every commit; group commit keeps that affordable
+DEFAULT_SYNCHRONOUS = "FULL"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assessments (
+    id INTEGER PRIMARY KEY,
+    assessed_at TEXT NOT NULL,
+    patient_id TEXT,
+    age INTEGER NOT NULL,
+    bmi REAL,
+    flags INTEGER NOT NULL,
+    code INTEGER NOT NULL,
+    risk INTEGER NOT NULL,
+    interval_years INTEGER,
+    next_due TEXT
+);
+CREATE INDEX IF NOT EXISTS assessments_next_due ON assessments (next_due) WHERE next_due IS NOT NULL;
+CREATE INDEX IF NOT EXISTS assessments_risk_due ON assessments (risk, next_due);
+CREATE INDEX IF NOT EXISTS assessments_patient ON assessments (patient_id) WHERE patient_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS assessments_flags_age ON assessments (flags, age);
+"""
+
+_INSERT = ("INSERT INTO assessments (assessed_at, patient_id, age, bmi, flags, code, risk, interval_years, next_due)"
+           " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+COLUMNS = ("id", "assessed_at", "patient_id", "age", "bmi", "flags", "code", "risk", "interval_years", "next_due")
+SELECT_COLUMNS = ", ".join(COLUMNS)
+
+# Queue item telling the writer thread to stop
+_STOP = object()
+
+
+def add_years(day, years):
+    """Return the same day years later; 29 February becomes 28 February"""
+    try:
+        return day.replace(year=day.year + years)
+    except ValueError:
+        return day.replace(year=day.year + years, day=28)
+
+
+def next_due_date(result, assessed_on):
+    """
+    Return the date the first screening of an assessment is due
+
+    Args:
+        result: AssessmentResult
+        assessed_on: date of the assessment
+
+    Returns:
+        Tuple (next_due, interval_years). Categories with a screening
+        interval are due right away, as on the results timeline. People at
+        average risk under 50 are due when they reach the first age of
+        the average-risk screening. next_due is None
+        when routine screening does not apply.
+    """
+    interval, _ = result.screening_schedule()
+    if interval:
+        return assessed_on, interval
+    if result.risk == RISK_CODE["under_50"]:
+        first_age = result.guidelines.average_risk_screening[0][0]
+        return add_years(assessed_on, max(first_age - result.age, 0)), None
+    return None, None
+
+
+def assessment_row(result, assessed_at=None, patient_id=None):
+    """Return the values inserted for one AssessmentResult"""
+    if assessed_at is None:
+        assessed_at = datetime.now()
+    assessed_on = assessed_at.date() if isinstance(assessed_at, datetime) else assessed_at
+    next_due, interval = next_due_date(result, assessed_on)
+    return (assessed_at.isoformat(sep=" ", timespec="seconds") if isinstance(assessed_at, datetime)
+            else assessed_at.isoformat(),
+            patient_id, result.age, result.bmi, result.flags, result.code, result.risk, interval,
+            next_due.isoformat() if next_due else None)
+
+
+def open_database(path, **kwargs):
+    """Connect to the store at path, creating the file and its schema if missing"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    connection = sqlite3.connect(path, **kwargs)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(SCHEMA)
+    create_cube(connection)
+    return connection
+
+
+def assessment_record(row):
+    """Turn a row of SELECT_COLUMNS into a dictionary with its AssessmentResult"""
+    record = dict(zip(COLUMNS, row))
+    record["risk_category"] = RISK_CATEGORY_CODES[record["risk"]]
+    record["result"] = AssessmentResult(record["age"], record["bmi"], record["flags"], record["code"])
+    return record
+
+
+class AssessmentStore:
+    """
+    SQLite store of assessments with a group-committing writer thread
+
+    Args:
+        path: database file, created if missing
+        batch_size: most rows inserted per transaction
+        synchronous: SQLite synchronous setting of the writer ("FULL" or "NORMAL")
+    """
+
+    def __init__(self, path, batch_size=DEFAULT_BATCH_SIZE, synchronous=DEFAULT_SYNCHRONOUS):
+        self.path = path
+        self.batch_size = batch_size
+        self.commits = 0
+        open_database(path).close()
+
+        self._queue = queue.SimpleQueue()
+        # Read connection of each thread that has read, see _reader
+        self._readers = {}
+        self._readers_lock = threading.Lock()
+        self._writer = threading.Thread(target=self._write_forever, args=(synchronous,),
+                                        name="assessment-store", daemon=True)
+        self._writer.start()
+        # The writer is a daemon so it never holds up exit, but what is queued is still committed
+        atexit.register(self.close)
+
+    def add(self, result, assessed_at=None, patient_id=None):
+        """
+        Queue one assessment for writing
+
+        Returns:
+            Future resolved with the row id once the row is committed
+        """
+        future = Future()
+        self._queue.put(([assessment_row(result, assessed_at, patient_id)], future))
+        return future
+
+    def add_rows(self, rows):
+        """
+        Queue rows built with assessment_row, committed together
+
+        Returns:
+            Future resolved with the number of rows once they are committed
+        """
+        future = Future()
+        self._queue.put((list(rows), future))
+        return future
+
+    def flush(self):
+        """Wait until everything queued so far is committed"""
+        self.add_rows([]).result()
+
+    def close(self):
+        """Commit what is queued, stop the writer and close the read connections"""
+        atexit.unregister(self.close)
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        with self._readers_lock:
+            for connection in self._readers.values():
+                connection.close()
+            self._readers.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write_forever(self, synchronous):
+        connection = sqlite3.connect(self.path, isolation_level=None)
+        connection.execute(f"PRAGMA synchronous={synchronous}")
+        stopping = False
+        while not stopping:
+            # Block for the first item, then take whatever queued up meanwhile
+            batch = [self._queue.get()]
+            rows = len(batch[0][0]) if batch[0] is not _STOP else 0
+            while rows < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+                if item is not _STOP:
+                    rows += len(item[0])
+            if _STOP in batch:
+                stopping = True
+                batch = [item for item in batch if item is not _STOP]
+            if batch:
+                self._commit(connection, batch)
+        connection.close()
+
+    def _commit(self, connection, batch):
+        try:
+            connection.execute("BEGIN")
+            first_ids = []
+            for rows, _ in batch:
+                if len(rows) == 1:
+                    first_ids.append(connection.execute(_INSERT, rows[0]).lastrowid)
+                else:
+                    connection.executemany(_INSERT, rows)
+                    first_ids.append(None)
+            add_cells(connection, (cell(row[2], row[4], row[5], row[6]) for rows, _ in batch for row in rows))
+            connection.execute("COMMIT")
+        except Exception as error:
+            # Any error, e.g. a value SQLite cannot bind, fails this batch only; the writer keeps going
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            for _, future in batch:
+                if not future.cancelled():
+                    future.set_exception(error)
+            return
+        self.commits += 1
+        for (rows, future), row_id in zip(batch, first_ids):
+            if not future.cancelled():
+                future.set_result(row_id if row_id is not None else len(rows))
+
+    def _reader(self):
+        """Read-only connection of the calling thread"""
+        thread = threading.current_thread()
+        with self._readers_lock:
+            connection = self._readers.get(thread)
+            if connection is None:
+                # Script threads come and go; close the connections of those that finished
+                for finished in [reader for reader in self._readers if not reader.is_alive()]:
+                    self._readers.pop(finished).close()
+                # Only the calling thread uses it; close() may close it from another
+                connection = self._readers[thread] = sqlite3.connect(self.path, check_same_thread=False)
+        return connection
+
+    def due_between(self, start, end, risk_category=None, limit=None):
+        """
+        Return the assessments whose next screening falls in [start, end)
+
+        Args:
+            start, end: dates
+            risk_category: optional name from RISK_CATEGORY_CODES
+            limit: most rows returned
+
+        Returns:
+            List of dictionaries with the stored columns, 'risk_category'
+            and the rebuilt 'result', ordered by due date
+        """
+        query = f"SELECT {SELECT_COLUMNS} FROM assessments WHERE next_due >= ? AND next_due < ?"
+        parameters = [start.isoformat(), end.isoformat()]
+        if risk_category is not None:
+            query += " AND risk = ?"
+            parameters.append(RISK_CODE[risk_category])
+        query += " ORDER BY next_due"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        return [assessment_record(row) for row in self._reader().execute(query, parameters)]
+
+    def due_in_month(self, year, month, risk_category=None, limit=None):
+        """Assessments due in the given calendar month, see due_between"""
+        start = date(year, month, 1)
+        end = date(year + month // 12, month % 12 + 1, 1)
+        return self.due_between(start, end, risk_category, limit)
+
+    def count_by_category(self):
+        """Return {risk category name: number of assessments}, read from the cube"""
+        counts = {}
+        for risk_category, _, _, _, count in self.cube():
+            counts[risk_category] = counts.get(risk_category, 0) + count
+        return counts
+
+    def cube(self):
+        """Committed counts by (risk category, age band, BMI note, symptoms), see ccr.cube.cube_counts"""
+        return cube_counts(self._reader())
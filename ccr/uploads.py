@@ -0,0 +1,220 @@
+"""Background scoring of CSV files uploaded in the app.
+
+An upload is copied to a temporary directory as soon as it arrives, so the
+page can drop the uploaded bytes. It is then scored chunk by chunk with
+ccr.pipeline on a small thread pool shared by every session, optionally
+followed by a ZIP of reports. Scored rows and rejects go straight to files
+in the job directory. A session only keeps the job id. The page polls
+status() for the progress and the running category counts, and hands the
+result files to the download buttons only when they are clicked.
+
+Like ccr.pdf_worker, the number of jobs queued or running is capped. When
+the pool is saturated, a new upload is refused with BUSY. Finished jobs and
+their files are removed once they expire, checked whenever a job is
+submitted, looked up or finishes.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from ccr.bulk_reports import write_reports_zip
+from ccr.pipeline import ChunkWriter, read_chunks, score_chunk
+
+DEFAULT_WORKERS = 1
+DEFAULT_QUEUE_LIMIT = 4
+# Small chunks keep the progress bar moving
+DEFAULT_CHUNKSIZE = 10_000
+# Reports are rendered on the upload thread; larger cohorts use the CLI
+DEFAULT_REPORTS_LIMIT = 2000
+# Seconds a finished job and its files are kept
+DEFAULT_TTL = 3600
+COPY_BLOCK = 1 << 20
+
+# Job states returned by UploadScorer.status
+QUEUED = "queued"
+SCORING = "scoring"
+REPORTS = "reports"
+DONE = "done"
+FAILED = "failed"
+BUSY = "busy"          # refused, the queue is full
+UNKNOWN = "unknown"    # expired or discarded
+
+SCORED_FILE = "evaluaciones.csv"
+REJECTS_FILE = "rechazados.csv"
+REPORTS_FILE = "informes.zip"
+
+
+def spool(upload, destination):
+    """
+    Copy an uploaded file to disk in blocks
+
+    Returns:
+        Number of records, counted as lines after the header
+    """
+    lines = 0
+    last = b"\n"
+    with open(destination, "wb") as f:
+        while block := upload.read(COPY_BLOCK):
+            f.write(block)
+            lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        lines += 1
+    return max(lines - 1, 0)
+
+
+class UploadJob:
+    """Progress and result files of one upload"""
+
+    def __init__(self, directory, total, with_reports):
+        self.directory = directory
+        self.total = total
+        self.with_reports = with_reports
+        self.state = QUEUED
+        self.read = 0
+        self.scored = 0
+        self.rejected = 0
+        self.reports = 0
+        self.counts = Counter()
+        self.error = None
+        self.finished_at = None
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def snapshot(self):
+        """Dictionary with the state, counters and category counts"""
+        return {
+            "state": self.state,
+            "total": self.total,
+            "read": self.read,
+            "scored": self.scored,
+            "rejected": self.rejected,
+            "reports": self.reports,
+            "with_reports": self.with_reports,
+            "counts": dict(self.counts),
+            "error": self.error,
+        }
+
+
+class UploadScorer:
+    """Score uploaded CSV files on a bounded background pool"""
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, max_pending=DEFAULT_QUEUE_LIMIT,
+                 chunksize=DEFAULT_CHUNKSIZE, reports_limit=DEFAULT_REPORTS_LIMIT, ttl=DEFAULT_TTL):
+        self.max_pending = max_pending
+        self.chunksize = chunksize
+        self.reports_limit = reports_limit
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload-score")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, upload, with_reports=False):
+        """
+        Copy an uploaded CSV file to disk and queue it for scoring
+
+        Args:
+            upload: readable binary file object
+            with_reports: also render a ZIP of reports, when the file has at
+                most reports_limit records
+
+        Returns:
+            Tuple (state, job_id): BUSY and None when the queue is full
+        """
+        self._expire()
+        with self._lock:
+            if sum(1 for job in self._jobs.values() if job.finished_at is None) >= self.max_pending:
+                return BUSY, None
+        directory = tempfile.mkdtemp(prefix="ccr-upload-")
+        try:
+            total = spool(upload, os.path.join(directory, "entrada.csv"))
+        except OSError:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        job = UploadJob(directory, total, with_reports and total <= self.reports_limit)
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = job
+        self._executor.submit(self._run, job)
+        return QUEUED, job_id
+
+    def status(self, job_id):
+        """Return the snapshot of a job, or one with state UNKNOWN"""
+        self._expire()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return {"state": UNKNOWN}
+            return job.snapshot()
+
+    def result_path(self, job_id, name):
+        """Path of a result file of a finished job (SCORED_FILE, REJECTS_FILE, REPORTS_FILE), or None"""
+        self._expire()
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.state != DONE or not os.path.exists(job.path(name)):
+            return None
+        return job.path(name)
+
+    def discard(self, job_id):
+        """Forget a finished job and delete its files"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished_at is None:
+                return
+            del self._jobs[job_id]
+        shutil.rmtree(job.directory, ignore_errors=True)
+
+    def _expire(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at is not None and now - job.finished_at > self.ttl]
+        for job_id in expired:
+            self.discard(job_id)
+
+    def _run(self, job):
+        reference_date = date.today()
+        try:
+            with self._lock:
+                job.state = SCORING
+            with ChunkWriter(job.path(SCORED_FILE)) as output, ChunkWriter(job.path(REJECTS_FILE)) as rejects:
+                for chunk in read_chunks(job.path("entrada.csv"), self.chunksize, "csv"):
+                    scored, rejected = score_chunk(chunk, first_row=job.read + 1, reference_date=reference_date)
+                    output.write(scored)
+                    rejects.write(rejected)
+                    counts = scored["risk_category"].value_counts()
+                    with self._lock:
+                        job.read += len(chunk)
+                        job.scored = output.rows
+                        job.rejected = rejects.rows
+                        job.counts.update({category: int(count) for category, count in counts.items() if count})
+            if job.with_reports and job.scored:
+                with self._lock:
+                    job.state = REPORTS
+                summary = write_reports_zip(job.path(SCORED_FILE), job.path(REPORTS_FILE))
+                job.reports = summary["reports"]
+            os.remove(job.path("entrada.csv"))
+            state = DONE
+        except Exception as error:
+            job.error = error
+            state = FAILED
+        with self._lock:
+            job.state = state
+            job.finished_at = time.monotonic()
+        self._expire()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            jobs = list(self._jobs.values())
+            self._jobs.clear()
+        for job in jobs:
+            shutil.rmtree(job.directory, ignore_errors=True)
@@ -0,0 +1,250 @@
+"""Input validation shared by the Streamlit form and the batch tools.
+
+The column functions used by the batch tools import numpy and pandas when
+called, so that the form and the HTTP service do not load them.
+"""
+import math
+from datetime import date, datetime
+
+from ccr.rules import calculate_age, calculate_bmi
+
+# Input columns read by the engine, grouped like the dictionaries of the form
+PERSONAL_HISTORY_COLUMNS = ("ibd", "lynch", "hamart", "fap", "fasha", "serrated_synd")
+FAMILY_HISTORY_COLUMNS = ("family_crc", "family_before_60", "family_multiple")
+POLYP_HISTORY_COLUMNS = ("polyp10", "advanced_poly", "serrated", "resected", "multiple_polyps")
+SYMPTOM_COLUMNS = ("blood", "bowel_changes", "weight_loss", "pain", "incomplete")
+FLAG_COLUMNS = PERSONAL_HISTORY_COLUMNS + FAMILY_HISTORY_COLUMNS + POLYP_HISTORY_COLUMNS + ("symptoms",) + SYMPTOM_COLUMNS
+
+# Accepted spellings of boolean flags in batch input files
+TRUE_VALUES = frozenset({"1", "true", "t", "yes", "y", "si", "sí", "s", "x"})
+FALSE_VALUES = frozenset({"", "0", "false", "f", "no", "n", "none", "nan"})
+
+# Limits of the form
+HEIGHT_RANGE_CM = (50, 250)
+WEIGHT_RANGE_KG = (20, 300)
+
+# Reason codes of validate_columns, one bit each, in the order of the messages of validate_record
+VALIDATION_ERRORS = (
+    ("missing_dob", "- Falta la fecha de nacimiento\n"),
+    ("invalid_dob", "- Fecha de nacimiento inválida\n"),
+    ("invalid_height", "- Altura inválida\n"),
+    ("height_out_of_range", "- Altura inválida (debe estar entre 50 y 250 cm)\n"),
+    ("invalid_weight", "- Peso inválido\n"),
+    ("weight_out_of_range", "- Peso inválido (debe estar entre 20 y 300 kg)\n"),
+    ("future_dob", "- Fecha de nacimiento inválida\n"),
+)
+VALIDATION_ERROR_CODES = tuple(name for name, _ in VALIDATION_ERRORS)
+VALIDATION_ERROR_BIT = {name: 1 << bit for bit, name in enumerate(VALIDATION_ERROR_CODES)}
+
+# Numbers float() always accepts
+PLAIN_NUMBER = r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?"
+
+
+def validate_form_inputs(dob, height_str, weight_str):
+    """
+    Validate the basic data of the assessment form
+
+    Args:
+        dob: date of birth, or None when missing
+        height_str: height in cm as entered
+        weight_str: weight in kg as entered
+
+    Returns:
+        Tuple containing:
+        - height_cm: parsed height, or None if it could not be parsed
+        - weight_kg: parsed weight, or None if it could not be parsed
+        - error_message: one "- ..." line per error, empty when valid
+    """
+    error_message = ""
+
+    if not dob:
+        error_message += "- Falta la fecha de nacimiento\n"
+
+    # Validate height
+    try:
+        height_cm = float(height_str) if height_str else None
+        # NaN is not a number, infinities are out of range, as in validate_columns
+        if height_cm is not None and math.isnan(height_cm):
+            raise ValueError(height_str)
+        if not height_cm or not math.isfinite(height_cm) or height_cm < 50 or height_cm > 250:
+            error_message += "- Altura inválida (debe estar entre 50 y 250 cm)\n"
+    except (TypeError, ValueError):
+        error_message += "- Altura inválida\n"
+        height_cm = None
+
+    # Validate weight
+    try:
+        weight_kg = float(weight_str) if weight_str else None
+        # NaN is not a number, infinities are out of range, as in validate_columns
+        if weight_kg is not None and math.isnan(weight_kg):
+            raise ValueError(weight_str)
+        if not weight_kg or not math.isfinite(weight_kg) or weight_kg < 20 or weight_kg > 300:
+            error_message += "- Peso inválido (debe estar entre 20 y 300 kg)\n"
+    except (TypeError, ValueError):
+        error_message += "- Peso inválido\n"
+        weight_kg = None
+
+    return height_cm, weight_kg, error_message
+
+
+def parse_date(value):
+    """Parse a date of birth in ISO (YYYY-MM-DD) or local (DD/MM/YYYY) format, None if invalid"""
+    if isinstance(value, date):
+        return value
+    text = str(value).strip() if value is not None else ""
+    if not text:
+        return None
+    try:
+        return date.fromisoformat(text[:10])
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(text, "%d/%m/%Y").date()
+    except ValueError:
+        return None
+
+
+def validate_record(dob, height_cm, weight_kg):
+    """
+    Validate the basic data of one input record with the rules of the form
+
+    Returns:
+        Tuple (age, bmi, error_message); age and bmi are None when the record
+        is invalid, error_message is empty when it is valid
+    """
+    parsed_dob = parse_date(dob)
+    height_cm, weight_kg, error_message = validate_form_inputs(parsed_dob, height_cm, weight_kg)
+    if parsed_dob is None and dob not in (None, ""):
+        error_message = error_message.replace(
+            "- Falta la fecha de nacimiento\n", "- Fecha de nacimiento inválida\n")
+    elif parsed_dob is not None and parsed_dob > date.today():
+        error_message += "- Fecha de nacimiento inválida\n"
+
+    if error_message:
+        return None, None, error_message
+    return calculate_age(parsed_dob), calculate_bmi(height_cm, weight_kg), error_message
+
+
+def _parse_float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return math.nan
+
+
+def _text_column(values):
+    """Return (stripped text, missing mask) of a column of raw input values"""
+    import pandas as pd
+
+    values = pd.Series(values, dtype=object).reset_index(drop=True)
+    text = values.astype(str).str.strip()
+    return text, values.isna().to_numpy() | (text == "").to_numpy()
+
+
+def _number_column(values, limits, invalid_code, range_code):
+    """Parse a column of numbers as validate_form_inputs does; return (numbers, errors)"""
+    import numpy as np
+
+    text, missing = _text_column(values)
+    text = text.where(~missing, "nan")
+    try:
+        # float() of every value in C
+        numbers = text.to_numpy().astype(float)
+    except ValueError:
+        # Some value is not a number: convert the plain ones in C, the rest one by one
+        numbers = np.full(len(text), np.nan)
+        plain = text.str.fullmatch(PLAIN_NUMBER).to_numpy(dtype=bool)
+        numbers[plain] = text[plain].to_numpy().astype(float)
+        numbers[~plain] = [_parse_float(value) for value in text[~plain]]
+    unparsed = np.isnan(numbers) & ~missing
+    low, high = limits
+    with np.errstate(invalid="ignore"):
+        out_of_range = ~unparsed & ~((numbers >= low) & (numbers <= high))
+    errors = np.where(unparsed, VALIDATION_ERROR_BIT[invalid_code], 0)
+    errors |= np.where(out_of_range, VALIDATION_ERROR_BIT[range_code], 0)
+    return numbers, errors
+
+
+def validate_columns(dob, height_cm, weight_kg, reference_date=None):
+    """
+    Validate the basic data of many records at once with the rules of the form
+
+    Every column is parsed as a whole. Dates of birth are read as
+    YYYY-MM-DD or DD/MM/YYYY, as parse_date does. Age is counted at
+    reference_date, so that a whole run uses the same day whenever each
+    record is processed.
+
+    Args:
+        dob, height_cm, weight_kg: sequences or Series of raw input values
+        reference_date: date the ages are computed at (default: today)
+
+    Returns:
+        Tuple (age, bmi, errors) of numpy arrays: age as int64 and bmi as
+        float64 (both meaningless where the record is invalid), and errors
+        as an int bitmask of VALIDATION_ERROR_BIT reason codes, 0 when the
+        record is valid
+    """
+    import numpy as np
+    import pandas as pd
+
+    if reference_date is None:
+        reference_date = date.today()
+    text, missing = _text_column(dob)
+    parsed = pd.to_datetime(text.str[:10], format="%Y-%m-%d", errors="coerce")
+    # The slower DD/MM/YYYY parser only sees what is not ISO
+    local = parsed.isna() & ~missing
+    if local.any():
+        parsed[local] = pd.to_datetime(text[local], format="%d/%m/%Y", errors="coerce")
+    unparsed = parsed.isna().to_numpy() & ~missing
+    year = parsed.dt.year.fillna(0).to_numpy(dtype=np.int64)
+    month_day = (parsed.dt.month * 100 + parsed.dt.day).fillna(0).to_numpy(dtype=np.int64)
+    reference_month_day = reference_date.month * 100 + reference_date.day
+    age = reference_date.year - year - (reference_month_day < month_day)
+    future = (parsed > pd.Timestamp(reference_date)).to_numpy()
+
+    height, height_errors = _number_column(height_cm, HEIGHT_RANGE_CM, "invalid_height", "height_out_of_range")
+    weight, weight_errors = _number_column(weight_kg, WEIGHT_RANGE_KG, "invalid_weight", "weight_out_of_range")
+    errors = height_errors | weight_errors
+    errors |= np.where(missing, VALIDATION_ERROR_BIT["missing_dob"], 0)
+    errors |= np.where(unparsed, VALIDATION_ERROR_BIT["invalid_dob"], 0)
+    errors |= np.where(future, VALIDATION_ERROR_BIT["future_dob"], 0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        bmi = np.round(weight / (height / 100) ** 2, 1)
+    return age, bmi, errors
+
+
+def error_message(errors):
+    """Return the "- ..." lines of validate_record for one bitmask of validate_columns"""
+    return "".join(message for bit, (_, message) in enumerate(VALIDATION_ERRORS) if errors >> bit & 1)
+
+
+def parse_flag(value):
+    """
+    Parse a yes/no value from a batch input file
+
+    Returns:
+        True or False, or None when the value is not recognised
+    """
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    return None
+
+
+def parse_flag_column(values):
+    """
+    Parse a column of yes/no values as parse_flag does, for a whole pandas Series
+
+    Returns:
+        Tuple (flags, invalid) of boolean numpy arrays
+    """
+    # Missing values (null in JSONL) count as "no"
+    text = values.fillna("").astype(str).str.strip().str.lower()
+    flags = text.isin(TRUE_VALUES).to_numpy()
+    invalid = ~(flags | text.isin(FALSE_VALUES).to_numpy())
+    return flags, invalid
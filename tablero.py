@@ -0,0 +1,103 @@
+# Staff dashboard with counts over every stored assessment. It is a separate
+# app, not a page of the patient app, so patients never see it:
+#     streamlit run tablero.py
+import streamlit as st
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+import os
+import sqlite3
+
+from ccr import guidelines
+from ccr.codes import RISK_CODE
+from ccr.cube import AGE_BAND_LABELS, cube_counts
+
+# Set page configuration
+st.set_page_config(
+    page_title="Tablero de evaluaciones CCR",
+    page_icon="📊",
+    layout="wide"
+)
+
+# Seconds between refreshes of the counts
+REFRESH_SECONDS = 30
+
+def read_cube(path):
+    """Counts of the stored assessments; only the cube is read, never the assessments"""
+    # The app creates the store and its cube; until then there is nothing to count
+    if not os.path.exists(path):
+        return []
+    connection = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        if not connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'assessment_cube'").fetchone():
+            return []
+        return cube_counts(connection)
+    finally:
+        connection.close()
+
+def cube_frame(counts):
+    """Cube cells with Spanish labels"""
+    active = guidelines.active()
+    overweight, obese = active.bmi_thresholds
+    bmi_labels = {
+        "none": f"Menor a {overweight:g} o sin dato",
+        "overweight": f"Sobrepeso ({overweight:g} a {obese:g})",
+        "obese": f"Obesidad ({obese:g} o más)",
+    }
+    return pd.DataFrame({
+        "Categoría": [active.category_text[RISK_CODE[risk]] or "Sin categoría" for risk, _, _, _, _ in counts],
+        "Edad": pd.Categorical([band for _, band, _, _, _ in counts], categories=AGE_BAND_LABELS, ordered=True),
+        "IMC": pd.Categorical([bmi_labels[bmi] for _, _, bmi, _, _ in counts], categories=list(bmi_labels.values()),
+                              ordered=True),
+        "Síntomas": ["Con síntomas" if symptoms else "Sin síntomas" for _, _, _, symptoms, _ in counts],
+        "Evaluaciones": [count for _, _, _, _, count in counts],
+    })
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def dashboard_section(path):
+    """Counts by category, age, BMI and symptoms; refreshed every REFRESH_SECONDS"""
+    frame = cube_frame(read_cube(path))
+    if frame.empty:
+        st.info("Todavía no hay evaluaciones guardadas.")
+        return
+
+    # Filters
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        ages = st.multiselect("Edad", AGE_BAND_LABELS, default=list(AGE_BAND_LABELS))
+    with col2:
+        bmi_bands = st.multiselect("IMC", list(frame["IMC"].cat.categories), default=list(frame["IMC"].cat.categories))
+    with col3:
+        symptoms = st.multiselect("Síntomas", ["Sin síntomas", "Con síntomas"], default=["Sin síntomas", "Con síntomas"])
+    frame = frame[frame["Edad"].isin(ages) & frame["IMC"].isin(bmi_bands) & frame["Síntomas"].isin(symptoms)]
+
+    total = int(frame["Evaluaciones"].sum())
+    with_symptoms = int(frame.loc[frame["Síntomas"] == "Con síntomas", "Evaluaciones"].sum())
+    col1, col2 = st.columns(2)
+    col1.metric("Evaluaciones", f"{total:,}")
+    col2.metric("Con síntomas", f"{with_symptoms:,}", f"{with_symptoms / total:.1%}" if total else None,
+                delta_color="off")
+
+    st.subheader("Por categoría de riesgo")
+    by_category = frame.groupby("Categoría")["Evaluaciones"].sum().sort_values(ascending=False)
+    st.bar_chart(by_category, horizontal=True)
+
+    for title, column in (("Por categoría y edad", "Edad"), ("Por categoría e IMC", "IMC")):
+        st.subheader(title)
+        table = frame.pivot_table(index="Categoría", columns=column, values="Evaluaciones", aggfunc="sum",
+                                  fill_value=0, observed=False)
+        table.columns = table.columns.astype(str)
+        st.dataframe(table)
+
+    st.caption(f"Actualizado: {datetime.now().strftime('%H:%M:%S')}")
+
+# App layout
+st.title("Tablero de evaluaciones de riesgo CCR")
+st.markdown("Cantidad de evaluaciones guardadas por categoría de riesgo, edad, IMC y síntomas.")
+
+# The same setting as the app: environment, or a root-level key of .streamlit/secrets.toml
+store_path = os.environ.get("CCR_STORE_PATH")
+if store_path:
+    dashboard_section(store_path)
+else:
+    st.info("Las evaluaciones no se guardan en este servidor (CCR_STORE_PATH no está configurado).")
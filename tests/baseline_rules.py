@@ -0,0 +1,55 @@
+"""The guideline hierarchy as the original app wrote it, kept as a reference oracle.
+
+This is the if/elif chain of ``evaluate_risk`` from the first version of
+app.py, with each branch returning its risk category code instead of its
+texts. It does not read guidelines.json or the decision table, so the tests
+can check both against the rules as they were first written.
+"""
+
+
+def baseline_risk(age, personal_history, family_history, polyp_history):
+    """Return the risk category code the original if/elif chain gives"""
+    if personal_history.get("lynch", False):
+        return "lynch"
+    elif personal_history.get("ibd", False):
+        return "ibd"
+    elif personal_history.get("fap", False) or personal_history.get("fasha", False):
+        return "fap"
+    elif personal_history.get("hamart", False):
+        return "hamart"
+    elif personal_history.get("serrated_synd", False):
+        return "serrated_synd"
+    elif polyp_history.get("polyp10", False):
+        if polyp_history.get("advanced_poly", False) and polyp_history.get("resected", False):
+            return "advanced_adenoma"
+        elif polyp_history.get("serrated", False) and polyp_history.get("resected", False):
+            return "serrated_polyp"
+        elif polyp_history.get("resected", False):
+            return "simple_polyps"
+        # A polyp without any resection matched no sub-rule and gave empty texts
+        return "none"
+    elif family_history.get("family_crc", False):
+        if family_history.get("family_before_60", False):
+            return "family_before_60"
+        return "family_after_60"
+    elif 50 <= age <= 75:
+        return "average"
+    elif age < 50:
+        return "under_50"
+    elif age > 75:
+        return "over_75"
+    return "none"
+
+
+def baseline_bmi_note(bmi):
+    """Return the BMI note code the original app gives"""
+    if bmi and bmi >= 30:
+        return "obese"
+    elif bmi and bmi >= 25:
+        return "overweight"
+    return "none"
+
+
+def baseline_age_60_plus(age):
+    """Whether the original app adds the age-specific lifestyle advice"""
+    return age >= 60
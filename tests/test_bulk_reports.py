@@ -0,0 +1,32 @@
+"""The entry name template is checked against the input before any report is written."""
+import zipfile
+
+import pytest
+
+from ccr.bulk_reports import check_name_template, write_reports_zip
+
+SCORED = "patient_id,age,bmi,risk_category,symptoms_warning\nA-1,60,27.0,average,False\nA-2,45,,under_50,True\n"
+
+
+@pytest.mark.parametrize("template", ["{apellido}.pdf", "{}.pdf", "{patient_id", "{nombre[0]}_{row}.pdf"])
+def test_template_with_unknown_fields_is_rejected(tmp_path, template):
+    source = tmp_path / "evaluados.csv"
+    source.write_text(SCORED, encoding="utf-8")
+    destination = tmp_path / "informes.zip"
+    with pytest.raises(ValueError):
+        write_reports_zip(source, destination, name_template=template)
+    assert not destination.exists()
+
+
+def test_template_fields_may_index_known_columns():
+    check_name_template("{patient_id[0]}/{row:05d}_{fecha}.pdf", ["patient_id", "age"])
+
+
+def test_names_from_input_columns(tmp_path):
+    source = tmp_path / "evaluados.csv"
+    source.write_text(SCORED, encoding="utf-8")
+    destination = tmp_path / "informes.zip"
+    summary = write_reports_zip(source, destination, name_template="{risk_category}_{row}.pdf")
+    assert summary["reports"] == 2
+    with zipfile.ZipFile(destination) as archive:
+        assert archive.namelist() == ["average_1.pdf", "under_50_2.pdf"]
@@ -0,0 +1,46 @@
+"""Repeats of a person are told apart by patient id, never by date of birth alone."""
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from ccr.dedup import Deduplicator
+from ccr.pipeline import score_chunk
+
+REFERENCE_DATE = date(2026, 1, 1)
+
+
+def two_people_born_the_same_day(**columns):
+    return pd.DataFrame({
+        **columns,
+        "dob": ["1960-01-01", "1960-01-01"],
+        "height_cm": ["170", "160"],
+        "weight_kg": ["70", "60"],
+        "lynch": ["no", "si"],
+    })
+
+
+def test_same_birth_date_is_not_a_repeat_without_patient_id():
+    with Deduplicator("flag") as dedup:
+        scored, _ = score_chunk(two_people_born_the_same_day(), reference_date=REFERENCE_DATE, dedup=dedup)
+    assert scored["repeat"].tolist() == [False, False]
+    assert scored["risk_category"].tolist() == ["average", "lynch"]
+
+
+def test_drop_needs_patient_id():
+    with Deduplicator("drop") as dedup, pytest.raises(ValueError):
+        score_chunk(two_people_born_the_same_day(), reference_date=REFERENCE_DATE, dedup=dedup)
+
+
+def test_drop_keeps_different_patients_born_the_same_day():
+    chunk = two_people_born_the_same_day(patient_id=["A-1", "A-2"])
+    with Deduplicator("drop") as dedup:
+        scored, _ = score_chunk(chunk, reference_date=REFERENCE_DATE, dedup=dedup)
+    assert scored["risk_category"].tolist() == ["average", "lynch"]
+
+
+def test_drop_removes_a_retyped_patient_id():
+    chunk = two_people_born_the_same_day(patient_id=["A-1", "a1"])
+    with Deduplicator("drop") as dedup:
+        scored, _ = score_chunk(chunk, reference_date=REFERENCE_DATE, dedup=dedup)
+    assert scored["patient_id"].tolist() == ["A-1"]
@@ -0,0 +1,79 @@
+"""The vectorized engine and the decision table give the results of the scalar rules."""
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseline_rules import baseline_age_60_plus, baseline_bmi_note, baseline_risk
+from ccr.batch import evaluate_risk_frame, verify_against_scalar
+from ccr.codes import BMI_NOTE_CODE, RISK_CODE
+from ccr.decision_table import FLAG_COMBINATIONS, SYMPTOMS_BIT, pack_result, unpack_flags, verify_table
+from ccr.guidelines import active
+from ccr.validation import FLAG_COLUMNS
+
+# Ages and BMIs on both sides of every threshold of the original rules
+BOUNDARY_AGES = (0, 18, 39.5, 49, 49.5, 49.99, 50, 50.5, 59, 59.5, 60, 60.5, 75, 75.5, 75.99, 76, 76.5, 95, 120, 130)
+BOUNDARY_BMIS = (None, 18.5, 24.9, 25, 29.9, 30, 45)
+
+
+def whole_years(age):
+    """The form passes whole ages (calculate_age); a fractional age counts as the years already lived"""
+    return math.floor(age)
+
+
+@pytest.fixture(scope="module")
+def sample():
+    """Random answers, ages and BMIs, with some ages and BMIs missing"""
+    rng = np.random.default_rng(0)
+    n_rows = 3000
+    frame = pd.DataFrame({column: rng.random(n_rows) < 0.08 for column in FLAG_COLUMNS if column != "symptoms"})
+    age = rng.integers(15, 95, n_rows).astype(float)
+    age[rng.random(n_rows) < 0.05] = np.nan
+    bmi = rng.normal(27, 5, n_rows).round(1)
+    bmi[rng.random(n_rows) < 0.1] = np.nan
+    frame["age"] = age
+    frame["bmi"] = bmi
+    return frame
+
+
+def test_masks_match_scalar_rules(sample):
+    assert verify_against_scalar(sample, evaluate_risk_frame(sample)).empty
+
+
+def test_table_matches_scalar_rules(sample):
+    assert verify_against_scalar(sample, evaluate_risk_frame(sample, use_table=True)).empty
+
+
+@pytest.mark.parametrize("use_table", [False, True])
+def test_engine_matches_the_original_rules(use_table):
+    """Every history at every boundary age, fractional ones included, against the original if/elif chain"""
+    rows, expected = [], []
+    for flags in range(SYMPTOMS_BIT):
+        personal_history, family_history, polyp_history, _ = unpack_flags(flags)
+        for age in BOUNDARY_AGES:
+            rows.append({**personal_history, **family_history, **polyp_history, "age": age, "bmi": 22.0})
+            expected.append(baseline_risk(whole_years(age), personal_history, family_history, polyp_history))
+    frame = pd.DataFrame(rows)
+    assert evaluate_risk_frame(frame, use_table=use_table)["risk_category"].tolist() == expected
+
+
+def test_every_table_cell_matches_the_rules():
+    assert verify_table() == []
+
+
+def test_table_and_guidelines_match_the_original_rules():
+    guidelines = active()
+    mismatches = []
+    for flags in range(FLAG_COMBINATIONS):
+        personal_history, family_history, polyp_history, symptoms = unpack_flags(flags)
+        for age in BOUNDARY_AGES:
+            risk = RISK_CODE[baseline_risk(whole_years(age), personal_history, family_history, polyp_history)]
+            if guidelines.match(flags & ~SYMPTOMS_BIT, age) != risk:
+                mismatches.append(("match", flags, age, risk))
+            for bmi in BOUNDARY_BMIS:
+                expected = pack_result(risk, BMI_NOTE_CODE[baseline_bmi_note(bmi)], symptoms,
+                                       baseline_age_60_plus(whole_years(age)))
+                if guidelines.lookup(flags, age, bmi) != expected:
+                    mismatches.append(("table", flags, age, bmi, expected))
+    assert mismatches[:10] == []
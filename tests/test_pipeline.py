@@ -0,0 +1,43 @@
+"""Streaming scoring keeps every value under its column whatever the chunking."""
+import json
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from ccr.parallel import score_file_parallel
+from ccr.pipeline import score_file
+
+# Keys in a different order on every record, and a flag left out of the last one
+RECORDS = [
+    {"patient_id": "a", "dob": "1960-01-01", "height_cm": 170, "weight_kg": 70, "lynch": False},
+    {"lynch": True, "weight_kg": 60, "height_cm": 160, "dob": "1961-02-02", "patient_id": "b"},
+    {"dob": "1962-03-03", "patient_id": "c", "height_cm": 180, "weight_kg": 80},
+]
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 10])
+def test_jsonl_keys_in_any_order(tmp_path, chunksize):
+    source = tmp_path / "registro.jsonl"
+    source.write_text("".join(json.dumps(record) + "\n" for record in RECORDS), encoding="utf-8")
+    output = tmp_path / "evaluados.csv"
+    summary = score_file(source, output, tmp_path / "rechazados.csv", chunksize=chunksize,
+                         reference_date=date(2026, 1, 1))
+
+    scored = pd.read_csv(output, dtype=str, keep_default_na=False)
+    assert summary["scored"] == 3
+    assert scored["patient_id"].tolist() == ["a", "b", "c"]
+    assert scored["dob"].tolist() == ["1960-01-01", "1961-02-02", "1962-03-03"]
+    assert scored["height_cm"].tolist() == ["170", "160", "180"]
+    assert scored["lynch"].tolist() == ["False", "True", "False"]
+    assert scored["risk_category"].tolist() == ["average", "lynch", "average"]
+
+
+def test_parallel_output_matches_sequential(tmp_path):
+    source = tmp_path / "registro.jsonl"
+    source.write_text("".join(json.dumps(record) + "\n" for record in RECORDS * 50), encoding="utf-8")
+    sequential, parallel = tmp_path / "secuencial.csv", tmp_path / "paralelo.csv"
+    score_file(source, sequential, tmp_path / "r1.csv", chunksize=7, reference_date=date(2026, 1, 1))
+    score_file_parallel(source, parallel, tmp_path / "r2.csv", workers=2, chunksize=7,
+                        reference_date=date(2026, 1, 1))
+    assert parallel.read_text(encoding="utf-8") == sequential.read_text(encoding="utf-8")
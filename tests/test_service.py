@@ -0,0 +1,41 @@
+"""Malformed requests and failing handlers get an HTTP answer, not a dropped connection."""
+import asyncio
+import json
+
+import pytest
+
+from ccr import service
+
+
+def exchange(request):
+    """Send raw request bytes to a fresh server and return (status, payload) of the answer"""
+    async def run():
+        server = await asyncio.start_server(service.handle_connection, "127.0.0.1", 0)
+        host, port = server.sockets[0].getsockname()[:2]
+        async with server:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            await writer.drain()
+            answer = await reader.read()
+            writer.close()
+        return answer
+
+    head, _, body = asyncio.run(run()).partition(b"\r\n\r\n")
+    return int(head.split(b" ")[1]), json.loads(body)
+
+
+@pytest.mark.parametrize("length", [b"-5", b"+5", b" 5_0", b"cinco"])
+def test_invalid_content_length_is_a_bad_request(length):
+    status, payload = exchange(b"POST /score HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n{}")
+    assert status == 400
+    assert payload == {"error": "Content-Length inválido"}
+
+
+def test_failing_handler_answers_500(monkeypatch):
+    async def failing(body, texts):
+        raise RuntimeError("falla")
+
+    monkeypatch.setitem(service.ROUTES, "/health", ("GET", failing))
+    status, payload = exchange(b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n")
+    assert status == 500
+    assert "error" in payload